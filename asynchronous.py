@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+import weakref
+
+from interpreter import *
+
+
+##########################
+# ERRORS
+##########################
+
+
+class EvaluationTimeoutError(RTError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context)
+        self.error_name = 'Timeout'
+
+##########################
+# ASYNC INTERPRETER
+##########################
+
+
+def call_nodes(node):
+    # the calls and the nodes above them, everything else can't await
+    # anything and is visited synchronously
+    calls = set()
+    seen = set()
+    pending = [(node, False)]
+    while pending:
+        current, done = pending.pop()
+        children = node_children(current)
+        if not done:
+            if current in seen:
+                continue
+            seen.add(current)
+            pending.append((current, True))
+            pending.extend((child, False) for child in children)
+        elif isinstance(current, CallNode) or any(child in calls for child in children):
+            calls.add(current)
+    return frozenset(calls)
+
+
+class AsyncInterpreter(Interpreter):
+    # Bound methods may be coroutine functions, their results are awaited.
+    # The operands of comparisons are both evaluated anyway, so when both
+    # contain calls they run concurrently, and and/or still only visit the
+    # right side when the left one doesn't decide.
+    # An error on the left side ends the evaluation with that error as
+    # before, but calls started on the right side may have run already.
+    # Shared nodes are visited once, like with the Interpreter.
+
+    def __init__(self, calls, shared=None):
+        super().__init__(shared=shared)
+        self.calls = calls
+        # visits of shared nodes which may be awaited concurrently
+        self.running = {}
+
+    async def walk_async(self, node, context):
+        if node not in self.calls:
+            return self.walk(node, context)
+        if not self.shared or node not in self.shared or context.memo is None:
+            return await self.visit_async(node, context)
+
+        value = context.memo.get(node)
+        if value is None:
+            running = self.running.get(node)
+            if running is None:
+                running = self.running[node] = asyncio.ensure_future(self.visit_async(node, context))
+            # an error ends the evaluation, so only values are kept
+            value = context.memo[node] = await running
+        return value
+
+    async def visit_async(self, node, context):
+        method = getattr(self, f'visit_async_{type(node).__name__}')
+        return await method(node, context)
+
+    async def visit_async_BinOpNode(self, node, context):
+        if node.op_tok.type != TT_KEYWORD and node.left_node in self.calls and node.right_node in self.calls:
+            # the error of the left side wins, whichever finished first
+            left, right = await asyncio.gather(
+                self.walk_async(node.left_node, context), self.walk_async(node.right_node, context),
+                return_exceptions=True)
+            for outcome in (left, right):
+                if isinstance(outcome, BaseException):
+                    raise outcome
+            return self.operate(node, left, right, context)
+
+        left = await self.walk_async(node.left_node, context)
+        result = self.short_circuit(node, left, context)
+        if result is not None:
+            return result
+        return self.operate(node, left, await self.walk_async(node.right_node, context), context)
+
+    async def visit_async_UnaryOpNode(self, node, context):
+        return self.negate(node, await self.walk_async(node.node, context), context)
+
+    async def visit_async_CallNode(self, node, context):
+        value_to_call = self.callee(node, context)
+        arg = await self.walk_async(node.arg_nodes, context)
+        self.check_argument(node, arg, context)
+
+        value = value_to_call(int(arg.value))
+        if inspect.isawaitable(value):
+            value = await value
+        return self.returned(node, value, context)
+
+##########################
+# ASYNC EVALUATION
+##########################
+
+# call nodes per compiled expression, computed on its first evaluation
+expression_calls = weakref.WeakKeyDictionary()
+
+
+async def evaluate_async(expr, bindings=None, timeout=None, fn='<async>', **options):
+    # expr is a CompiledExpression or a text, which is compiled with the
+    # options through the parse cache. An evaluation running longer than
+    # timeout seconds is cancelled and returns an EvaluationTimeoutError.
+    if isinstance(expr, str):
+        expr, error = parse_cache.get(fn, expr, **options)
+        if error:
+            return None, error
+
+    calls = expression_calls.get(expr)
+    if calls is None:
+        calls = expression_calls[expr] = call_nodes(expr.node)
+
+    context = Context('<program>')
+    context.identifier = identifier
+    context.bindings = normalize_bindings(bindings)
+    if expr.shared:
+        context.memo = {}
+
+    interpreter = AsyncInterpreter(calls, expr.shared)
+    try:
+        return await asyncio.wait_for(interpreter.walk_async(expr.node, context), timeout), None
+    except ErrorSignal as signal:
+        return None, signal.error
+    except asyncio.TimeoutError:
+        return None, EvaluationTimeoutError(
+            expr.node.pos_start, expr.node.pos_end,
+            f'Evaluation took longer than {timeout} seconds',
+            context
+        )
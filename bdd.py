@@ -0,0 +1,326 @@
+from interpreter import *
+
+
+##########################
+# BDD
+##########################
+
+# the two terminal nodes, every other node tests one variable
+FALSE_NODE = 0
+TRUE_NODE = 1
+
+
+class BDD:
+    # Reduced ordered binary decision diagrams. All functions built with
+    # one BDD share their nodes, so two of them are equivalent exactly when
+    # they are the same node. Nodes are ints into the level/low/high lists,
+    # a variable's level is its position in the order.
+
+    def __init__(self, order=()):
+        self.names = []
+        self.levels = {}
+        # the terminals sit below every variable
+        self.level = [float('inf'), float('inf')]
+        self.low = [FALSE_NODE, TRUE_NODE]
+        self.high = [FALSE_NODE, TRUE_NODE]
+        self.unique = {}
+        self.computed = {}
+        for name in order:
+            self.add_variable(name)
+
+    def add_variable(self, name):
+        # new variables go below the known ones
+        level = self.levels.get(name)
+        if level is None:
+            level = self.levels[name] = len(self.names)
+            self.names.append(name)
+        return level
+
+    def variable(self, name):
+        return self.node(self.add_variable(name), FALSE_NODE, TRUE_NODE)
+
+    def node(self, level, low, high):
+        if low == high:
+            return low
+        key = (level, low, high)
+        u = self.unique.get(key)
+        if u is None:
+            u = self.unique[key] = len(self.level)
+            self.level.append(level)
+            self.low.append(low)
+            self.high.append(high)
+        return u
+
+    def apply(self, op, u, v):
+        # op is 'AND', 'OR' or 'XOR'
+        if op == 'AND':
+            if u == FALSE_NODE or v == FALSE_NODE:
+                return FALSE_NODE
+            if u == TRUE_NODE or u == v:
+                return v
+            if v == TRUE_NODE:
+                return u
+        elif op == 'OR':
+            if u == TRUE_NODE or v == TRUE_NODE:
+                return TRUE_NODE
+            if u == FALSE_NODE or u == v:
+                return v
+            if v == FALSE_NODE:
+                return u
+        else:
+            if u == v:
+                return FALSE_NODE
+            if u == FALSE_NODE:
+                return v
+            if v == FALSE_NODE:
+                return u
+
+        # the operations are commutative
+        if u > v:
+            u, v = v, u
+        key = (op, u, v)
+        result = self.computed.get(key)
+        if result is None:
+            level_u, level_v = self.level[u], self.level[v]
+            level = min(level_u, level_v)
+            u_low, u_high = (self.low[u], self.high[u]) if level_u == level else (u, u)
+            v_low, v_high = (self.low[v], self.high[v]) if level_v == level else (v, v)
+            result = self.computed[key] = self.node(
+                level, self.apply(op, u_low, v_low), self.apply(op, u_high, v_high))
+        return result
+
+    def negate(self, u):
+        return self.apply('XOR', u, TRUE_NODE) if u > TRUE_NODE else 1 - u
+
+    def size(self, u):
+        # the number of nodes reachable from u, terminals included
+        seen = set()
+        pending = [u]
+        while pending:
+            u = pending.pop()
+            if u not in seen:
+                seen.add(u)
+                if u > TRUE_NODE:
+                    pending.append(self.low[u])
+                    pending.append(self.high[u])
+        return len(seen)
+
+    def __len__(self):
+        return len(self.level)
+
+##########################
+# VARIABLE ORDER
+##########################
+
+
+def occurrences(node):
+    # number of variable occurrences below each node
+    counts = {}
+    pending = [(node, False)]
+    while pending:
+        current, done = pending.pop()
+        children = node_children(current)
+        if done:
+            count = 1 if isinstance(current, VarNode) else 0
+            counts[current] = count + sum(counts[child] for child in children)
+        elif current not in counts:
+            pending.append((current, True))
+            pending.extend((child, False) for child in children)
+    return counts
+
+
+def variable_order(node):
+    # Fan-in heuristic: a depth first walk which enters the operand with
+    # more variable occurrences first, the variables are ordered by their
+    # first visit. Variables which are combined in one subexpression end up
+    # next to each other, which keeps the diagram small.
+    counts = occurrences(node)
+    order = {}
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, VarNode):
+            order.setdefault(current.var_name_tok.value, None)
+            continue
+        # the largest operand is popped first, ties from left to right
+        children = sorted(node_children(current), key=counts.get, reverse=True)
+        pending.extend(reversed(children))
+    return list(order)
+
+##########################
+# BDD COMPILER
+##########################
+
+
+class BDDCompiler:
+    # Builds the diagram of an ast which only combines identifiers and
+    # true/false with and/or/!/==/!=, anything else raises ValueError.
+
+    def __init__(self, bdd):
+        self.bdd = bdd
+        self.nodes = {}
+
+    def compile(self, node):
+        # shared nodes of a dag are only built once
+        u = self.nodes.get(node)
+        if u is None:
+            method = getattr(self, f'compile_{type(node).__name__}', self.not_boolean)
+            u = self.nodes[node] = method(node)
+        return u
+
+    def not_boolean(self, node):
+        raise ValueError(
+            f'Only and, or, !, == and != of identifiers and booleans can be compiled '
+            f'into a BDD (column {node.pos_start.col + 1})')
+
+    def compile_BooleanNode(self, node):
+        return TRUE_NODE if node.tok.value == 'TRUE' else FALSE_NODE
+
+    def compile_VarNode(self, node):
+        return self.bdd.variable(node.var_name_tok.value)
+
+    def compile_UnaryOpNode(self, node):
+        return self.bdd.negate(self.compile(node.node))
+
+    def compile_BinOpNode(self, node):
+        op_tok = node.op_tok
+        if op_tok.matches(TT_KEYWORD, 'AND') or op_tok.matches(TT_KEYWORD, 'OR'):
+            op = op_tok.value
+        elif op_tok.type in (TT_EE, TT_NE):
+            op = 'XOR'
+        else:
+            return self.not_boolean(node)
+
+        u = self.bdd.apply(op, self.compile(node.left_node), self.compile(node.right_node))
+        return self.bdd.negate(u) if op_tok.type == TT_EE else u
+
+##########################
+# BOOLEAN FUNCTION
+##########################
+
+
+class BooleanFunction:
+    # A compiled expression together with its diagram. Evaluation walks
+    # the diagram, unless an identifier of the expression is not bound to
+    # a bool: then the Interpreter gives the result or error it always did.
+
+    def __init__(self, compiled, bdd, root):
+        self.compiled = compiled
+        self.bdd = bdd
+        self.root = root
+        self.variables = sorted({node.var_name_tok.value for node in iter_nodes(compiled.node)
+                                 if isinstance(node, VarNode)}, key=bdd.levels.get)
+
+    def lookup(self, bindings):
+        # the values of all variables, or None if one is not a bool
+        context = Context('<program>')
+        context.identifier = identifier
+        context.bindings = normalize_bindings(bindings)
+        values = {}
+        for name in self.variables:
+            value = context.lookup(name)
+            if value is True or value == 'TRUE':
+                values[name] = True
+            elif value is False or value == 'FALSE':
+                values[name] = False
+            else:
+                return None
+        return values
+
+    def evaluate(self, bindings=None):
+        values = self.lookup(bindings)
+        if values is None:
+            return self.compiled.evaluate(bindings)
+
+        bdd = self.bdd
+        level, low, high, names = bdd.level, bdd.low, bdd.high, bdd.names
+        u = self.root
+        while u > TRUE_NODE:
+            u = high[u] if values[names[level[u]]] else low[u]
+
+        return (TRUE if u == TRUE_NODE else FALSE), None
+
+    def is_tautology(self):
+        return self.root == TRUE_NODE
+
+    def is_satisfiable(self):
+        return self.root != FALSE_NODE
+
+    def equivalent(self, other):
+        if other.bdd is not self.bdd:
+            raise ValueError('Only functions compiled with the same BDD can be compared')
+        return self.root == other.root
+
+    def satisfying_assignment(self):
+        # values of the variables on one path to true, the others don't
+        # matter, None if there is no such path
+        if self.root == FALSE_NODE:
+            return None
+        bdd = self.bdd
+        assignment = {}
+        u = self.root
+        while u > TRUE_NODE:
+            name = bdd.names[bdd.level[u]]
+            if bdd.high[u] != FALSE_NODE:
+                assignment[name] = True
+                u = bdd.high[u]
+            else:
+                assignment[name] = False
+                u = bdd.low[u]
+        return assignment
+
+    def count_solutions(self):
+        # the number of assignments of the expression's variables which
+        # make it true
+        bdd = self.bdd
+        positions = {bdd.levels[name]: i for i, name in enumerate(self.variables)}
+        end = len(self.variables)
+
+        def position(u):
+            return end if u <= TRUE_NODE else positions[bdd.level[u]]
+
+        counts = {FALSE_NODE: 0, TRUE_NODE: 1}
+        pending = [self.root]
+        while pending:
+            u = pending[-1]
+            if u in counts:
+                pending.pop()
+                continue
+            low, high = bdd.low[u], bdd.high[u]
+            missing = [child for child in (low, high) if child not in counts]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            p = position(u)
+            counts[u] = (counts[low] << (position(low) - p - 1)) + (counts[high] << (position(high) - p - 1))
+        return counts[self.root] << position(self.root)
+
+    def __len__(self):
+        return self.bdd.size(self.root)
+
+    def __repr__(self):
+        return f'<BooleanFunction {self.compiled.text!r}>'
+
+
+def iter_nodes(node):
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        yield current
+        pending.extend(node_children(current))
+
+
+def compile_bdd(fn, text, bdd=None, **options):
+    # options are passed on to compile, functions which should be compared
+    # have to share one BDD
+    compiled, error = compile(fn, text, **options)
+    if error:
+        return None, error
+
+    if bdd is None:
+        bdd = BDD()
+    for name in variable_order(compiled.node):
+        bdd.add_variable(name)
+    root = BDDCompiler(bdd).compile(compiled.node)
+    return BooleanFunction(compiled, bdd, root), None
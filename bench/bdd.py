@@ -0,0 +1,50 @@
+# Compares one evaluation of a pure boolean rule with the tree walking
+# Interpreter and with its BDD, for rules over 20 to 60 variables.
+#
+#   python -m bench.bdd
+
+import itertools
+import random
+import time
+import timeit
+
+from bdd import BDD, compile_bdd
+
+
+NAMES = [a + b for a, b in itertools.product('pqrstuvw', 'abcdefghijklmnopqrstuvwxyz')]
+
+
+def make_rule(rnd, variables):
+    # clauses of three literals over neighbouring variables, or-ed together
+    names = NAMES[:variables]
+    clauses = []
+    for i in range(0, variables, 2):
+        literals = [('!' if rnd.random() < 0.3 else '') + names[(i + k) % variables] for k in range(3)]
+        op = rnd.choice(['and', '==', '!='])
+        clauses.append(f'({literals[0]} and ({literals[1]} {op} {literals[2]}))')
+    return ' or '.join(clauses)
+
+
+def main(number=2000):
+    rnd = random.Random(1)
+    print(f"{'variables':>9} {'bdd nodes':>10} {'build ms':>9} {'tree us':>8} {'bdd us':>7} {'speedup':>8} {'equivalence us':>15}")
+    for variables in (20, 30, 40, 50, 60):
+        text = make_rule(rnd, variables)
+        bdd = BDD()
+        start = time.perf_counter()
+        function, error = compile_bdd('<bench>', text, bdd)
+        build = (time.perf_counter() - start) * 1e3
+        other, error = compile_bdd('<bench>', '!!(' + text + ')', bdd)
+
+        rows = [{name: rnd.random() < 0.5 for name in NAMES[:variables]} for i in range(16)]
+        tree = min(timeit.repeat(lambda: [function.compiled.evaluate(row) for row in rows], number=number // 16, repeat=3))
+        walk = min(timeit.repeat(lambda: [function.evaluate(row) for row in rows], number=number // 16, repeat=3))
+        equivalence = min(timeit.repeat(lambda: function.equivalent(other), number=number, repeat=3))
+
+        calls = number // 16 * 16
+        print(f'{variables:>9} {len(function):>10} {build:>9.1f} {tree / calls * 1e6:>8.1f} '
+              f'{walk / calls * 1e6:>7.1f} {tree / walk:>7.1f}x {equivalence / number * 1e6:>15.3f}')
+
+
+if __name__ == '__main__':
+    main()
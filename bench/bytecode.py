@@ -0,0 +1,46 @@
+# Compares one evaluation with the tree walking Interpreter, the closure
+# backend and the bytecode VM, and loading a stored program with parsing
+# the expression again.
+#
+#   python -m bench.bytecode
+
+import timeit
+
+import interpreter
+
+
+EXPRESSIONS = [
+    'true and false or !true',
+    'a > 3 and !(b == 2) or c <= 1.5',
+    '(a < b and b < c) or (isEven(a) and !isNotEven(b)) and !(c != 3)',
+    '!!!!(true and (1 < 2) and (2 >= 2) and !(3 == 4) or false)',
+]
+
+BINDINGS = {'a': 4, 'b': 7, 'c': 3}
+BACKENDS = ('tree', 'closure', 'bytecode')
+
+
+def per_call(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+
+def main(number=20000):
+    print(f"{'expression':<66}" + ''.join(f'{backend + " us":>12}' for backend in BACKENDS)
+          + f"{'bytes':>7} {'load us':>8} {'parse us':>9}")
+    for text in EXPRESSIONS:
+        timings = []
+        for backend in BACKENDS:
+            compiled, error = interpreter.compile('<bench>', text, backend)
+            if error:
+                raise SystemExit(error.as_string())
+            timings.append(per_call(lambda: compiled.evaluate(BINDINGS), number))
+
+        data = compiled.program.to_bytes()
+        load = per_call(lambda: interpreter.Program.from_bytes(data), number // 10)
+        parse = per_call(lambda: interpreter.compile('<bench>', text, 'bytecode'), number // 10)
+        print(f'{text:<66}' + ''.join(f'{timing:>12.2f}' for timing in timings)
+              + f'{len(data):>7} {load:>8.2f} {parse:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
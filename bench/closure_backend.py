@@ -0,0 +1,42 @@
+# Compares one evaluation of a compiled expression with the tree walking
+# Interpreter and with the closure backend.
+#
+#   python -m bench.closure_backend
+
+import timeit
+
+import interpreter
+
+
+EXPRESSIONS = [
+    'true and false or !true',
+    'a > 3 and !(b == 2) or c <= 1.5',
+    '(a < b and b < c) or (isEven(a) and !isNotEven(b)) and !(c != 3)',
+    '!!!!(true and (1 < 2) and (2 >= 2) and !(3 == 4) or false)',
+]
+
+BINDINGS = {'a': 4, 'b': 7, 'c': 3}
+
+
+def bench(text, number):
+    timings = {}
+    for backend in ('tree', 'closure'):
+        compiled, error = interpreter.compile('<bench>', text, backend)
+        if error:
+            raise SystemExit(error.as_string())
+        seconds = min(timeit.repeat(
+            lambda: compiled.evaluate(BINDINGS), number=number, repeat=5))
+        timings[backend] = seconds / number * 1e6
+    return timings
+
+
+def main(number=20000):
+    print(f"{'expression':<70} {'tree us':>9} {'closure us':>11} {'speedup':>8}")
+    for text in EXPRESSIONS:
+        timings = bench(text, number)
+        speedup = timings['tree'] / timings['closure']
+        print(f"{text:<70} {timings['tree']:>9.2f} {timings['closure']:>11.2f} {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Cold start of a worker which needs a library of rules: compiling all of
+# them, against opening a FileCache and loading all or a tenth of them.
+#
+#   python -m bench.filecache
+
+import gc
+import os
+import random
+import tempfile
+import time
+
+import interpreter
+from filecache import FileCache
+
+from bench.memory import make_rule
+
+
+def timed(function):
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def load(path, texts):
+    cache = FileCache(path)
+    for text in texts:
+        compiled, error = cache.get('<rules>', text, backend='closure')
+        if error:
+            raise SystemExit(error.as_string())
+    return cache
+
+
+def main(count=50000):
+    rnd = random.Random(1)
+    texts = list(dict.fromkeys(make_rule(rnd, rnd.randint(2, 12)) for i in range(count)))
+    used = rnd.sample(texts, len(texts) // 10)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'rules.cache')
+        seconds, compiled = timed(lambda: [interpreter.compile('<rules>', text, backend='closure') for text in texts])
+        print(f'{len(texts)} rules, compile all:        {seconds:8.2f}s')
+
+        seconds, cache = timed(lambda: load(path, texts))
+        seconds_save, saved = timed(cache.save)
+        cache.close()
+        print(f'first start, compile and save:   {seconds + seconds_save:8.2f}s '
+              f'({saved} entries, {os.path.getsize(path) / 2 ** 20:.1f} MiB)')
+
+        seconds, cache = timed(lambda: load(path, texts))
+        print(f'cold start, load all:            {seconds:8.2f}s')
+        cache.close()
+
+        seconds, cache = timed(lambda: load(path, used))
+        print(f'cold start, load a tenth:        {seconds:8.2f}s')
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Random expressions of the grammar in grammar.txt which parse and evaluate
+# without errors, for benchmarks. Operands of comparisons and calls are
+# numbers, everything joined by and/or/==/!= is a bool, so any grouping the
+# parser chooses is valid.
+#
+#   python -m bench.generator --count 5 --size 12
+
+import argparse
+import random
+
+
+# identifiers are letters only, the numeric and the bool ones
+NUMBER_NAMES = 'abcdefgh'
+BOOL_NAMES = 'pqrstuvw'
+METHODS = ('isEven', 'isNotEven')
+
+LOGICAL = ('and', 'or', '==', '!=')
+COMPARISONS = ('<', '<=', '>', '>=', '==', '!=')
+DEFAULT_OPERATORS = {'and': 4, 'or': 3, '==': 1, '!=': 1, '<': 2, '<=': 1, '>': 2, '>=': 1}
+
+
+def parse_operators(text):
+    # 'and:3,or:1,<=:2' into weights
+    operators = {}
+    for item in text.split(','):
+        op, _, weight = item.rpartition(':')
+        if op not in DEFAULT_OPERATORS:
+            raise ValueError(f"Unknown operator '{op}'")
+        operators[op] = float(weight)
+    return operators
+
+
+class ExpressionGenerator:
+    # size is the number of operands joined by operators, depth bounds the
+    # nesting of parentheses and negations, operators maps operators to
+    # their weight, identifiers and calls are the share of operands which
+    # are identifiers and method calls
+
+    def __init__(self, size=8, depth=4, operators=None, identifiers=0.5, calls=0.1, negations=0.1, seed=0):
+        if size < 1 or depth < 0:
+            raise ValueError('The size has to be at least 1 and the depth at least 0')
+        operators = dict(DEFAULT_OPERATORS if operators is None else operators)
+        self.logical = [(op, operators[op]) for op in LOGICAL if operators.get(op)]
+        self.comparisons = [(op, operators[op]) for op in COMPARISONS if operators.get(op)]
+        if not self.logical or not self.comparisons:
+            raise ValueError('At least one of and/or/==/!= and one comparison need a weight')
+        self.size = size
+        self.depth = depth
+        self.identifiers = identifiers
+        self.calls = calls
+        self.negations = negations
+        self.rnd = random.Random(seed)
+
+    def choose(self, weighted):
+        ops, weights = zip(*weighted)
+        return self.rnd.choices(ops, weights)[0]
+
+    def expression(self):
+        return self.boolean(self.size, self.depth)
+
+    def expressions(self, count):
+        return [self.expression() for i in range(count)]
+
+    def bindings(self):
+        # values for every identifier the expressions may use
+        rnd = self.rnd
+        values = {name: rnd.choice([rnd.randint(0, 100), round(rnd.uniform(0, 100), 2)]) for name in NUMBER_NAMES}
+        values.update({name: rnd.random() < 0.5 for name in BOOL_NAMES})
+        return values
+
+    def boolean(self, size, depth):
+        if size == 1:
+            return self.operand(depth)
+        group = depth > 0 and self.rnd.random() < 0.3
+        if group:
+            depth -= 1
+        left = self.rnd.randint(1, size - 1)
+        text = f'{self.boolean(left, depth)} {self.choose(self.logical)} {self.boolean(size - left, depth)}'
+        return f'({text})' if group else text
+
+    def operand(self, depth):
+        rnd = self.rnd
+        if depth and rnd.random() < self.negations:
+            # '!' binds tighter than a comparison, so it takes a group or a primary
+            if rnd.random() < 0.5:
+                return f'!({self.operand(depth - 1)})'
+            return '!' + self.bool_leaf()
+        if rnd.random() < self.calls:
+            return f'{rnd.choice(METHODS)}({self.number()})'
+        if rnd.random() < 0.2:
+            return self.bool_leaf()
+        op = self.choose(self.comparisons)
+        text = f'{self.number()} {op} {self.number()}'
+        # next to a == of bools '1 == a' would compare a bool with a number
+        return f'({text})' if op in ('==', '!=') else text
+
+    def number(self):
+        if self.rnd.random() < self.identifiers:
+            return self.rnd.choice(NUMBER_NAMES)
+        if self.rnd.random() < 0.8:
+            return str(self.rnd.randint(0, 100))
+        return f'{self.rnd.uniform(0, 100):.2f}'
+
+    def bool_leaf(self):
+        if self.rnd.random() < self.identifiers:
+            return self.rnd.choice(BOOL_NAMES)
+        return self.rnd.choice(('true', 'false'))
+
+
+def add_arguments(parser):
+    parser.add_argument('--size', type=int, default=8, help='operands per expression')
+    parser.add_argument('--depth', type=int, default=4, help='nesting of parentheses and negations')
+    parser.add_argument('--operators', type=parse_operators, default=None,
+                        help="operator weights, e.g. 'and:3,or:1,<=:2'")
+    parser.add_argument('--identifiers', type=float, default=0.5, help='share of identifier operands')
+    parser.add_argument('--calls', type=float, default=0.1, help='share of method calls')
+    parser.add_argument('--negations', type=float, default=0.1, help='share of negated operands')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def generator_from(args):
+    return ExpressionGenerator(args.size, args.depth, args.operators, args.identifiers, args.calls,
+                               args.negations, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prints random expressions')
+    parser.add_argument('--count', type=int, default=10)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    for text in generator_from(args).expressions(args.count):
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
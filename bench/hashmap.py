@@ -0,0 +1,98 @@
+# get/put per operation for the open addressing HashMap, the former
+# 16 bucket linked list implementation and a plain dict.
+#
+#   python -m bench.hashmap
+#
+# The legacy table is quadratic, its 100k row alone takes about two minutes.
+
+import random
+import time
+
+from hashmap import HashMap
+
+
+class LegacyNode:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.next = None
+
+
+class LegacyHashMap:
+    # the implementation before the open addressing table
+    def __init__(self):
+        self.store = [None for _ in range(16)]
+
+    def get(self, key):
+        index = hash(key) & 15
+        if self.store[index] is None:
+            return None
+        n = self.store[index]
+        while True:
+            if n.key == key:
+                return n.value
+            else:
+                if n.next:
+                    n = n.next
+                else:
+                    return None
+
+    def put(self, key, value):
+        nd = LegacyNode(key, value)
+        index = hash(key) & 15
+        n = self.store[index]
+        if n is None:
+            self.store[index] = nd
+        else:
+            if n.key == key:
+                n.value = value
+            else:
+                while n.next:
+                    if n.key == key:
+                        n.value = value
+                        return
+                    else:
+                        n = n.next
+                n.next = nd
+
+
+class Dict(dict):
+    def put(self, key, value):
+        self[key] = value
+
+
+def per_op(func, items):
+    start = time.perf_counter()
+    func(items)
+    return (time.perf_counter() - start) / len(items) * 1e9
+
+
+def measure(table_class, keys, lookups):
+    table = table_class()
+
+    def put_all(items):
+        for key in items:
+            table.put(key, key)
+
+    def get_all(items):
+        get = table.get
+        for key in items:
+            get(key)
+
+    return per_op(put_all, keys), per_op(get_all, lookups)
+
+
+def main():
+    rnd = random.Random(1)
+    print(f"{'keys':>7} {'impl':>8} {'put ns':>9} {'get ns':>9}")
+    for size in (10, 1_000, 100_000):
+        keys = [f'VAR{i}' for i in range(size)]
+        # lookups are sampled, the legacy table is quadratic
+        lookups = [rnd.choice(keys) for _ in range(10_000)]
+        for name, table_class in (('legacy', LegacyHashMap), ('hashmap', HashMap), ('dict', Dict)):
+            put, get = measure(table_class, keys, lookups)
+            print(f"{size:>7} {name:>8} {put:>9.0f} {get:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
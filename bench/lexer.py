@@ -0,0 +1,48 @@
+# Compares Lexer.make_tokens with the regex based FastLexer on long
+# generated expressions.
+#
+#   python -m bench.lexer
+
+import random
+import time
+
+import interpreter
+
+
+PARTS = ['true', 'false', 'a', 'isEven(b)', '12', '3.75', '!', '(', ')']
+OPERATORS = [' and ', ' or ', ' == ', ' != ', ' < ', ' <= ', ' > ', ' >= ']
+
+
+def make_text(size, seed=1):
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        part = rnd.choice(PARTS) + rnd.choice(OPERATORS)
+        parts.append(part)
+        length += len(part)
+    parts.append('true')
+    return ''.join(parts)
+
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f"{'size':>9} {'tokens':>8} {'char ms':>9} {'regex ms':>9} {'speedup':>8}")
+    for size in (10_000, 100_000, 1_000_000):
+        text = make_text(size)
+        tokens, error = interpreter.FastLexer('<bench>', text).make_tokens()
+        char = best_of(lambda: interpreter.Lexer('<bench>', text).make_tokens())
+        regex = best_of(lambda: interpreter.FastLexer('<bench>', text).make_tokens())
+        print(f"{len(text):>9} {len(tokens):>8} {char * 1e3:>9.1f} {regex * 1e3:>9.1f} {char / regex:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# Measures the bytes kept alive per compiled expression, i.e. what every
+# entry of a ParseCache costs.
+#
+#   python -m bench.memory
+
+import gc
+import random
+import tracemalloc
+
+import interpreter
+
+
+def make_rule(rnd, terms):
+    parts = []
+    for i in range(terms):
+        name = rnd.choice('abcdefgh')
+        parts.append(rnd.choice([
+            f'{name} > {rnd.randint(0, 100)}',
+            f'!({name} == {rnd.randint(0, 9)})',
+            f'isEven({name})',
+            f'{name} <= {rnd.random() * 10:.2f}',
+        ]))
+    return ' and '.join(parts[:terms // 2]) + ' or ' + ' and '.join(parts[terms // 2:])
+
+
+def bytes_per_expression(texts, lexer):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    compiled = [interpreter.compile('<bench>', text, lexer=lexer)[0] for text in texts]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the source texts themselves are not part of the cost
+    return (after - before) / len(compiled)
+
+
+def main(count=2000):
+    rnd = random.Random(1)
+    print(f"{'terms':>6} {'chars':>6} {'char lexer B':>13} {'regex lexer B':>14}")
+    for terms in (2, 8, 32):
+        texts = [make_rule(rnd, terms) for _ in range(count)]
+        char = bytes_per_expression(texts, 'char')
+        regex = bytes_per_expression(texts, 'regex')
+        chars = sum(map(len, texts)) / len(texts)
+        print(f"{terms:>6} {chars:>6.0f} {char:>13.0f} {regex:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
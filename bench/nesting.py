@@ -0,0 +1,42 @@
+# Parses and evaluates deeply nested expressions with the recursive Parser
+# and Interpreter and with the StackParser and StackInterpreter.
+#
+#   python -m bench.nesting
+
+import time
+
+import interpreter
+
+
+SHAPES = {
+    'parentheses': lambda depth: '(' * depth + 'a < 1' + ')' * depth,
+    'negations': lambda depth: '!' * depth + 'true',
+    'negated groups': lambda depth: '!(' * depth + 'a < 1' + ')' * depth,
+}
+
+
+def measure(text, **options):
+    start = time.perf_counter()
+    try:
+        compiled, error = interpreter.compile('<bench>', text, lexer='regex', **options)
+        if error:
+            raise SystemExit(error.as_string())
+        value, error = compiled.evaluate({'a': 0})
+    except RecursionError:
+        return None
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    print(f"{'shape':<15} {'depth':>7} {'recursive ms':>13} {'stack ms':>9}")
+    for name, shape in SHAPES.items():
+        for depth in (50, 100, 1000, 10000, 100000, 300000):
+            text = shape(depth)
+            recursive = measure(text)
+            stack = measure(text, parser='stack', backend='stack')
+            recursive = 'RecursionError' if recursive is None else f'{recursive:.1f}'
+            print(f'{name:<15} {depth:>7} {recursive:>13} {stack:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Compares the size of the ast and the time of one evaluation of an
+# expression compiled without and with the optimizer.
+#
+#   python -m bench.optimizer
+
+import timeit
+
+import interpreter
+
+
+EXPRESSIONS = [
+    '!!!!(true and (1 < 2) and (2 >= 2) and !(3 == 4) or false)',
+    '!!(a > 3) and (true or b == 2) and !(1 > 2)',
+    '!(!(a < 5) or !(b >= 2)) and c == true',
+    '(a < b and !!(b < 4)) or (isEven(a) and !false)',
+]
+
+BINDINGS = {'a': 4, 'b': 7, 'c': True}
+
+
+def bench(text, number, **options):
+    compiled, error = interpreter.compile('<bench>', text, **options)
+    if error:
+        raise SystemExit(error.as_string())
+    seconds = min(timeit.repeat(
+        lambda: compiled.evaluate(BINDINGS), number=number, repeat=5))
+    return interpreter.count_nodes(compiled.node), seconds / number * 1e6
+
+
+def main(number=20000):
+    print(f"{'expression':<62} {'nodes':>11} {'plain us':>9} {'optimized us':>13} {'speedup':>8}")
+    for text in EXPRESSIONS:
+        nodes, plain = bench(text, number)
+        optimized_nodes, optimized = bench(text, number, optimize=True)
+        print(f"{text:<62} {nodes:>4} -> {optimized_nodes:<4} {plain:>9.2f} {optimized:>13.2f} {plain / optimized:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
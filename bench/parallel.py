@@ -0,0 +1,57 @@
+# Scaling of evaluate_parallel over 1, 2, 4 and 8 worker processes,
+# compared with evaluating the same jobs in this process.
+#
+#   python -m bench.parallel
+
+import os
+import random
+import time
+
+import interpreter
+from parallel import evaluate_parallel
+
+
+RULES = [
+    'a > 3 and !(b == 2) or c <= 1.5',
+    '(a < b and b < c) or (isEven(a) and !isNotEven(b)) and !(c != 3)',
+    'isEven(a) or isEven(b) or isEven(c) and a >= 1 and b >= 1',
+    '!!!!(a > 0 and b > 0 and c > 0) or a == b',
+]
+
+
+def make_jobs(count, seed=1):
+    rnd = random.Random(seed)
+    return [(rnd.choice(RULES), {'a': rnd.randint(0, 9), 'b': rnd.randint(0, 9), 'c': rnd.random() * 5})
+            for _ in range(count)]
+
+
+def serial(jobs):
+    compiled = {}
+    results = []
+    for text, bindings in jobs:
+        if text not in compiled:
+            compiled[text] = interpreter.compile('<bench>', text)[0]
+        results.append(compiled[text].evaluate(bindings))
+    return results
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(count=200_000):
+    jobs = make_jobs(count)
+    print(f'{count} jobs, {os.cpu_count()} cpus')
+    print(f"{'workers':>8} {'seconds':>8} {'jobs/s':>9} {'speedup':>8}")
+
+    base = timed(serial, jobs)
+    print(f"{'serial':>8} {base:>8.2f} {count / base:>9.0f} {1:>7.2f}x")
+    for workers in (1, 2, 4, 8):
+        seconds = timed(evaluate_parallel, jobs, workers=workers, chunksize=2048)
+        print(f"{workers:>8} {seconds:>8.2f} {count / seconds:>9.0f} {base / seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+# Times the phases of the pipeline separately on generated expressions:
+# Lexer.make_tokens, Parser.parse and Interpreter.visit. Reports throughput,
+# p50/p99 latency and the peak traced memory per item, can write a cProfile
+# file per phase and stores the results as json, so that runs can be
+# compared. With regressions above the threshold the exit status is 1.
+#
+#   python -m bench.phases --count 2000 --size 16 --json base.json
+#   python -m bench.phases --profile profiles
+#   python -m bench.phases --compare base.json
+#   python -m bench.phases --compare base.json new.json
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+
+import interpreter
+from bench.generator import add_arguments, generator_from
+
+
+PHASES = ('lex', 'parse', 'evaluate')
+# metrics where a higher value is worse, and the one where it is better
+COSTS = ('p50_us', 'p99_us', 'mean_us', 'peak_bytes')
+THROUGHPUT = 'per_second'
+
+
+def percentile(ordered, p):
+    # nearest rank of sorted samples
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def prepare(texts, bindings):
+    # (phase, work, items), each phase gets the outputs of the one before
+    tokens = [interpreter.Lexer('<bench>', text).make_tokens()[0] for text in texts]
+    nodes = [interpreter.Parser(toks).parse().node for toks in tokens]
+    context = interpreter.Context('<bench>')
+    context.identifier = interpreter.identifier
+    context.bindings = interpreter.normalize_bindings(bindings)
+    return [
+        ('lex', lambda text: interpreter.Lexer('<bench>', text).make_tokens(), texts),
+        ('parse', lambda toks: interpreter.Parser(toks).parse(), tokens),
+        ('evaluate', lambda node: interpreter.Interpreter().visit(node, context), nodes),
+    ]
+
+
+def measure(work, items, repeat):
+    clock = time.perf_counter_ns
+    samples = []
+    for i in range(repeat):
+        for item in items:
+            start = clock()
+            work(item)
+            samples.append(clock() - start)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'items': len(items),
+        THROUGHPUT: len(samples) / total * 1e9,
+        'p50_us': percentile(samples, 50) / 1e3,
+        'p99_us': percentile(samples, 99) / 1e3,
+        'mean_us': total / len(samples) / 1e3,
+        'peak_bytes': peak_bytes(work, items),
+    }
+
+
+def peak_bytes(work, items):
+    # highest traced memory above the start, averaged over the items
+    tracemalloc.start()
+    total = 0
+    for item in items:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        work(item)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / len(items)
+
+
+def profile(name, work, items, directory, top=8):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for item in items:
+        work(item)
+    profiler.disable()
+    path = os.path.join(directory, f'{name}.prof')
+    profiler.dump_stats(path)
+    print(f'\n{name}: {path}')
+    pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(top)
+
+
+def run(args):
+    generator = generator_from(args)
+    texts = generator.expressions(args.count)
+    phases = prepare(texts, generator.bindings())
+
+    results = {
+        'config': {name: getattr(args, name) for name in
+                   ('count', 'size', 'depth', 'operators', 'identifiers', 'calls', 'negations', 'seed', 'repeat')},
+        'python': platform.python_version(),
+        'chars': sum(map(len, texts)) / len(texts),
+        'phases': {},
+    }
+    for name, work, items in phases:
+        results['phases'][name] = measure(work, items, args.repeat)
+    return results, phases
+
+
+def report(results):
+    print(f"{results['config']['count']} expressions of {results['chars']:.0f} chars on average")
+    print(f"{'phase':<9} {'per second':>11} {'p50 us':>8} {'p99 us':>8} {'mean us':>8} {'peak B':>8}")
+    for name in PHASES:
+        phase = results['phases'][name]
+        print(f"{name:<9} {phase[THROUGHPUT]:>11.0f} {phase['p50_us']:>8.1f} {phase['p99_us']:>8.1f} "
+              f"{phase['mean_us']:>8.1f} {phase['peak_bytes']:>8.0f}")
+
+
+def compare(base, new, threshold):
+    # prints the changes, returns the number of regressions
+    if base['config'] != new['config']:
+        print('warning: the runs were made with different configurations')
+    print(f"{'phase':<9} {'metric':<11} {'base':>10} {'new':>10} {'change':>8}")
+    regressions = 0
+    for name in PHASES:
+        for metric in COSTS + (THROUGHPUT,):
+            old, current = base['phases'][name][metric], new['phases'][name][metric]
+            change = (current - old) / old if old else 0.0
+            worse = -change if metric == THROUGHPUT else change
+            flag = ''
+            if worse > threshold:
+                flag = ' regression'
+                regressions += 1
+            print(f'{name:<9} {metric:<11} {old:>10.1f} {current:>10.1f} {change:>+8.1%}{flag}')
+    return regressions
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of lexer, parser and interpreter')
+    parser.add_argument('--count', type=int, default=1000, help='number of expressions')
+    parser.add_argument('--repeat', type=int, default=5, help='timed passes over the expressions')
+    add_arguments(parser)
+    parser.add_argument('--profile', metavar='DIR', help='write a cProfile file per phase')
+    parser.add_argument('--json', metavar='PATH', help='store the results')
+    parser.add_argument('--compare', metavar='PATH', nargs='+',
+                        help='compare with stored results, or two stored results without a run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change which counts as regression')
+    args = parser.parse_args(argv)
+
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes one or two files')
+    if args.compare and len(args.compare) == 2:
+        return 1 if compare(load(args.compare[0]), load(args.compare[1]), args.threshold) else 0
+
+    results, phases = run(args)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+        for name, work, items in phases:
+            profile(name, work, items, args.profile)
+    if args.compare:
+        print()
+        return 1 if compare(load(args.compare[0]), results, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# Matches records against 100 to 100k rules, once by evaluating every
+# compiled rule and once through a RuleSet and its predicate index.
+#
+#   python -m bench.ruleset
+
+import random
+import time
+
+from interpreter import TRUE
+from ruleset import RuleSet
+
+
+NAMES = 'abcdefgh'
+
+
+def make_rule(rnd):
+    # mostly conjunctions of thresholds, like alerting or routing rules
+    def predicate():
+        name = rnd.choice(NAMES)
+        return f'{name} {rnd.choice(["<", "<=", ">", ">=", "=="])} {rnd.randint(0, 1000)}'
+
+    kind = rnd.random()
+    if kind < 0.7:
+        return ' and '.join(predicate() for i in range(rnd.randint(1, 4)))
+    if kind < 0.9:
+        return f'({predicate()} and {predicate()}) or {predicate()}'
+    return f'{predicate()} and isEven({rnd.choice(NAMES)})'
+
+
+def main(records=50):
+    rnd = random.Random(1)
+    rows = [{name: rnd.randint(0, 1000) for name in NAMES} for i in range(records)]
+    print(f"{'rules':>7} {'predicates':>11} {'build s':>8} {'matches':>8} {'every rule ms':>14} {'ruleset ms':>11} {'speedup':>8}")
+    for count in (100, 1000, 10000, 100000):
+        rules = RuleSet(lexer='regex')
+        start = time.perf_counter()
+        for i in range(count):
+            rules.add(i, make_rule(rnd))
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matches = [rules.match(row) for row in rows]
+        indexed = (time.perf_counter() - start) / records
+
+        start = time.perf_counter()
+        every = [[i for i, compiled in enumerate(rules.rules) if compiled.evaluate(row)[0] is TRUE]
+                 for row in rows]
+        brute = (time.perf_counter() - start) / records
+        assert every == matches
+
+        found = sum(map(len, matches)) / records
+        print(f'{count:>7} {len(rules.predicates):>11} {build:>8.1f} {found:>8.0f} '
+              f'{brute * 1e3:>14.2f} {indexed * 1e3:>11.2f} {brute / indexed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Compares generated rules, in which the same comparisons occur again and
+# again, compiled as a tree and as a dag of shared nodes: bytes kept alive
+# by the compiled expression and time of one evaluation.
+#
+#   python -m bench.shared_nodes
+
+import gc
+import random
+import timeit
+import tracemalloc
+
+import interpreter
+
+
+def make_rule(rnd, clauses, distinct):
+    # clauses of three comparisons drawn from a small pool
+    pool = [f'{name} >= {rnd.randint(0, 20)}' for name in 'abcd' for i in range(distinct // 4)]
+    parts = []
+    for i in range(clauses):
+        parts.append('(' + ' and '.join(rnd.sample(pool, 3)) + ')')
+    return ' or '.join(parts) + ' or d < 0'
+
+
+def measure(text, **options):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    compiled, error = interpreter.compile('<bench>', text, **options)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if error:
+        raise SystemExit(error.as_string())
+
+    # every clause is false, so the whole rule is evaluated
+    bindings = {'a': -1, 'b': -1, 'c': -1, 'd': -1}
+    seconds = min(timeit.repeat(lambda: compiled.evaluate(bindings), number=20, repeat=5))
+    return size, seconds / 20 * 1e6
+
+
+def main():
+    rnd = random.Random(1)
+    print(f"{'clauses':>7} {'distinct':>8} {'backend':>8} {'tree KB':>8} {'dag KB':>7} "
+          f"{'tree us':>9} {'dag us':>9} {'speedup':>8}")
+    for clauses, distinct in ((50, 8), (200, 16), (300, 40)):
+        text = make_rule(rnd, clauses, distinct)
+        for backend in ('tree', 'closure'):
+            tree_size, tree_time = measure(text, backend=backend)
+            dag_size, dag_time = measure(text, backend=backend, share=True)
+            print(f'{clauses:>7} {distinct:>8} {backend:>8} {tree_size / 1024:>8.0f} {dag_size / 1024:>7.0f} '
+                  f'{tree_time:>9.1f} {dag_time:>9.1f} {tree_time / dag_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Time and peak traced memory of one parse and one tree walking evaluation,
+# the part of the work done by Parser and Interpreter, without lexing and
+# without building the context.
+#
+#   python -m bench.signals
+
+import random
+import timeit
+import tracemalloc
+
+import interpreter
+from bench.memory import make_rule
+
+
+def peak_bytes(work, items):
+    # highest traced memory above the start, averaged over the items
+    tracemalloc.start()
+    total = 0
+    for item in items:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        work(item)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / len(items)
+
+
+def main(count=300):
+    rnd = random.Random(1)
+    context = interpreter.Context('<bench>')
+    context.identifier = interpreter.identifier
+    context.bindings = {name: rnd.randint(0, 100) for name in 'ABCDEFGH'}
+
+    print(f"{'terms':>6} {'parse us':>9} {'parse peak B':>13} {'eval us':>8} {'eval peak B':>12}")
+    for terms in (2, 8, 32):
+        texts = [make_rule(rnd, terms) for i in range(count)]
+        tokens = [interpreter.Lexer('<bench>', text).make_tokens()[0] for text in texts]
+        nodes = [interpreter.Parser(toks).parse().node for toks in tokens]
+
+        def parse(toks):
+            return interpreter.Parser(toks).parse()
+
+        def evaluate(node):
+            return interpreter.Interpreter().visit(node, context)
+
+        parse_time = min(timeit.repeat(lambda: [parse(toks) for toks in tokens], number=3, repeat=3)) / 3 / count
+        eval_time = min(timeit.repeat(lambda: [evaluate(node) for node in nodes], number=3, repeat=3)) / 3 / count
+        print(f'{terms:>6} {parse_time * 1e6:>9.1f} {peak_bytes(parse, tokens):>13.0f} '
+              f'{eval_time * 1e6:>8.1f} {peak_bytes(evaluate, nodes):>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# Cost of the tracing hooks: lexing, parsing and evaluating without a
+# trace, with a trace at TRACE_OFF and with a full trace.
+#
+#   python -m bench.trace
+
+import timeit
+
+import interpreter
+
+
+TEXT = '(a < b and b < c) or (isEven(a) and !isNotEven(b)) and !(c != 3)'
+BINDINGS = {'a': 4, 'b': 7, 'c': 3}
+
+
+def pipeline(trace):
+    compiled, error = interpreter.compile('<bench>', TEXT, trace=trace)
+    compiled.evaluate(BINDINGS, trace=trace)
+
+
+def main(number=5000):
+    cases = [
+        ('no trace', lambda: None),
+        ('TRACE_OFF', lambda: interpreter.Trace(interpreter.TRACE_OFF)),
+        ('TRACE_VISITS', lambda: interpreter.Trace(interpreter.TRACE_VISITS)),
+    ]
+    compiled, error = interpreter.compile('<bench>', TEXT)
+
+    print(f"{'trace':<14} {'compile+eval us':>16} {'eval us':>9}")
+    for name, make_trace in cases:
+        full = min(timeit.repeat(lambda: pipeline(make_trace()), number=number, repeat=5))
+        evaluation = min(timeit.repeat(
+            lambda: compiled.evaluate(BINDINGS, trace=make_trace()), number=number, repeat=5))
+        print(f"{name:<14} {full / number * 1e6:>16.1f} {evaluation / number * 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Measures with tracemalloc what one evaluation allocates: the peak of
+# traced memory while it runs and the blocks its result keeps alive, and
+# its time, for the tree walker and the closures.
+#
+#   python -m bench.values
+
+import gc
+import random
+import timeit
+import tracemalloc
+
+import interpreter
+from bench.memory import make_rule
+
+
+def bindings(rnd):
+    return {name: rnd.choice([rnd.randint(0, 100), rnd.random() * 10]) for name in 'abcdefgh'}
+
+
+def peak_bytes(compiled, rows):
+    # highest traced memory above the start, averaged over the evaluations
+    total = 0
+    for row in rows:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        compiled.evaluate(row)
+        total += tracemalloc.get_traced_memory()[1] - current
+    return total / len(rows)
+
+
+def retained(compiled, rows):
+    # blocks and bytes of the results kept alive after their evaluation
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    results = [compiled.evaluate(row) for row in rows]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    del results
+    return blocks / len(rows), size / len(rows)
+
+
+def main(count=200, rows=50):
+    rnd = random.Random(1)
+    texts = [make_rule(rnd, terms) for terms in (2, 8, 32) for i in range(count // 3)]
+    records = [bindings(rnd) for i in range(rows)]
+    print(f"{'backend':>8} {'terms':>6} {'peak B/eval':>12} {'kept blocks/result':>19} {'kept B/result':>14} {'us/eval':>8}")
+    for backend in ('tree', 'closure'):
+        for terms, group in zip((2, 8, 32), (texts[:count // 3], texts[count // 3:2 * count // 3], texts[2 * count // 3:])):
+            compiled = [interpreter.compile('<bench>', text, backend)[0] for text in group]
+
+            tracemalloc.start()
+            peak = sum(peak_bytes(expr, records) for expr in compiled) / len(compiled)
+            blocks, size = map(sum, zip(*(retained(expr, records) for expr in compiled)))
+            tracemalloc.stop()
+
+            seconds = min(timeit.repeat(lambda: [expr.evaluate(row) for expr in compiled for row in records],
+                                        number=1, repeat=3))
+            print(f'{backend:>8} {terms:>6} {peak:>12.0f} {blocks / len(compiled):>19.1f} '
+                  f'{size / len(compiled):>14.0f} {seconds / len(compiled) / rows * 1e6:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
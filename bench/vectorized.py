@@ -0,0 +1,44 @@
+# Row by row evaluation with evaluate_many against one columnar pass.
+#
+#   python -m bench.vectorized
+
+import time
+
+import numpy as np
+
+import interpreter
+
+
+TEXT = 'a > 3 and !(b == 2) or isEven(a) and c <= 0.5'
+
+
+def main():
+    compiled, error = interpreter.compile('<bench>', TEXT)
+    rng = np.random.default_rng(1)
+
+    print(f"{'rows':>9} {'rows ms':>9} {'columns ms':>11} {'speedup':>8}")
+    for size in (1_000, 100_000, 1_000_000):
+        columns = {
+            'a': rng.integers(0, 10, size),
+            'b': rng.integers(0, 4, size),
+            'c': rng.random(size),
+        }
+
+        start = time.perf_counter()
+        compiled.evaluate_columns(columns)
+        vector = time.perf_counter() - start
+
+        # row by row is only timed on up to 100k rows and scaled up
+        sample = min(size, 100_000)
+        rows = [{name: column[i].item() for name, column in columns.items()}
+                for i in range(sample)]
+        start = time.perf_counter()
+        for _ in compiled.evaluate_many(rows):
+            pass
+        scalar = (time.perf_counter() - start) * size / sample
+
+        print(f"{size:>9} {scalar * 1e3:>9.1f} {vector * 1e3:>11.2f} {scalar / vector:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from interpreter import *
+
+
+##########################
+# FILE FORMAT
+##########################
+
+# header: magic, format, grammar version, number of entries, offset of the index
+# index: one record per entry sorted by key, so a lookup is a binary search
+# over the mapped file which only touches the pages it reads
+CACHE_MAGIC = b'BOOC'
+CACHE_FORMAT = 1
+HEADER = struct.Struct('<4sH16sIQ')
+ENTRY = struct.Struct('<16sQI')
+KEY_SIZE = 16
+
+
+def grammar_version():
+    # changes with the grammar rules, the keyword table and the layout of
+    # the stored nodes, entries of another version are never loaded
+    parts = [repr(GRAMMAR_RULES), repr(sorted(keyword.items())), str(marshal.version)]
+    for node_class in (Token, NumberNode, BooleanNode, BinOpNode, UnaryOpNode, CallNode, VarNode):
+        parts.append(f'{node_class.__name__}{node_class.__slots__}')
+    return hashlib.blake2b('\n'.join(parts).encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+def entry_key(fn, text, options):
+    # the compile options change the ast, so they are part of the key
+    source = repr((fn, text, sorted(options.items())))
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+def write_cache(path, entries):
+    # entries maps keys to encoded expressions, the file is replaced
+    # at once so readers see either the old or the new one
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, tmp_path = tempfile.mkstemp(dir=directory, prefix='.filecache-')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(b'\0' * HEADER.size)
+            index = []
+            offset = HEADER.size
+            for key in sorted(entries):
+                data = entries[key]
+                file.write(data)
+                index.append(ENTRY.pack(key, offset, len(data)))
+                offset += len(data)
+            file.write(b''.join(index))
+            file.seek(0)
+            file.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT, grammar_version(), len(index), offset))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+##########################
+# ENCODING
+##########################
+
+# kinds of the node records
+NUMBER, BOOLEAN, VAR, BINOP, UNARY, CALL = range(6)
+NODE_CLASSES = (NumberNode, BooleanNode, VarNode, BinOpNode, UnaryOpNode, CallNode)
+
+
+def encode(node):
+    # The ast as a flat tuple of records in post order, children are
+    # referenced by their record index, so shared nodes stay shared.
+    # Only ints and strings, which marshal reads much faster than pickle
+    # would rebuild the objects.
+    records = []
+    done = {}
+    pending = [node]
+    while pending:
+        current = pending[-1]
+        if id(current) in done:
+            pending.pop()
+            continue
+        children = [child for child in node_children(current) if id(child) not in done]
+        if children:
+            pending.extend(children)
+            continue
+        pending.pop()
+
+        span = (current.pos_start.idx, current.pos_end.idx)
+        if isinstance(current, BinOpNode):
+            record = (BINOP, done[id(current.left_node)], done[id(current.right_node)]) + encode_token(current.op_tok)
+        elif isinstance(current, UnaryOpNode):
+            record = (UNARY, done[id(current.node)]) + encode_token(current.op_tok)
+        elif isinstance(current, CallNode):
+            arg = -1 if current.arg_nodes is None else done[id(current.arg_nodes)]
+            record = (CALL, done[id(current.node_to_call)], arg)
+        elif isinstance(current, VarNode):
+            record = (VAR,) + encode_token(current.var_name_tok)
+        elif isinstance(current, BooleanNode):
+            record = (BOOLEAN,) + encode_token(current.tok)
+        else:
+            record = (NUMBER,) + encode_token(current.tok)
+        done[id(current)] = len(records)
+        records.append(record + span)
+    return tuple(records)
+
+
+def encode_token(tok):
+    return (tok.type, tok.value, tok.pos_start.idx, tok.pos_end.idx)
+
+
+def decode(records, source):
+    # builds the frozen nodes without running the constructors, this runs
+    # for every loaded entry and so avoids any call it can
+    set_slot = object.__setattr__
+    new = object.__new__
+    positions = {}
+    nodes = []
+
+    for record in records:
+        kind = record[0]
+        # the span of the node, before it the one of its token, calls
+        # have no token but their children there
+        for idx in record[-2:] if kind == CALL else record[-4:]:
+            if idx not in positions:
+                positions[idx] = Position(source, idx)
+
+        node = new(NODE_CLASSES[kind])
+        if kind == CALL:
+            set_slot(node, 'node_to_call', nodes[record[1]])
+            set_slot(node, 'arg_nodes', None if record[2] < 0 else nodes[record[2]])
+        else:
+            tok = new(Token)
+            type_, value, start, end = record[-6:-2]
+            set_slot(tok, 'type', type_)
+            set_slot(tok, 'value', value)
+            set_slot(tok, 'pos_start', positions[start])
+            set_slot(tok, 'pos_end', positions[end])
+            set_slot(tok, 'frozen', True)
+
+            if kind == BINOP:
+                set_slot(node, 'left_node', nodes[record[1]])
+                set_slot(node, 'right_node', nodes[record[2]])
+                set_slot(node, 'op_tok', tok)
+            elif kind == UNARY:
+                set_slot(node, 'node', nodes[record[1]])
+                set_slot(node, 'op_tok', tok)
+            elif kind == VAR:
+                set_slot(node, 'var_name_tok', tok)
+                set_slot(node, 'var_name_tok_value', value)
+            else:
+                set_slot(node, 'tok', tok)
+
+        set_slot(node, 'pos_start', positions[record[-2]])
+        set_slot(node, 'pos_end', positions[record[-1]])
+        set_slot(node, 'frozen', True)
+        nodes.append(node)
+    return nodes[-1]
+
+
+##########################
+# FILE CACHE
+##########################
+
+
+class FileCache:
+    # Persistent cache of compiled expressions, for processes which restart
+    # often and would parse the same rules again. The file is mapped into
+    # memory and an entry is only decoded once it is asked for. Files of
+    # another grammar version are ignored, misses are compiled and written
+    # on the next save.
+    # Processes which save the same file concurrently overwrite each other,
+    # which loses entries but never breaks the file.
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # compiled expressions of this process, and those not yet saved
+        self.loaded = {}
+        self.added = {}
+        self.hits = 0
+        self.misses = 0
+        self.file = None
+        self.map = None
+        self.count = 0
+        self.index_offset = 0
+        self.open()
+
+    def open(self):
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            file.close()
+            return
+
+        valid = len(data) >= HEADER.size
+        if valid:
+            magic, version, grammar, count, index_offset = HEADER.unpack_from(data)
+            valid = (magic == CACHE_MAGIC and version == CACHE_FORMAT and grammar == grammar_version()
+                     and index_offset + count * ENTRY.size == len(data))
+        if not valid:
+            data.close()
+            file.close()
+            return
+
+        self.file, self.map = file, data
+        self.count, self.index_offset = count, index_offset
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+        self.file = self.map = None
+        self.count = 0
+
+    def find(self, key):
+        # (offset, size) of the entry or None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.index_offset + mid * ENTRY.size
+            mid_key = self.map[start:start + KEY_SIZE]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return ENTRY.unpack_from(self.map, start)[1:]
+        return None
+
+    def load(self, key, fn, text, backend):
+        found = self.find(key)
+        if found is None:
+            return None
+        offset, size = found
+        entry_fn, entry_text, records = marshal.loads(self.map[offset:offset + size])
+        # guards against a collision of the hashed keys
+        if entry_fn != fn or entry_text != text:
+            return None
+        return CompiledExpression(fn, text, decode(records, Source(fn, text)), backend)
+
+    def get(self, fn, text, metrics=None, **options):
+        key = entry_key(fn, text, options)
+
+        with self.lock:
+            compiled = self.loaded.get(key)
+            if compiled is None and self.map is not None:
+                compiled = self.load(key, fn, text, options.get('backend', 'tree'))
+                if compiled is not None:
+                    self.loaded[key] = compiled
+            if compiled is not None:
+                self.hits += 1
+                return compiled, None
+            self.misses += 1
+
+        # compile outside of the lock, errors are not cached
+        compiled, error = compile(fn, text, metrics=metrics, **options)
+        if error:
+            return None, error
+
+        with self.lock:
+            compiled = self.loaded.setdefault(key, compiled)
+            self.added[key] = compiled
+        return compiled, None
+
+    def save(self):
+        # writes the entries of the file and the ones compiled since,
+        # returns the number of entries
+        with self.lock:
+            entries = {}
+            if self.map is not None:
+                view = memoryview(self.map)
+                for i in range(self.count):
+                    key, offset, size = ENTRY.unpack_from(self.map, self.index_offset + i * ENTRY.size)
+                    entries[key] = view[offset:offset + size]
+            for key, compiled in self.added.items():
+                entries[key] = marshal.dumps((compiled.fn, compiled.text, encode(compiled.node)))
+
+            count = len(entries)
+            write_cache(self.path, entries)
+            # the views have to be gone before the map can be closed
+            entries = view = None
+            self.added.clear()
+            self.close()
+            self.open()
+            return count
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': self.count,
+                'loaded': len(self.loaded),
+                'unsaved': len(self.added),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -1,42 +1,128 @@
-class Node:
-    def __init__(self, key, value):
-        self.key = key
-        self.value = value
-        self.next = None
+# markers for free and deleted slots, keys are compared by identity first
+EMPTY = object()
+DELETED = object()
+
+MIN_SIZE = 16
+
 
 class HashMap:
-    def __init__(self):
-        self.store = [None for _ in range(16)]
+    # Open addressing with the same perturbed probing as cpython's dict.
+    # The table grows (or is rebuilt without deleted slots) once more than
+    # two thirds of it are in use.
+
+    def __init__(self, capacity=MIN_SIZE):
+        size = MIN_SIZE
+        while size * 2 < capacity * 3:
+            size <<= 1
+        self.init_table(size)
+        self.count = 0
+
+    def init_table(self, size):
+        self.mask = size - 1
+        self.hashes = [0] * size
+        self.keys = [EMPTY] * size
+        self.values = [None] * size
+        # live and deleted slots
+        self.used = 0
+
+    def find_slot(self, key, hash_):
+        # index of the key, or of the first free or deleted slot for it
+        mask = self.mask
+        keys = self.keys
+        hashes = self.hashes
+        i = hash_ & mask
+        perturb = hash_ & 0xFFFFFFFFFFFFFFFF
+        free = -1
+
+        while True:
+            k = keys[i]
+            if k is EMPTY:
+                return i if free < 0 else free
+            if k is DELETED:
+                if free < 0:
+                    free = i
+            elif k is key or (hashes[i] == hash_ and k == key):
+                return i
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+
     def get(self, key):
-        index = hash(key) & 15
-        if self.store[index] is None:
-            return None
-        n = self.store[index]
+        hash_ = hash(key)
+        mask = self.mask
+        keys = self.keys
+        i = hash_ & mask
+        perturb = hash_ & 0xFFFFFFFFFFFFFFFF
+
         while True:
-            if n.key == key:
-                return n.value
-            else:
-                if n.next:
-                    n = n.next
-                else:
-                    return None
+            k = keys[i]
+            if k is EMPTY:
+                return None
+            if k is key or (k is not DELETED and self.hashes[i] == hash_ and k == key):
+                return self.values[i]
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+
     def put(self, key, value):
-        nd = Node(key, value)
-        index = hash(key) & 15
-        n = self.store[index]
-        if n is None:
-            self.store[index] = nd
+        hash_ = hash(key)
+        i = self.find_slot(key, hash_)
+        k = self.keys[i]
+
+        if k is EMPTY or k is DELETED:
+            if k is EMPTY:
+                self.used += 1
+            self.count += 1
+            self.hashes[i] = hash_
+            self.keys[i] = key
+            self.values[i] = value
+            if self.used * 3 > (self.mask + 1) * 2:
+                self.resize()
         else:
-            if n.key == key:
-                n.value = value
-            else:
-                while n.next:
-                    if n.key == key:
-                        n.value = value
-                        return
-                    else:
-                        n = n.next
-                n.next = nd
-
-
-                
\ No newline at end of file
+            self.values[i] = value
+
+    def delete(self, key):
+        i = self.find_slot(key, hash(key))
+        k = self.keys[i]
+        if k is EMPTY or k is DELETED:
+            return False
+
+        # the slot stays used, so probing continues past it
+        self.keys[i] = DELETED
+        self.values[i] = None
+        self.count -= 1
+        return True
+
+    def resize(self):
+        old_hashes, old_keys, old_values = self.hashes, self.keys, self.values
+
+        size = MIN_SIZE
+        while size < self.count * 3:
+            size <<= 1
+        self.init_table(size)
+
+        for hash_, key, value in zip(old_hashes, old_keys, old_values):
+            if key is EMPTY or key is DELETED:
+                continue
+            i = self.find_slot(key, hash_)
+            self.hashes[i] = hash_
+            self.keys[i] = key
+            self.values[i] = value
+            self.used += 1
+
+    def items(self):
+        for key, value in zip(self.keys, self.values):
+            if key is not EMPTY and key is not DELETED:
+                yield key, value
+
+    def __iter__(self):
+        for key, value in self.items():
+            yield key
+
+    def __contains__(self, key):
+        k = self.keys[self.find_slot(key, hash(key))]
+        return k is not EMPTY and k is not DELETED
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return 'HashMap({' + ', '.join(f'{key!r}: {value!r}' for key, value in self.items()) + '})'
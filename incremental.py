@@ -0,0 +1,101 @@
+from interpreter import *
+
+
+##########################
+# DEPENDENCIES
+##########################
+
+
+def dependencies(node):
+    # the nodes which depend on each identifier, i.e. the paths from its
+    # VarNodes to the root, and the number of nodes below every node
+    dependents = {}
+    sizes = {}
+    names = {}
+    pending = [(node, False)]
+    while pending:
+        current, done = pending.pop()
+        children = node_children(current)
+        if not done:
+            if current not in sizes:
+                pending.append((current, True))
+                pending.extend((child, False) for child in children)
+            continue
+        if current in sizes:
+            continue
+
+        sizes[current] = 1 + sum(sizes[child] for child in children)
+        if isinstance(current, VarNode):
+            names[current] = frozenset((current.var_name_tok.value,))
+        else:
+            names[current] = frozenset().union(*(names[child] for child in children))
+        for name in names[current]:
+            dependents.setdefault(name, []).append(current)
+    return dependents, sizes
+
+##########################
+# INCREMENTAL EVALUATOR
+##########################
+
+
+class IncrementalEvaluator(Interpreter):
+    # Evaluates one compiled expression for a record which changes a few
+    # identifiers at a time. The results of all visited nodes are kept,
+    # an update only drops those which depend on a changed identifier, so
+    # the next evaluation revisits the paths from the changed leaves to
+    # the root and reuses every other subtree.
+    # Only the bindings are tracked, the identifier table and the bound
+    # methods are expected not to change.
+
+    def __init__(self, compiled, bindings=None):
+        super().__init__()
+        self.compiled = compiled
+        self.dependents, self.sizes = dependencies(compiled.node)
+        self.results = {}
+        self.context = Context('<program>')
+        self.context.identifier = identifier
+        self.context.bindings = normalize_bindings(bindings) or {}
+        # nodes visited again and nodes whose result was reused
+        self.recomputed = 0
+        self.skipped = 0
+
+    def walk(self, node, context):
+        # errors are kept like values, they only change with the bindings too
+        outcome = self.results.get(node)
+        if outcome is not None:
+            self.skipped += self.sizes[node]
+        else:
+            try:
+                outcome = Interpreter.walk(self, node, context), None
+            except ErrorSignal as signal:
+                outcome = None, signal.error
+            self.results[node] = outcome
+            self.recomputed += 1
+
+        value, error = outcome
+        if error:
+            raise ErrorSignal(error)
+        return value
+
+    def evaluate(self):
+        result = self.visit(self.compiled.node, self.context)
+        return result.value, result.error
+
+    def update(self, changes):
+        # rebinds the changed identifiers and evaluates again
+        bindings = self.context.bindings
+        for name, value in (normalize_bindings(changes) or {}).items():
+            if name in bindings and bindings[name] is value:
+                continue
+            bindings[name] = value
+            for node in self.dependents.get(name, ()):
+                self.results.pop(node, None)
+        return self.evaluate()
+
+    def stats(self):
+        return {
+            'nodes': len(self.sizes),
+            'cached': len(self.results),
+            'recomputed': self.recomputed,
+            'skipped': self.skipped,
+        }
@@ -6,8 +6,18 @@
 from hashmap import HashMap
 from string_with_arrows import *
 from keyword import *
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from array import array
+import copy
+import json
+import os
+import re
 import string
-import types
+import struct
+import tempfile
+import threading
+import time
 
 
 # Token Types
@@ -27,10 +37,21 @@ TT_GTE = '>='
 TT_EOF = 'EOF'
 
 
+def vectorized(implementation):
+    # declares an implementation which takes a whole numpy column of ints,
+    # used by the columnar evaluation instead of one call per row
+    def declare(func):
+        func.vectorized = implementation
+        return func
+    return declare
+
+
+@vectorized(lambda column: (column % 2) == 0)
 def isEven(arg):
     return (arg % 2) == 0
 
 
+@vectorized(lambda column: (column % 2) != 0)
 def isNotEven(arg):
     return (arg % 2) != 0
 
@@ -126,37 +147,348 @@ class RTError(Error):
         return 'Traceback (most recent call last):\n' + result
 
 
+# carries an Error out of the lexer, the parser rules, the interpreter
+# and compiled closures, the public entry points turn it back into the
+# (result, error) contract
+class ErrorSignal(Exception):
+    def __init__(self, error):
+        super().__init__(error.details)
+        self.error = error
+
+
+##########################
+# TRACE
+##########################
+
+TRACE_OFF = 0
+TRACE_TOKENS = 1
+TRACE_PARSE = 2
+TRACE_VISITS = 3
+
+
+class TraceEvent:
+    __slots__ = ('phase', 'name', 'node', 'result')
+
+    def __init__(self, phase, name, node, result):
+        self.phase = phase
+        self.name = name
+        self.node = node
+        self.result = result
+
+    def __repr__(self):
+        return f'{self.phase} {self.name}: {self.result}'
+
+
+class Trace:
+    # Collects what the Lexer, Parser and Interpreter did, depending on the
+    # level. Components only install their tracing hooks when a trace with
+    # a high enough level is passed, without one nothing is checked.
+
+    def __init__(self, level=TRACE_VISITS):
+        self.level = level
+        self.events = []
+
+    def enabled(self, level):
+        return self.level >= level
+
+    def record(self, phase, name, node, result):
+        self.events.append(TraceEvent(phase, name, node, result))
+
+    def phase(self, phase):
+        return [event for event in self.events if event.phase == phase]
+
+    def format(self):
+        return '\n'.join(repr(event) for event in self.events)
+
+
+def tracing(trace, level):
+    return trace is not None and trace.enabled(level)
+
+##########################
+# METRICS
+##########################
+
+METRIC_PHASES = ('lex', 'parse', 'evaluate')
+# upper bounds of the histogram buckets in nanoseconds, 1us to 100ms
+METRIC_BUCKETS = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000,
+                  1000000, 2500000, 5000000, 10000000, 25000000, 100000000)
+METRIC_COUNTERS = ('tokens', 'nodes', 'calls')
+
+
+class Histogram:
+    # counts per bucket, the last one is unbounded
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=METRIC_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, ns):
+        self.counts[bisect_left(self.bounds, ns)] += 1
+        self.sum += ns
+        self.count += 1
+
+
+class Metrics:
+    # In-process registry for run, compile and CompiledExpression.evaluate:
+    # - nanoseconds per call of Lexer.make_tokens, Parser.parse and the
+    #   evaluation, as histograms
+    # - counters of tokens, visited nodes and method calls, the closure
+    #   and bytecode backends don't visit nodes and don't count them
+    # - errors by Error subclass
+    # Like a Trace it's only passed where it's wanted, without one nothing
+    # is measured. Components count locally and add their totals once per
+    # call, under a lock, so one registry can serve many threads.
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.phases = {phase: Histogram(self.buckets) for phase in METRIC_PHASES}
+            self.counters = dict.fromkeys(METRIC_COUNTERS, 0)
+            self.errors = {}
+
+    def observe(self, phase, ns, error=None, **counts):
+        # one call of a phase, with what it counted
+        with self.lock:
+            self.phases[phase].observe(ns)
+            for name, count in counts.items():
+                self.counters[name] += count
+            if error is not None:
+                name = type(error).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def snapshot(self):
+        # a consistent copy of all values as plain dicts
+        with self.lock:
+            return {
+                'phases': {phase: {
+                    'buckets': dict(zip(self.buckets + (float('inf'),), histogram.counts)),
+                    'sum_ns': histogram.sum,
+                    'count': histogram.count,
+                } for phase, histogram in self.phases.items()},
+                'counters': dict(self.counters),
+                'errors': dict(self.errors),
+            }
+
+    def prometheus(self, prefix='boolean_expr'):
+        # the snapshot in the prometheus text format, times in seconds
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_phase_seconds Time per call of the lexer, the parser and the evaluation',
+            f'# TYPE {prefix}_phase_seconds histogram',
+        ]
+        for phase, histogram in snapshot['phases'].items():
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound / 1e9)
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {histogram["sum_ns"] / 1e9!r}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {histogram["count"]}')
+
+        for name, value in snapshot['counters'].items():
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+
+        lines.append(f'# TYPE {prefix}_errors_total counter')
+        for name, value in sorted(snapshot['errors'].items()):
+            lines.append(f'{prefix}_errors_total{{error="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='boolean_expr'):
+        # replaces the file at once, e.g. for the textfile collector of
+        # the node exporter
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        try:
+            with os.fdopen(handle, 'w') as file:
+                file.write(self.prometheus(prefix))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+##########################
+# PROFILE
+##########################
+
+
+class ProfileEntry:
+    # one span of the source, for every node of the ast which covers it
+    __slots__ = ('pos_start', 'pos_end', 'kind', 'calls', 'cumulative_ns', 'self_ns')
+
+    def __init__(self, node):
+        self.pos_start = node.pos_start
+        self.pos_end = node.pos_end
+        self.kind = type(node).__name__
+        self.calls = 0
+        self.cumulative_ns = 0
+        self.self_ns = 0
+
+    def __repr__(self):
+        return (f'{self.kind}({self.pos_start.idx}, {self.pos_end.idx}): {self.calls} calls, '
+                f'{self.cumulative_ns}ns cumulative, {self.self_ns}ns self')
+
+
+class Profile:
+    # Calls and time per node of the Interpreter, keyed by the source and
+    # pos_start/pos_end of the node. The cumulative time includes the
+    # children of a node, the self time doesn't. Shared with every
+    # evaluation it's passed to, one thread at a time.
+
+    def __init__(self):
+        self.entries = {}
+        # time spent in the children of the node being visited
+        self.children = 0
+
+    def add(self, node, cumulative, own):
+        key = (node.pos_start.source, node.pos_start.idx, node.pos_end.idx)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = ProfileEntry(node)
+        entry.calls += 1
+        entry.cumulative_ns += cumulative
+        entry.self_ns += own
+
+    def total_ns(self):
+        return sum(entry.self_ns for entry in self.entries.values())
+
+    def hotspots(self, top=5, key='self_ns'):
+        if key not in ('self_ns', 'cumulative_ns', 'calls'):
+            raise ValueError(f"Unknown profile key '{key}'")
+        return sorted(self.entries.values(), key=lambda entry: getattr(entry, key), reverse=True)[:top]
+
+    def report(self, top=5, key='self_ns'):
+        # the most expensive spans underlined in their source
+        total = self.total_ns() or 1
+        blocks = []
+        for rank, entry in enumerate(self.hotspots(top, key), 1):
+            pos_start, pos_end = entry.pos_start, entry.pos_end
+            header = (f'#{rank} {entry.kind}, File {pos_start.fn}, line {pos_start.ln + 1}: '
+                      f'{entry.calls} calls, {entry.cumulative_ns / 1e3:.1f}us cumulative, '
+                      f'{entry.self_ns / 1e3:.1f}us self ({entry.self_ns / total:.1%})')
+            blocks.append(header + '\n' + string_with_arrows(pos_start.ftxt, pos_start, pos_end))
+        return '\n\n'.join(blocks)
+
 ##########################
 # POSITION
 ##########################
 
+
+class Source:
+    # the text of one file, line starts are only searched
+    # once a line or column is asked for
+    __slots__ = ('fn', 'text', 'line_starts')
+
+    def __init__(self, fn, text):
+        self.fn = fn
+        self.text = text
+        self.line_starts = None
+
+    def line_col(self, idx):
+        if self.line_starts is None:
+            self.line_starts = [0] + [
+                match.end() for match in re.finditer('\n', self.text)]
+        ln = bisect_right(self.line_starts, idx) - 1
+        return ln, idx - self.line_starts[ln]
+
+
 class Position:
-    def __init__(self, idx, ln, col, fn, ftxt):
+    # offset into a shared Source, line and column are derived on demand
+    __slots__ = ('source', 'idx')
+
+    def __init__(self, source, idx):
+        self.source = source
         self.idx = idx
-        self.ln = ln
-        self.col = col
-        self.fn = fn
-        self.ftxt = ftxt
+
+    @property
+    def ln(self):
+        return self.source.line_col(self.idx)[0]
+
+    @property
+    def col(self):
+        return self.source.line_col(self.idx)[1]
+
+    @property
+    def fn(self):
+        return self.source.fn
+
+    @property
+    def ftxt(self):
+        return self.source.text
 
     def advance(self, current_char=None):
         self.idx += 1
-        self.col += 1
+        return self
 
-        if current_char == '\n':
-            self.ln += 1
-            self.col = 0
+    def copy(self):
+        return Position(self.source, self.idx)
 
+##########################
+# FREEZABLE
+##########################
+
+
+class Freezable:
+    # tokens and ast nodes get frozen once parsing is done, so a cached
+    # ast can be shared between concurrent evaluations
+    __slots__ = ('frozen',)
+
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls)
+        object.__setattr__(self, 'frozen', False)
         return self
 
-    def copy(self):
-        return Position(self.idx, self.ln, self.col, self.fn, self.ftxt)
+    def __setattr__(self, name, value):
+        if self.frozen:
+            raise AttributeError(
+                f"'{type(self).__name__}' is frozen, can't set '{name}'")
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if self.frozen:
+            raise AttributeError(
+                f"'{type(self).__name__}' is frozen, can't delete '{name}'")
+        object.__delattr__(self, name)
+
+    def __getstate__(self):
+        state = {'frozen': self.frozen}
+        for name in type(self).__slots__:
+            if hasattr(self, name):
+                state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        # the frozen flag may come before the other slots
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def freeze(self):
+        # without recursion, asts can be nested arbitrarily deep
+        pending = [self]
+        while pending:
+            current = pending.pop()
+            object.__setattr__(current, 'frozen', True)
+            for name in type(current).__slots__:
+                value = getattr(current, name, None)
+                if isinstance(value, Freezable) and not value.frozen:
+                    pending.append(value)
+        return self
 
 ##########################
 # TOKEN
 ##########################
 
 
-class Token:
+class Token(Freezable):
+    __slots__ = ('type', 'value', 'pos_start', 'pos_end')
+
     def __init__(self, type_, value=None, pos_start=None, pos_end=None):
         self.type = type_
         self.value = value
@@ -167,7 +499,19 @@ class Token:
             self.pos_end.advance()
 
         if pos_end:
-            self.pos_end = pos_end
+            self.pos_end = pos_end.copy()
+
+    @classmethod
+    def spanning(cls, type_, value, pos_start, pos_end):
+        # takes the positions over without copying them,
+        # for lexers which create fresh positions per token
+        tok = cls.__new__(cls)
+        set_slot = object.__setattr__
+        set_slot(tok, 'type', type_)
+        set_slot(tok, 'value', value)
+        set_slot(tok, 'pos_start', pos_start)
+        set_slot(tok, 'pos_end', pos_end)
+        return tok
 
     def matches(self, type_, value):
         return self.type == type_ and self.value == value
@@ -183,13 +527,23 @@ class Token:
 ##########################
 
 class Lexer:
-    def __init__(self, fn, text):
+    def __init__(self, fn, text, trace=None):
         self.fn = fn
         self.text = text
-        self.pos = Position(-1, 0, -1, fn, text)
+        self.source = Source(fn, text)
+        self.pos = Position(self.source, -1)
         self.current_char = None
         self.advance()
 
+        self.trace = trace
+        if tracing(trace, TRACE_TOKENS):
+            self.make_tokens = self.traced_make_tokens
+
+    def traced_make_tokens(self):
+        tokens, error = Lexer.make_tokens(self)
+        self.trace.record('lex', 'tokens', None, error or tokens)
+        return tokens, error
+
     def advance(self):
         self.pos.advance(self.current_char)
         self.current_char = self.text[self.pos.idx] if len(
@@ -253,8 +607,7 @@ class Lexer:
         if self.is_token_type(word):
             return Token(TT_KEYWORD, word, pos_start, self.pos), None
         else:
-            print("ich mach das")
-            return Token(TT_IDENTIFIER, identifier.get(word), pos_start, self.pos), None
+            return Token(TT_IDENTIFIER, word, pos_start, self.pos), None
 
     def check_identifier(self, word):
         word_identifier = identifier.get(word)
@@ -352,12 +705,94 @@ class Lexer:
         else:
             return False
 
+##########################
+# FAST LEXER
+##########################
+
+TOKEN_REGEX = re.compile(r'''
+    (?P<SPACE>[ \t]+)
+  | (?P<WORD>[A-Za-z]+)
+  | (?P<FLOAT>[0-9]+\.[0-9]*)
+  | (?P<INT>[0-9]+)
+  | (?P<OP>==|!=|<=|>=|[()!<>])
+  | (?P<ILLEGAL>.)
+''', re.VERBOSE | re.DOTALL)
+
+OP_TYPES = {
+    '(': TT_LK, ')': TT_RK, '!': TT_NEG,
+    '==': TT_EE, '!=': TT_NE,
+    '<': TT_LT, '>': TT_GT, '<=': TT_LTE, '>=': TT_GTE,
+}
+
+
+class FastLexer:
+    # Tokenizes with one master regex instead of advancing char by char,
+    # yields the same tokens as Lexer.make_tokens.
+
+    def __init__(self, fn, text, trace=None):
+        self.fn = fn
+        self.text = text
+        self.source = Source(fn, text)
+
+        self.trace = trace
+        if tracing(trace, TRACE_TOKENS):
+            self.make_tokens = self.traced_make_tokens
+
+    def traced_make_tokens(self):
+        tokens, error = FastLexer.make_tokens(self)
+        self.trace.record('lex', 'tokens', None, error or tokens)
+        return tokens, error
+
+    def iter_tokens(self):
+        source = self.source
+        spanning = Token.spanning
+
+        for match in TOKEN_REGEX.finditer(self.text):
+            kind = match.lastgroup
+            if kind == 'SPACE':
+                continue
+
+            start, end = match.span()
+            pos_start = Position(source, start)
+            pos_end = Position(source, end)
+            lexeme = match.group()
+
+            if kind == 'WORD':
+                word = lexeme.upper()
+                if keyword.get(word) is not None:
+                    yield spanning(TT_KEYWORD, word, pos_start, pos_end)
+                else:
+                    yield spanning(TT_IDENTIFIER, word, pos_start, pos_end)
+            elif kind == 'INT':
+                yield spanning(TT_INT, int(lexeme), pos_start, pos_end)
+            elif kind == 'FLOAT':
+                yield spanning(TT_FLOAT, float(lexeme), pos_start, pos_end)
+            elif kind == 'OP':
+                yield spanning(OP_TYPES[lexeme], None, pos_start, pos_end)
+            elif lexeme == '=':
+                raise ErrorSignal(ExpectedCharError(
+                    pos_start, pos_end, "'=' (after '=')"))
+            else:
+                raise ErrorSignal(IllegalCharError(
+                    pos_start, pos_end, "'" + lexeme + "'"))
+
+        end = len(self.text)
+        yield spanning(TT_EOF, None, Position(source, end), Position(source, end + 1))
+
+    def make_tokens(self):
+        try:
+            return list(self.iter_tokens()), None
+        except ErrorSignal as signal:
+            return [], signal.error
+
 ##########################
 # NODES
 ##########################
 
 
-class NumberNode:
+class NumberNode(Freezable):
+    __slots__ = ('tok', 'pos_start', 'pos_end')
+
     def __init__(self, tok):
         self.tok = tok
 
@@ -368,7 +803,9 @@ class NumberNode:
         return f'{self.tok}'
 
 
-class BooleanNode:
+class BooleanNode(Freezable):
+    __slots__ = ('tok', 'pos_start', 'pos_end')
+
     def __init__(self, tok):
         self.tok = tok
 
@@ -379,7 +816,9 @@ class BooleanNode:
         return f'{self.tok}'
 
 
-class BinOpNode:
+class BinOpNode(Freezable):
+    __slots__ = ('left_node', 'op_tok', 'right_node', 'pos_start', 'pos_end')
+
     def __init__(self, left_node, op_tok, right_node):
         self.left_node = left_node
         self.op_tok = op_tok
@@ -392,7 +831,9 @@ class BinOpNode:
         return f'({self.left_node}, {self.op_tok}, {self.right_node})'
 
 
-class UnaryOpNode:
+class UnaryOpNode(Freezable):
+    __slots__ = ('op_tok', 'node', 'pos_start', 'pos_end')
+
     def __init__(self, op_tok, node):
         self.op_tok = op_tok
         self.node = node
@@ -404,7 +845,9 @@ class UnaryOpNode:
         return f'({self.op_tok}, {self.node})'
 
 
-class CallNode:
+class CallNode(Freezable):
+    __slots__ = ('node_to_call', 'arg_nodes', 'pos_start', 'pos_end')
+
     def __init__(self, node_to_call, arg_nodes):
         self.node_to_call = node_to_call
         self.arg_nodes = arg_nodes
@@ -417,7 +860,9 @@ class CallNode:
             self.pos_end = self.node_to_call.pos_end
 
 
-class VarNode:
+class VarNode(Freezable):
+    __slots__ = ('var_name_tok', 'var_name_tok_value', 'pos_start', 'pos_end')
+
     def __init__(self, var_name_tok):
         self.var_name_tok = var_name_tok
         self.var_name_tok_value = var_name_tok.value
@@ -450,17 +895,146 @@ class ParseResult:
         self.error = error
         return self
 
+##########################
+# SHARED NODES
+##########################
+
+
+def node_key(node):
+    # structural key of a node whose inner children are already shared,
+    # so they compare by identity and leaves by their value
+    if isinstance(node, BinOpNode):
+        return (BinOpNode, node.op_tok.type, node.op_tok.value, child_key(node.left_node), child_key(node.right_node))
+    if isinstance(node, UnaryOpNode):
+        return (UnaryOpNode, node.op_tok.type, child_key(node.node))
+    if isinstance(node, CallNode):
+        return (CallNode, child_key(node.node_to_call), child_key(node.arg_nodes))
+    if isinstance(node, VarNode):
+        return (VarNode, node.var_name_tok.value)
+    # 1 and 1.0 are different literals
+    return (type(node), type(node.tok.value), node.tok.value)
+
+
+def child_key(node):
+    if isinstance(node, (BooleanNode, NumberNode, VarNode)):
+        return node_key(node)
+    return id(node)
+
+
+class NodeTable:
+    # Hash-consing of ast nodes: structurally identical subtrees become
+    # one node, the ast turns into a dag. A shared node keeps the position
+    # of its first occurrence, which is where its errors are reported.
+    # Every other node keeps the span of its own text. Leaves aren't
+    # shared, they are never memoized and their parents report errors at
+    # their span.
+
+    def __init__(self):
+        # the table keeps the nodes alive, so their ids stay unique
+        self.nodes = {}
+
+    def intern(self, node):
+        return self.nodes.setdefault(node_key(node), node)
+
+    def share(self, node):
+        # rebuilds an already built ast bottom up out of shared nodes
+        done = {}
+        pending = [node]
+        while pending:
+            current = pending[-1]
+            if id(current) in done:
+                pending.pop()
+                continue
+            children = [child for child in node_children(current) if id(child) not in done]
+            if children:
+                # left first, the first occurrence in the text is interned
+                pending.extend(reversed(children))
+                continue
+            pending.pop()
+
+            if isinstance(current, (BooleanNode, NumberNode, VarNode)):
+                done[id(current)] = current
+                continue
+            shared = copy.copy(current)
+            if isinstance(current, BinOpNode):
+                shared.left_node = done[id(current.left_node)]
+                shared.right_node = done[id(current.right_node)]
+            elif isinstance(current, UnaryOpNode):
+                shared.node = done[id(current.node)]
+            elif isinstance(current, CallNode):
+                shared.node_to_call = done[id(current.node_to_call)]
+                if current.arg_nodes is not None:
+                    shared.arg_nodes = done[id(current.arg_nodes)]
+            done[id(current)] = self.intern(shared)
+        return done[id(node)]
+
+
+def node_children(node):
+    if isinstance(node, BinOpNode):
+        return (node.left_node, node.right_node)
+    if isinstance(node, UnaryOpNode):
+        return (node.node,)
+    if isinstance(node, CallNode):
+        if node.arg_nodes is None:
+            return (node.node_to_call,)
+        return (node.node_to_call, node.arg_nodes)
+    return ()
+
+
+def shared_nodes(node):
+    # the inner nodes of a dag which are reached over more than one edge,
+    # only those are worth to be memoized during an evaluation
+    seen = set()
+    shared = set()
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            if not isinstance(current, (BooleanNode, NumberNode, VarNode)):
+                shared.add(current)
+            continue
+        seen.add(current)
+        pending.extend(node_children(current))
+    return frozenset(shared)
+
 ##########################
 # PARSER
 ##########################
 
 
+GRAMMAR_RULES = ('expr', 'term', 'equality', 'comparsion', 'unary', 'call', 'primary')
+
+
 class Parser:
-    def __init__(self, tokens):
+    # The rules return their node and raise an ErrorSignal on the first
+    # syntax error, only parse() turns it into a ParseResult. No result
+    # object is built per rule and no caller has to check for an error.
+
+    def __init__(self, tokens, trace=None, share=False):
         self.tokens = tokens
         self.tok_idx = -1
         self.advance()
 
+        # with share the parsed tree is turned into a dag, see NodeTable
+        self.table = NodeTable() if share else None
+
+        self.trace = trace
+        if tracing(trace, TRACE_PARSE):
+            for name in GRAMMAR_RULES:
+                setattr(self, name, self.traced_rule(name, getattr(self, name)))
+
+    def traced_rule(self, name, rule):
+        def traced():
+            tok = self.current_tok
+            try:
+                node = rule()
+            except ErrorSignal as signal:
+                self.trace.record('parse', name, tok, signal.error)
+                raise
+            self.trace.record('parse', name, tok, node)
+            return node
+        return traced
+
     def advance(self):
         self.tok_idx += 1
         if self.tok_idx < len(self.tokens):
@@ -468,13 +1042,21 @@ class Parser:
         return self.current_tok
 
     def parse(self):
-        res = self.expr()
-        if not res.error and self.current_tok.type != TT_EOF:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'and', 'or', logical comparsions or equality requests"
-            ))
-        return res
+        res = ParseResult()
+        try:
+            node = self.expr()
+            if self.current_tok.type != TT_EOF:
+                self.fail("Expected 'and', 'or', logical comparsions or equality requests")
+        except ErrorSignal as signal:
+            return res.failure(signal.error)
+        # shared afterwards, so every node keeps the span of its own text
+        if self.table is not None:
+            node = self.table.share(node)
+        return res.success(node)
+
+    def fail(self, details):
+        raise ErrorSignal(InvalidSyntaxError(
+            self.current_tok.pos_start, self.current_tok.pos_end, details))
 
     def peek_prev(self):
         return self.tokens[self.tok_idx - 1]
@@ -486,98 +1068,61 @@ class Parser:
         return self.bin_op(self.unary, (TT_LT, TT_LTE, TT_GT, TT_GTE))
 
     def unary(self):
-        res = ParseResult()
         tok = self.current_tok
 
         if tok.type == TT_NEG:
-            res.register(self.advance())
-            unary = res.register(self.unary())
-            if res.error:
-                return res
-            return res.success(UnaryOpNode(tok, unary))
-
-        call = res.register(self.call())
-        if res.error:
-            return res
+            self.advance()
+            return UnaryOpNode(tok, self.unary())
 
-        return res.success(call)
+        return self.call()
 
     def call(self):
-        res = ParseResult()
-        primary = res.register(self.primary())
-        if res.error:
-            return res
+        primary = self.primary()
 
         if self.current_tok.type == TT_LK:
-            res.register(self.advance())
+            self.advance()
             arg_nodes = None
 
             if self.current_tok.type == TT_RK:
-                res.register(self.advance())
+                self.advance()
 
             else:
-                arg_nodes = res.register(self.primary())
-                if res.error:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        "Excepted ')', int, float, identifier or '('"
-                    ))
+                try:
+                    arg_nodes = self.primary()
+                except ErrorSignal:
+                    self.fail("Excepted ')', int, float, identifier or '('")
 
                 if self.current_tok.type != TT_RK:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        f"Expected ')'"
-                    ))
+                    self.fail("Expected ')'")
 
-                res.register(self.advance())
-            return res.success(CallNode(primary, arg_nodes))
-        return res.success(primary)
+                self.advance()
+            return CallNode(primary, arg_nodes)
+        return primary
 
     def primary(self):
-        res = ParseResult()
         tok = self.current_tok
 
         if tok.type == TT_KEYWORD and (tok.value == 'TRUE' or tok.value == 'FALSE'):
-            res.register(self.advance())
-            return res.success(BooleanNode(tok))
+            self.advance()
+            return BooleanNode(tok)
 
         elif tok.type in (TT_INT, TT_FLOAT):
-
-            res.register(self.advance())
-            return res.success(NumberNode(tok))
+            self.advance()
+            return NumberNode(tok)
 
         elif tok.type == TT_LK:
-            res.register(self.advance())
-            expr = res.register(self.expr())
-            if res.error:
-                return res
-            if self.current_tok.type == TT_RK:
-                res.register(self.advance())
-                return res.success(expr)
-            else:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected ')'"
-                ))
+            self.advance()
+            expr = self.expr()
+            if self.current_tok.type != TT_RK:
+                self.fail("Expected ')'")
+            self.advance()
+            return expr
 
         elif tok.type == TT_IDENTIFIER:
-            print("ich bin hier im")
-            if tok.value == None:
-                print("ist none")
-                return res.failure(NonExistentIdentifierError(
-                    tok.pos_start, tok.pos_end, "Unknown Identifier"))
-            res.register(self.advance())
-            if isinstance(tok.value, int):
-                return res.success(NumberNode(tok))
-            elif tok.value == 'TRUE' or tok.value == 'FALSE':
-                return res.success(BooleanNode(tok))
-            elif isinstance(tok.value, types.FunctionType):
-                return res.success(tok)
-
-        return res.failure(InvalidSyntaxError(
-            tok.pos_start, tok.pos_end,
-            "Expected 'true', 'false', 'identifier', 'INT' or 'FLOAT'"
-        ))
+            self.advance()
+            return VarNode(tok)
+
+        self.fail("Expected 'true', 'false', 'identifier', 'INT' or 'FLOAT'")
 
     def term(self):
         return self.bin_op(self.equality, keyword.get('AND'))
@@ -586,20 +1131,183 @@ class Parser:
         return self.bin_op(self.term, keyword.get('OR'))
 
     def bin_op(self, func, ops):
-        res = ParseResult()
-        left = res.register(func())
-        if res.error:
-            return res
+        left = func()
 
         while self.current_tok.type in ops:
             op_tok = self.current_tok
-            res.register(self.advance())
-            right = res.register(func())
-            if res.error:
-                return res
-            left = BinOpNode(left, op_tok, right)
+            self.advance()
+            left = BinOpNode(left, op_tok, func())
+
+        return left
+
+
+# states of the StackParser
+OPERAND, PRIMARY, OPERAND_DONE = range(3)
 
-        return res.success(left)
+
+class StackParser:
+    # Parses the grammar of Parser into the same ast with the same errors,
+    # but with explicit stacks (shunting-yard) instead of seven python
+    # frames per nesting level. The depth of an expression is only bounded
+    # by memory and the time is linear in the number of tokens.
+
+    def __init__(self, tokens, trace=None, share=False):
+        self.tokens = tokens
+        self.tok_idx = -1
+        self.advance()
+
+        self.trace = trace
+        self.table = NodeTable() if share else None
+        # open '(' of call arguments, errors inside them are reported
+        # like the Parser does for a failed argument
+        self.arguments = 0
+
+    def advance(self):
+        self.tok_idx += 1
+        if self.tok_idx < len(self.tokens):
+            self.current_tok = self.tokens[self.tok_idx]
+        return self.current_tok
+
+    def parse(self):
+        tok = self.current_tok
+        res = ParseResult()
+        try:
+            res.success(self.expr())
+        except ErrorSignal as signal:
+            res.failure(signal.error)
+
+        if not res.error and self.current_tok.type != TT_EOF:
+            res.failure(InvalidSyntaxError(
+                self.current_tok.pos_start, self.current_tok.pos_end,
+                "Expected 'and', 'or', logical comparsions or equality requests"
+            ))
+        if not res.error and self.table is not None:
+            res.node = self.table.share(res.node)
+        # there are no rules to trace, only the whole parse
+        if tracing(self.trace, TRACE_PARSE):
+            self.trace.record('parse', 'parse', tok, res.error or res.node)
+        return res
+
+    def fail(self, details, in_argument=False):
+        tok = self.current_tok
+        if in_argument or self.arguments:
+            details = "Excepted ')', int, float, identifier or '('"
+        raise ErrorSignal(InvalidSyntaxError(tok.pos_start, tok.pos_end, details))
+
+    def precedence(self, tok):
+        # the levels of bin_op: term takes every keyword as operator (and
+        # leaves none for expr), so 'and' and 'or' bind equally
+        if tok.type in (TT_LT, TT_LTE, TT_GT, TT_GTE):
+            return 3
+        if tok.type in (TT_EE, TT_NE):
+            return 2
+        if tok.type in keyword.get('AND') or tok.type in keyword.get('OR'):
+            return 1
+        return 0
+
+    def primary(self, in_argument=False):
+        # the primaries without '(', those open a group
+        tok = self.current_tok
+
+        if tok.type == TT_KEYWORD and (tok.value == 'TRUE' or tok.value == 'FALSE'):
+            node = BooleanNode(tok)
+        elif tok.type in (TT_INT, TT_FLOAT):
+            node = NumberNode(tok)
+        elif tok.type == TT_IDENTIFIER:
+            node = VarNode(tok)
+        else:
+            self.fail("Expected 'true', 'false', 'identifier', 'INT' or 'FLOAT'", in_argument)
+
+        self.advance()
+        return node
+
+    def expect_rk(self, in_argument=False):
+        if self.current_tok.type != TT_RK:
+            self.fail("Expected ')'", in_argument)
+        self.advance()
+
+    def reduce(self, operands, operators):
+        op_tok = operators.pop()[1]
+        right = operands.pop()
+        left = operands.pop()
+        operands.append(BinOpNode(left, op_tok, right))
+
+    def expr(self):
+        # every open '(' saves the enclosing expression:
+        # (kind, negations, callee, operands, operators)
+        groups = []
+        operands, operators = [], []
+        negations = callee = node = None
+        state = OPERAND
+
+        while True:
+            if state == OPERAND:
+                negations = []
+                while self.current_tok.type == TT_NEG:
+                    negations.append(self.current_tok)
+                    self.advance()
+
+                if self.current_tok.type == TT_LK:
+                    self.advance()
+                    groups.append((TT_LK, negations, None, operands, operators))
+                    operands, operators = [], []
+                    continue
+
+                node = self.primary()
+                state = PRIMARY
+
+            elif state == PRIMARY:
+                if self.current_tok.type == TT_LK:
+                    self.advance()
+                    if self.current_tok.type == TT_RK:
+                        self.advance()
+                        node = CallNode(node, None)
+                    elif self.current_tok.type == TT_LK:
+                        # the argument is an expression in parentheses
+                        self.advance()
+                        self.arguments += 1
+                        groups.append(('call', negations, node, operands, operators))
+                        operands, operators = [], []
+                        state = OPERAND
+                        continue
+                    else:
+                        arg = self.primary(in_argument=True)
+                        self.expect_rk()
+                        node = CallNode(node, arg)
+                state = OPERAND_DONE
+
+            else:
+                for tok in reversed(negations):
+                    node = UnaryOpNode(tok, node)
+                operands.append(node)
+
+                # left associative, equal levels are reduced first
+                tok = self.current_tok
+                precedence = self.precedence(tok)
+                if precedence:
+                    while operators and operators[-1][0] >= precedence:
+                        self.reduce(operands, operators)
+                    operators.append((precedence, tok))
+                    self.advance()
+                    state = OPERAND
+                    continue
+
+                while operators:
+                    self.reduce(operands, operators)
+                node = operands.pop()
+                if not groups:
+                    return node
+
+                kind, negations, callee, operands, operators = groups.pop()
+                if kind == TT_LK:
+                    self.expect_rk()
+                    state = PRIMARY
+                else:
+                    # closes the argument, then the call
+                    self.expect_rk(in_argument=True)
+                    self.arguments -= 1
+                    self.expect_rk()
+                    node = CallNode(callee, node)
 
 ##########################
 # VALUES
@@ -630,160 +1338,115 @@ class RTResult:
 
 
 class Booleen:
-    def __init__(self, value):
-        self.value = value
-        self.set_pos()
-        self.set_context()
+    # TRUE and FALSE are the only instances, the value is a bool. Values
+    # are immutable and carry no position or context, so one instance is
+    # shared by every evaluation, positions are only attached to errors
+    __slots__ = ('value',)
 
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
+    def __new__(cls, value):
+        if value is True:
+            return TRUE
+        if value is False:
+            return FALSE
+        raise ValueError(f'A Booleen is True or False, not {value!r}')
 
-    def set_context(self, context=None):
-        self.context = context
-        return self
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'Booleen' is immutable, can't set '{name}'")
+
+    def __reduce__(self):
+        return Booleen, (self.value,)
 
     def and_to(self, other):
         if isinstance(other, Booleen):
-            if self.value == other.value:
-                return Booleen(self.value).set_context(self.context), None
-            return Booleen('FALSE').set_context(self.context), None
-        else:
-            return None, self.cant_compare_error(other)
+            return TRUE if self.value and other.value else FALSE
+        return None
 
     def or_to(self, other):
         if isinstance(other, Booleen):
-            if self.value == 'FALSE' and other.value == 'FALSE':
-                return Booleen(self.value).set_context(self.context), None
-            else:
-                return Booleen('TRUE').set_context(self.context), None
-        else:
-            return None, self.cant_compare_error(other)
+            return TRUE if self.value or other.value else FALSE
+        return None
 
     def reverse(self):
-        if self.value == 'TRUE':
-            self.value = 'FALSE'
-        elif self.value == 'FALSE':
-            self.value = 'TRUE'
-
-        return Booleen(self.value).set_context(self.context), None
+        return FALSE if self.value else TRUE
 
     def not_equal(self, other):
-        if not (isinstance(other, Booleen)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value != other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Booleen):
+            return TRUE if self is not other else FALSE
+        return None
 
     def double_equal(self, other):
-        if not (isinstance(other, Booleen)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value == other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Booleen):
+            return TRUE if self is other else FALSE
+        return None
 
     def __repr__(self):
-        return str(self.value)
+        return 'TRUE' if self.value else 'FALSE'
 
-    def cant_compare_error(self, other):
+    def cant_compare_error(self, pos_start, pos_end, context):
         return RTError(
-            other.pos_start, other.pos_end,
+            pos_start, pos_end,
             "Comparsion of 'bool' and 'int/float'",
-            self.context
+            context
         )
 
 
+TRUE = object.__new__(Booleen)
+object.__setattr__(TRUE, 'value', True)
+FALSE = object.__new__(Booleen)
+object.__setattr__(FALSE, 'value', False)
+
+
 class Number:
-    def __init__(self, value):
-        self.value = value
-        self.set_pos()
-        self.set_context()
+    # wraps an int or float, immutable like Booleen
+    __slots__ = ('value',)
 
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
+    def __init__(self, value):
+        object.__setattr__(self, 'value', value)
 
-    def set_context(self, context=None):
-        self.context = context
-        return self
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'Number' is immutable, can't set '{name}'")
 
-    def not_equal(self, other):
-        if self.value != other.value:
-            return Booleen('TRUE').set_context(self.context), None
-        else:
-            return Booleen('FALSE').set_context(self.context), None
+    def __reduce__(self):
+        return Number, (self.value,)
 
-    def double_equal(self, other):
-        if self.value == other.value:
-            return Booleen('TRUE').set_context(self.context), None
-        else:
-            return Booleen('FALSE').set_context(self.context), None
+    # the comparisons return TRUE or FALSE, or None for an operand
+    # which isn't a Number
 
     def less_than(self, other):
-        if not (isinstance(other, Number)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value < other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Number):
+            return TRUE if self.value < other.value else FALSE
+        return None
 
     def less_equal_than(self, other):
-        if not (isinstance(other, Number)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value <= other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Number):
+            return TRUE if self.value <= other.value else FALSE
+        return None
 
     def greater_than(self, other):
-        if not (isinstance(other, Number)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value > other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Number):
+            return TRUE if self.value > other.value else FALSE
+        return None
 
     def greater_equal_than(self, other):
-        if not (isinstance(other, Number)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value >= other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Number):
+            return TRUE if self.value >= other.value else FALSE
+        return None
 
     def not_equal(self, other):
-        if not (isinstance(other, Number)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value != other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Number):
+            return TRUE if self.value != other.value else FALSE
+        return None
 
     def double_equal(self, other):
-        if not (isinstance(other, Number)):
-            return None, self.cant_compare_error(other)
-        else:
-            if self.value == other.value:
-                return Booleen('TRUE').set_context(self.context), None
-            else:
-                return Booleen('FALSE').set_context(self.context), None
+        if isinstance(other, Number):
+            return TRUE if self.value == other.value else FALSE
+        return None
 
-    def cant_compare_error(self, other):
+    def cant_compare_error(self, pos_start, pos_end, context):
         return RTError(
-            other.pos_start, other.pos_end,
+            pos_start, pos_end,
             "Comparsion of 'int/float' and 'bool'",
-            self.context
+            context
         )
 
     def __repr__(self):
@@ -799,7 +1462,28 @@ class Context:
         self.display_name = display_name
         self.parent = parent
         self.parent_entry_pos = parent_entry_pos
-        self.hashmap = None
+        self.identifier = None
+        self.bindings = None
+        # values of shared nodes, filled during one evaluation
+        self.memo = None
+
+    def __getstate__(self):
+        # symbol tables may hold unpicklable methods, a pickled context
+        # (e.g. of an RTError) only keeps what the traceback needs
+        state = self.__dict__.copy()
+        state['identifier'] = None
+        state['bindings'] = None
+        state['memo'] = None
+        return state
+
+    def lookup(self, name):
+        if self.bindings is not None and name in self.bindings:
+            return self.bindings[name]
+        if self.identifier is not None:
+            return self.identifier.get(name)
+        if self.parent:
+            return self.parent.lookup(name)
+        return None
 
 
 ##########################
@@ -807,135 +1491,1433 @@ class Context:
 ##########################
 
 class Interpreter:
+    # The visit_* methods return the value of their node and raise an
+    # ErrorSignal on the first error, only visit() turns the outcome into
+    # an RTResult. Subtrees are evaluated with walk().
+
+    def __init__(self, trace=None, shared=None, metrics=None, profile=None):
+        self.trace = trace
+        if tracing(trace, TRACE_VISITS):
+            self.walk = self.traced_walk
+
+        # with metrics visited nodes and method calls are counted,
+        # CompiledExpression collects the counts after each evaluation
+        self.counted_nodes = 0
+        self.counted_calls = 0
+        if metrics is not None:
+            self.uncounted_walk = self.walk
+            self.walk = self.counted_walk
+            self.call = self.counted_call
+
+        # with a profile every visit is timed, without one walk stays as is
+        self.profile = profile
+        if profile is not None:
+            self.unprofiled_walk = self.walk
+            self.walk = self.profiled_walk
+
+        # shared nodes of a dag are visited once per evaluation,
+        # their values are kept in context.memo
+        self.shared = shared
+        if shared:
+            self.walk_node = self.walk
+            self.walk = self.memo_walk
+
     def visit(self, node, context):
+        res = RTResult()
+        try:
+            return res.success(self.walk(node, context))
+        except ErrorSignal as signal:
+            return res.failure(signal.error)
+
+    def walk(self, node, context):
         method_name = f'visit_{type(node).__name__}'
         method = getattr(self, method_name, self.no_visit_method)
         return method(node, context)
 
-    def no_visit_method(self, node):
+    def traced_walk(self, node, context):
+        try:
+            value = Interpreter.walk(self, node, context)
+        except ErrorSignal as signal:
+            self.trace.record('visit', type(node).__name__, node, signal.error)
+            raise
+        self.trace.record('visit', type(node).__name__, node, value)
+        return value
+
+    def counted_walk(self, node, context):
+        self.counted_nodes += 1
+        return self.uncounted_walk(node, context)
+
+    def counted_call(self, node, value_to_call, arg, context):
+        self.counted_calls += 1
+        return Interpreter.call(self, node, value_to_call, arg, context)
+
+    def profiled_walk(self, node, context):
+        profile = self.profile
+        outer = profile.children
+        profile.children = 0
+        start = time.perf_counter_ns()
+        try:
+            return self.unprofiled_walk(node, context)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            profile.add(node, elapsed, elapsed - profile.children)
+            profile.children = outer + elapsed
+
+    def take_counts(self):
+        counts = self.counted_nodes, self.counted_calls
+        self.counted_nodes = self.counted_calls = 0
+        return counts
+
+    def memo_walk(self, node, context):
+        if node not in self.shared or context.memo is None:
+            return self.walk_node(node, context)
+        value = context.memo.get(node)
+        if value is None:
+            # an error ends the evaluation, so only values are kept
+            value = context.memo[node] = self.walk_node(node, context)
+        return value
+
+    def no_visit_method(self, node, context):
         raise Exception(f'No visit_{type(node).__name__} method defined')
 
     def visit_BooleanNode(self, node, context):
-        return RTResult().success(
-            Booleen(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end))
+        return TRUE if node.tok.value == 'TRUE' else FALSE
 
     def visit_NumberNode(self, node, context):
-        return RTResult().success(
-            Number(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end))
+        return Number(node.tok.value)
 
     def visit_BinOpNode(self, node, context):
-        res = RTResult()
-        left = res.register(self.visit(node.left_node, context))
-        type_of_left = type(left)
-        if res.error:
-            return res
-        right = res.register(self.visit(node.right_node, context))
-        if res.error:
-            return res
+        left = self.walk(node.left_node, context)
+
+        # short circuit, the right side is not visited at all
+        result = self.short_circuit(node, left, context)
+        if result is not None:
+            return result
+
+        return self.operate(node, left, self.walk(node.right_node, context), context)
 
-        if node.op_tok.matches(TT_KEYWORD, 'AND'):
-            result, error = left.and_to(right)
-        elif node.op_tok.matches(TT_KEYWORD, 'OR'):
-            result, error = left.or_to(right)
+    def short_circuit(self, node, left, context):
+        if left is FALSE and node.op_tok.matches(TT_KEYWORD, 'AND'):
+            return FALSE
+        if left is TRUE and node.op_tok.matches(TT_KEYWORD, 'OR'):
+            return TRUE
+        return None
 
-        elif isinstance(left, Number) and node.op_tok.type != TT_EE and node.op_tok.type != TT_NE:
+    def operate(self, node, left, right, context):
+        if isinstance(left, Booleen) and node.op_tok.matches(TT_KEYWORD, 'AND'):
+            result = left.and_to(right)
+        elif isinstance(left, Booleen) and node.op_tok.matches(TT_KEYWORD, 'OR'):
+            result = left.or_to(right)
+
+        elif isinstance(left, Number) and node.op_tok.type in (TT_LT, TT_LTE, TT_GT, TT_GTE):
             if node.op_tok.type == TT_LT:
-                result, error = left.less_than(right)
+                result = left.less_than(right)
             elif node.op_tok.type == TT_LTE:
-                result, error = left.less_equal_than(right)
+                result = left.less_equal_than(right)
             elif node.op_tok.type == TT_GT:
-                result, error = left.greater_than(right)
+                result = left.greater_than(right)
             elif node.op_tok.type == TT_GTE:
-                result, error = left.greater_equal_than(right)
+                result = left.greater_equal_than(right)
 
         elif node.op_tok.type == TT_EE:
-            result, error = left.double_equal(right)
+            result = left.double_equal(right)
         elif node.op_tok.type == TT_NE:
-            result, error = left.not_equal(right)
+            result = left.not_equal(right)
         else:
-            error = RTError(
-                left.pos_start, left.pos_end,
-                f'The type "{type_of_left}" has no operation "{node.op_tok}"',
+            raise ErrorSignal(RTError(
+                node.left_node.pos_start, node.left_node.pos_end,
+                f'The type "{type(left)}" has no operation "{node.op_tok}"',
                 context
-            )
+            ))
 
-        if error:
-            return res.failure(error)
-        else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+        # values have no positions, errors point at the operand node
+        if result is None:
+            raise ErrorSignal(left.cant_compare_error(node.right_node.pos_start, node.right_node.pos_end, context))
+        return result
 
     def visit_UnaryOpNode(self, node, context):
-        res = RTResult()
-        boolean = res.register(self.visit(node.node, context))
-        error = None
-        if isinstance(boolean, Booleen):
-            if node.op_tok.type == TT_NEG:
-                boolean, error = boolean.reverse()
-        else:
-            error = RTError(
+        return self.negate(node, self.walk(node.node, context), context)
+
+    def negate(self, node, boolean, context):
+        if not isinstance(boolean, Booleen):
+            raise ErrorSignal(RTError(
                 node.pos_start, node.pos_end,
                 "Expected 'true' or 'false' after '!'",
                 context
-            )
-        if error:
-            return res.failure(error)
-        else:
-            return res.success(boolean.set_pos(node.pos_start, node.pos_end))
+            ))
+        if node.op_tok.type == TT_NEG:
+            return boolean.reverse()
+        return boolean
+
+    def visit_VarNode(self, node, context):
+        var_name = node.var_name_tok.value
+        value = context.lookup(var_name)
+
+        if value is None:
+            raise ErrorSignal(NonExistentIdentifierError(
+                node.pos_start, node.pos_end, "Unknown Identifier"))
+
+        value = make_value(value)
+        if value is None:
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                f"Identifier '{var_name}' has to be called with an argument",
+                context
+            ))
+        return value
 
     def visit_CallNode(self, node, context):
-        res = RTResult()
-        arg = None
-        error = None
+        value_to_call = self.callee(node, context)
+        return self.call(node, value_to_call, self.walk(node.arg_nodes, context), context)
+
+    def callee(self, node, context):
+        # the method to call, checked before the argument is visited
+        value_to_call = None
+        if isinstance(node.node_to_call, VarNode):
+            var_name = node.node_to_call.var_name_tok.value
+            value_to_call = context.lookup(var_name)
+            if value_to_call is None:
+                raise ErrorSignal(NonExistentIdentifierError(
+                    node.node_to_call.pos_start, node.node_to_call.pos_end, "Unknown Identifier"))
+
+        if not callable(value_to_call):
+            raise ErrorSignal(RTError(
+                node.node_to_call.pos_start, node.node_to_call.pos_end,
+                "Only identifiers bound to methods can be called",
+                context
+            ))
+
+        if node.arg_nodes is None:
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                "Method only works with arguments from type 'Number'",
+                context
+            ))
+        return value_to_call
 
-        value_to_call = node.node_to_call.value
+    def call(self, node, value_to_call, arg, context):
+        self.check_argument(node, arg, context)
+        return self.returned(node, value_to_call(int(arg.value)), context)
 
-        arg = res.register(self.visit(node.arg_nodes, context))
+    def check_argument(self, node, arg, context):
         if not isinstance(arg, Number):
-            error = RTError(
-                arg.pos_start, arg.pos_end,
+            raise ErrorSignal(RTError(
+                node.arg_nodes.pos_start, node.arg_nodes.pos_end,
                 "Method only works with arguments from type 'Number'",
                 context
-            )
+            ))
+
+    def returned(self, node, value, context):
+        # the value of a call from what the method returned
+        value = make_value(value)
+        if value is None:
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                "Method has to return a bool or a number",
+                context
+            ))
+        return value
 
-        if isinstance(arg, Number):
-            arg = int(arg.value)
-            value_to_call = value_to_call(arg)
 
-        if value_to_call == True:
-            value_to_call = Booleen('TRUE').set_context(context)
-        elif value_to_call == False:
-            value_to_call = Booleen('FALSE').set_context(context)
+def make_value(value):
+    # convert a bound python value into an interpreter value,
+    # functions can only be called and have no value of their own
+    if value is True or value == 'TRUE':
+        return TRUE
+    elif value is False or value == 'FALSE':
+        return FALSE
+    elif isinstance(value, (int, float)):
+        return Number(value)
+    return None
 
-        if error:
-            return res.failure(error)
-        return res.success(value_to_call.set_pos(node.pos_start, node.pos_end))
+##########################
+# STACK INTERPRETER
+##########################
+
+
+class StackInterpreter(Interpreter):
+    # Visits the ast with an explicit stack instead of python recursion,
+    # with the results and errors of the Interpreter. Only unfinished
+    # ancestors of the current node are on the stack, so an error ends the
+    # evaluation at once.
+
+    def __init__(self, trace=None, shared=None, metrics=None, profile=None):
+        self.trace = trace
+        self.shared = shared
+        self.counting = metrics is not None
+        self.counted_nodes = 0
+        self.counted_calls = 0
+        if self.counting:
+            self.call = self.counted_call
+        self.profile = profile
+
+    def visit(self, node, context):
+        trace = self.trace if tracing(self.trace, TRACE_VISITS) else None
+        counting = self.counting
+        profile = self.profile
+        shared = self.shared
+        memo = context.memo if shared else None
+        values = []
+        # (node, step, value kept between the steps)
+        stack = [(node, 0, None)]
+        # with a profile, [start, time in children] of the unfinished nodes
+        timings = []
+
+        while stack:
+            node, step, saved = stack.pop()
+            kind = type(node)
+
+            if step == 0 and memo is not None and node in shared:
+                value = memo.get(node)
+                if value is not None:
+                    values.append(value)
+                    continue
+            if step == 0 and counting:
+                self.counted_nodes += 1
+            if step == 0 and profile is not None:
+                timings.append([time.perf_counter_ns(), 0])
+
+            try:
+                if kind is BinOpNode:
+                    if step == 0:
+                        stack.append((node, 1, None))
+                        stack.append((node.left_node, 0, None))
+                        continue
+                    if step == 1:
+                        left = values.pop()
+                        value = self.short_circuit(node, left, context)
+                        if value is None:
+                            stack.append((node, 2, left))
+                            stack.append((node.right_node, 0, None))
+                            continue
+                    else:
+                        value = self.operate(node, saved, values.pop(), context)
+
+                elif kind is UnaryOpNode:
+                    if step == 0:
+                        stack.append((node, 1, None))
+                        stack.append((node.node, 0, None))
+                        continue
+                    value = self.negate(node, values.pop(), context)
+
+                elif kind is CallNode:
+                    if step == 0:
+                        stack.append((node, 1, self.callee(node, context)))
+                        stack.append((node.arg_nodes, 0, None))
+                        continue
+                    value = self.call(node, saved, values.pop(), context)
+
+                else:
+                    value = Interpreter.walk(self, node, context)
+            except ErrorSignal as signal:
+                if profile is not None:
+                    self.profiled_unwind(node, stack, timings)
+                return self.unwind(node, signal.error, stack, trace)
+
+            if profile is not None:
+                self.profiled(node, timings)
+            if trace is not None:
+                trace.record('visit', kind.__name__, node, value)
+            if memo is not None and node in shared:
+                memo[node] = value
+            values.append(value)
+
+        return RTResult().success(values.pop())
+
+    def profiled(self, node, timings):
+        start, children = timings.pop()
+        elapsed = time.perf_counter_ns() - start
+        self.profile.add(node, elapsed, elapsed - children)
+        if timings:
+            timings[-1][1] += elapsed
+
+    def profiled_unwind(self, node, stack, timings):
+        # the stack only holds the ancestors, they end with the error
+        self.profiled(node, timings)
+        for ancestor in reversed(stack):
+            self.profiled(ancestor[0], timings)
+
+    def unwind(self, node, error, stack, trace):
+        # the Interpreter hands the error up through every ancestor
+        if trace is not None:
+            trace.record('visit', type(node).__name__, node, error)
+            while stack:
+                node = stack.pop()[0]
+                trace.record('visit', type(node).__name__, node, error)
+        return RTResult().failure(error)
+
+##########################
+# CLOSURE COMPILER
+##########################
+
+
+def native_value(value):
+    # same conversion as make_value but into native python values,
+    # None marks values which can't be used as operand
+    if value is True or value == 'TRUE':
+        return True
+    elif value is False or value == 'FALSE':
+        return False
+    elif isinstance(value, (int, float)):
+        return value
+    return None
+
+
+def wrap_native(value):
+    if value is True:
+        return TRUE
+    elif value is False:
+        return FALSE
+    return Number(value)
+
+
+class ClosureCompiler:
+    # Turns the ast once into nested closures which take the context and
+    # return native bool/int/float values. Errors are raised as ErrorSignal
+    # and match the ones of the Interpreter.
+
+    def __init__(self, shared=None):
+        # closures of shared nodes are built once and memoize their value
+        self.shared = shared or frozenset()
+        self.closures = {}
+
+    def compile(self, node):
+        if node in self.shared:
+            closure = self.closures.get(node)
+            if closure is None:
+                closure = self.closures[node] = self.memoized(node, self.compile_node(node))
+            return closure
+        return self.compile_node(node)
+
+    def compile_node(self, node):
+        method_name = f'compile_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_compile_method)
+        return method(node)
+
+    def memoized(self, node, closure):
+        def memoized(context):
+            memo = context.memo
+            if memo is None:
+                return closure(context)
+            value = memo.get(node)
+            if value is None:
+                value = memo[node] = closure(context)
+            return value
+
+        return memoized
+
+    def no_compile_method(self, node):
+        raise Exception(f'No compile_{type(node).__name__} method defined')
+
+    def compile_BooleanNode(self, node):
+        value = node.tok.value == 'TRUE'
+        return lambda context: value
+
+    def compile_NumberNode(self, node):
+        value = node.tok.value
+        return lambda context: value
+
+    def compile_VarNode(self, node):
+        var_name = node.var_name_tok.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def load(context):
+            value = context.lookup(var_name)
+            if value is None:
+                raise ErrorSignal(NonExistentIdentifierError(
+                    pos_start, pos_end, "Unknown Identifier"))
+            value = native_value(value)
+            if value is None:
+                raise ErrorSignal(RTError(
+                    pos_start, pos_end,
+                    f"Identifier '{var_name}' has to be called with an argument",
+                    context
+                ))
+            return value
+
+        return load
+
+    def compile_UnaryOpNode(self, node):
+        operand = self.compile(node.node)
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def negate(context):
+            value = operand(context)
+            if type(value) is not bool:
+                raise ErrorSignal(RTError(
+                    pos_start, pos_end,
+                    "Expected 'true' or 'false' after '!'",
+                    context
+                ))
+            return not value
+
+        return negate
+
+    def compile_BinOpNode(self, node):
+        left = self.compile(node.left_node)
+        right = self.compile(node.right_node)
+        left_node, right_node = node.left_node, node.right_node
+        op_tok = node.op_tok
+
+        def no_operation(context, value):
+            return ErrorSignal(RTError(
+                left_node.pos_start, left_node.pos_end,
+                f'The type "{type(wrap_native(value))}" has no operation "{op_tok}"',
+                context
+            ))
+
+        def cant_compare(context, value):
+            if type(value) is bool:
+                details = "Comparsion of 'bool' and 'int/float'"
+            else:
+                details = "Comparsion of 'int/float' and 'bool'"
+            return ErrorSignal(RTError(
+                right_node.pos_start, right_node.pos_end, details, context))
+
+        if op_tok.matches(TT_KEYWORD, 'AND') or op_tok.matches(TT_KEYWORD, 'OR'):
+            is_and = op_tok.value == 'AND'
+
+            def logical(context):
+                a = left(context)
+                if a is False and is_and:
+                    return False
+                if a is True and not is_and:
+                    return True
+                b = right(context)
+                if type(a) is not bool:
+                    raise no_operation(context, a)
+                if type(b) is not bool:
+                    raise cant_compare(context, a)
+                return (a and b) if is_and else (a or b)
+
+            return logical
+
+        if op_tok.type in (TT_EE, TT_NE):
+            is_equal = op_tok.type == TT_EE
+
+            def equality(context):
+                a = left(context)
+                b = right(context)
+                if (type(a) is bool) != (type(b) is bool):
+                    raise cant_compare(context, a)
+                return (a == b) if is_equal else (a != b)
+
+            return equality
+
+        if op_tok.type not in (TT_LT, TT_LTE, TT_GT, TT_GTE):
+            # other keywords parse as operators, but have no operation
+            def no_operator(context):
+                a = left(context)
+                right(context)
+                raise no_operation(context, a)
+
+            return no_operator
+
+        compare = {
+            TT_LT: lambda a, b: a < b,
+            TT_LTE: lambda a, b: a <= b,
+            TT_GT: lambda a, b: a > b,
+            TT_GTE: lambda a, b: a >= b,
+        }[op_tok.type]
+
+        def comparsion(context):
+            a = left(context)
+            b = right(context)
+            if type(a) is bool:
+                raise no_operation(context, a)
+            if type(b) is bool:
+                raise cant_compare(context, a)
+            return compare(a, b)
+
+        return comparsion
+
+    def compile_CallNode(self, node):
+        node_to_call = node.node_to_call
+        pos_start, pos_end = node.pos_start, node.pos_end
+        var_name = node_to_call.var_name_tok.value if isinstance(
+            node_to_call, VarNode) else None
+        arg_node = node.arg_nodes
+        arg = self.compile(arg_node) if arg_node is not None else None
+
+        def call(context):
+            value_to_call = None
+            if var_name is not None:
+                value_to_call = context.lookup(var_name)
+                if value_to_call is None:
+                    raise ErrorSignal(NonExistentIdentifierError(
+                        node_to_call.pos_start, node_to_call.pos_end, "Unknown Identifier"))
+
+            if not callable(value_to_call):
+                raise ErrorSignal(RTError(
+                    node_to_call.pos_start, node_to_call.pos_end,
+                    "Only identifiers bound to methods can be called",
+                    context
+                ))
+
+            if arg is None:
+                raise ErrorSignal(RTError(
+                    pos_start, pos_end,
+                    "Method only works with arguments from type 'Number'",
+                    context
+                ))
+
+            value = arg(context)
+            if type(value) is bool:
+                raise ErrorSignal(RTError(
+                    arg_node.pos_start, arg_node.pos_end,
+                    "Method only works with arguments from type 'Number'",
+                    context
+                ))
+
+            result = native_value(value_to_call(int(value)))
+            if result is None:
+                raise ErrorSignal(RTError(
+                    pos_start, pos_end,
+                    "Method has to return a bool or a number",
+                    context
+                ))
+            return result
+
+        return call
 
 ##########################
-# RUN
+# BYTECODE
 ##########################
 
+# opcodes, the ones in HAS_ARG are followed by a 3 byte little endian argument
+OP_PUSH_CONST = 1
+OP_LOAD_VAR = 2
+OP_CMP_LT = 3
+OP_CMP_LTE = 4
+OP_CMP_GT = 5
+OP_CMP_GTE = 6
+OP_CMP_EQ = 7
+OP_CMP_NE = 8
+OP_AND_JUMP_IF_FALSE = 9
+OP_OR_JUMP_IF_TRUE = 10
+OP_AND = 11
+OP_OR = 12
+OP_NOT = 13
+OP_LOAD_METHOD = 14
+OP_CALL = 15
+OP_NO_OPERATION = 16
+
+HAS_ARG = frozenset((OP_PUSH_CONST, OP_LOAD_VAR, OP_AND_JUMP_IF_FALSE, OP_OR_JUMP_IF_TRUE,
+                     OP_LOAD_METHOD, OP_NO_OPERATION))
+JUMPS = frozenset((OP_AND_JUMP_IF_FALSE, OP_OR_JUMP_IF_TRUE))
+MAX_ARG = 0xFFFFFF
+
+COMPARSION_OPS = {
+    TT_LT: OP_CMP_LT,
+    TT_LTE: OP_CMP_LTE,
+    TT_GT: OP_CMP_GT,
+    TT_GTE: OP_CMP_GTE,
+    TT_EE: OP_CMP_EQ,
+    TT_NE: OP_CMP_NE,
+}
+
+# serialized programs start with the magic and the format version
+BYTECODE_MAGIC = b'BOO'
+BYTECODE_VERSION = 1
+BYTECODE_HEADER = struct.Struct('<3sBI')
+
+
+class BytecodeCompiler:
+    # Lowers the ast into a Program. Every instruction gets the spans it
+    # reports errors at: (start, end) of its node, for binary operators
+    # also the ones of both operands, for calls the one of the argument.
 
-def run(fn, text):
+    def __init__(self):
+        self.ops = []
+        self.args = []
+        self.spans = []
+        self.consts = []
+        self.const_index = {}
+
+    def compile(self, fn, text, node):
+        self.visit(node)
+        code = array('B')
+        offsets = []
+        for op, arg in zip(self.ops, self.args):
+            offsets.append(len(code))
+            code.append(op)
+            if op in HAS_ARG:
+                code.extend((0, 0, 0))
+        offsets.append(len(code))
+
+        # jumps are emitted with instruction indexes, stored as byte offsets
+        for i, (op, arg) in enumerate(zip(self.ops, self.args)):
+            if op in HAS_ARG:
+                if op in JUMPS:
+                    arg = offsets[arg]
+                if arg > MAX_ARG:
+                    raise ValueError('The expression is too large for the bytecode')
+                code[offsets[i] + 1:offsets[i] + 4] = array('B', arg.to_bytes(3, 'little'))
+
+        span = (node.pos_start.idx, node.pos_end.idx)
+        return Program(fn, text, code.tobytes(), self.consts, self.spans, span)
+
+    def visit(self, node):
+        method_name = f'compile_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_compile_method)
+        method(node)
+
+    def no_compile_method(self, node):
+        raise Exception(f'No compile_{type(node).__name__} method defined')
+
+    def emit(self, op, arg=0, *nodes):
+        spans = []
+        for node in nodes:
+            spans += (node.pos_start.idx, node.pos_end.idx)
+        self.ops.append(op)
+        self.args.append(arg)
+        self.spans.append(spans or None)
+        return len(self.ops) - 1
+
+    def const(self, value):
+        # True and 1 are different constants
+        key = (type(value), value)
+        index = self.const_index.get(key)
+        if index is None:
+            index = self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return index
+
+    def compile_BooleanNode(self, node):
+        self.emit(OP_PUSH_CONST, self.const(node.tok.value == 'TRUE'))
+
+    def compile_NumberNode(self, node):
+        self.emit(OP_PUSH_CONST, self.const(node.tok.value))
+
+    def compile_VarNode(self, node):
+        self.emit(OP_LOAD_VAR, self.const(node.var_name_tok.value), node)
+
+    def compile_UnaryOpNode(self, node):
+        self.visit(node.node)
+        self.emit(OP_NOT, 0, node)
+
+    def compile_BinOpNode(self, node):
+        op_tok = node.op_tok
+        self.visit(node.left_node)
+
+        if op_tok.matches(TT_KEYWORD, 'AND') or op_tok.matches(TT_KEYWORD, 'OR'):
+            if op_tok.value == 'AND':
+                jump, op = OP_AND_JUMP_IF_FALSE, OP_AND
+            else:
+                jump, op = OP_OR_JUMP_IF_TRUE, OP_OR
+            # the short circuit keeps the left value as result
+            index = self.emit(jump)
+            self.visit(node.right_node)
+            self.emit(op, 0, node.left_node, node.right_node)
+            self.args[index] = len(self.ops)
+            return
+
+        self.visit(node.right_node)
+        if op_tok.type in COMPARSION_OPS:
+            self.emit(COMPARSION_OPS[op_tok.type], 0, node.left_node, node.right_node)
+        else:
+            # other keywords parse as operators, but have no operation
+            self.emit(OP_NO_OPERATION, self.const(repr(op_tok)), node.left_node, node.right_node)
+
+    def compile_CallNode(self, node):
+        node_to_call = node.node_to_call
+        name = node_to_call.var_name_tok.value if isinstance(node_to_call, VarNode) else None
+        self.emit(OP_LOAD_METHOD, self.const(name), node_to_call)
+
+        if node.arg_nodes is None:
+            self.emit(OP_PUSH_CONST, self.const(None))
+            self.emit(OP_CALL, 0, node, node)
+        else:
+            self.visit(node.arg_nodes)
+            self.emit(OP_CALL, 0, node, node.arg_nodes)
+
+
+OP_NAMES = {value: name[3:] for name, value in list(globals().items()) if name.startswith('OP_') and name != 'OP_TYPES'}
+
+
+class Program:
+    # Flat bytecode with its constants and spans. The code is decoded once
+    # into lists of opcodes and arguments for the VM, jump targets become
+    # instruction indexes. Values on the stack are native bool/int/float,
+    # errors match the ones of the Interpreter.
+
+    def __init__(self, fn, text, code, consts, spans, span):
+        self.fn = fn
+        self.text = text
+        self.code = code
+        self.consts = consts
+        self.spans = spans
+        self.span = span
+        self.source = Source(fn, text)
+        self.ops, self.args = self.decode(code)
+
+    @staticmethod
+    def decode(code):
+        ops, args, offsets = [], [], {}
+        i = 0
+        while i < len(code):
+            offsets[i] = len(ops)
+            op = code[i]
+            ops.append(op)
+            if op in HAS_ARG:
+                args.append(code[i + 1] | code[i + 2] << 8 | code[i + 3] << 16)
+                i += 4
+            else:
+                args.append(0)
+                i += 1
+        offsets[i] = len(ops)
+        for index, op in enumerate(ops):
+            if op in JUMPS:
+                args[index] = offsets[args[index]]
+        return ops, args
+
+    def to_bytes(self):
+        meta = json.dumps({
+            'fn': self.fn,
+            'text': self.text,
+            'consts': self.consts,
+            'spans': self.spans,
+            'span': self.span,
+        }).encode('utf-8')
+        return BYTECODE_HEADER.pack(BYTECODE_MAGIC, BYTECODE_VERSION, len(meta)) + meta + self.code
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, size = BYTECODE_HEADER.unpack_from(data)
+        if magic != BYTECODE_MAGIC or version != BYTECODE_VERSION:
+            raise ValueError('Not a program of this bytecode version')
+        start = BYTECODE_HEADER.size
+        meta = json.loads(bytes(data[start:start + size]).decode('utf-8'))
+        code = bytes(data[start + size:])
+        return cls(meta['fn'], meta['text'], code, meta['consts'], meta['spans'], tuple(meta['span']))
+
+    def disassemble(self):
+        lines = []
+        for index, (op, arg) in enumerate(zip(self.ops, self.args)):
+            if op in JUMPS:
+                lines.append(f'{index:>4} {OP_NAMES[op]:<18} to {arg}')
+            elif op in HAS_ARG:
+                lines.append(f'{index:>4} {OP_NAMES[op]:<18} {self.consts[arg]!r}')
+            else:
+                lines.append(f'{index:>4} {OP_NAMES[op]}')
+        return '\n'.join(lines)
+
+    def evaluate(self, bindings=None):
+        context = Context('<program>')
+        context.identifier = identifier
+        context.bindings = normalize_bindings(bindings)
+        try:
+            value = self.run(context)
+        except ErrorSignal as signal:
+            return None, signal.error
+        return wrap_native(value), None
+
+    def run(self, context):
+        ops, args, consts = self.ops, self.args, self.consts
+        stack = []
+        push, pop = stack.append, stack.pop
+        pc = 0
+        end = len(ops)
+
+        while pc < end:
+            op = ops[pc]
+
+            if op == OP_LOAD_VAR:
+                value = native_value(context.lookup(consts[args[pc]]))
+                if value is None:
+                    raise self.load_error(pc, context)
+                push(value)
+            elif op == OP_PUSH_CONST:
+                push(consts[args[pc]])
+            elif op <= OP_CMP_GTE:
+                b = pop()
+                a = pop()
+                if type(a) is bool:
+                    raise self.no_operation(pc, context, a)
+                if type(b) is bool:
+                    raise self.cant_compare(pc, context, a)
+                if op == OP_CMP_LT:
+                    push(a < b)
+                elif op == OP_CMP_LTE:
+                    push(a <= b)
+                elif op == OP_CMP_GT:
+                    push(a > b)
+                else:
+                    push(a >= b)
+            elif op == OP_AND_JUMP_IF_FALSE:
+                if stack[-1] is False:
+                    pc = args[pc]
+                    continue
+            elif op == OP_OR_JUMP_IF_TRUE:
+                if stack[-1] is True:
+                    pc = args[pc]
+                    continue
+            elif op == OP_AND or op == OP_OR:
+                b = pop()
+                a = pop()
+                if type(a) is not bool:
+                    raise self.no_operation(pc, context, a)
+                if type(b) is not bool:
+                    raise self.cant_compare(pc, context, a)
+                push((a and b) if op == OP_AND else (a or b))
+            elif op == OP_NOT:
+                value = pop()
+                if type(value) is not bool:
+                    raise self.error(RTError, pc, 0, "Expected 'true' or 'false' after '!'", context)
+                push(not value)
+            elif op == OP_CMP_EQ or op == OP_CMP_NE:
+                b = pop()
+                a = pop()
+                if (type(a) is bool) != (type(b) is bool):
+                    raise self.cant_compare(pc, context, a)
+                push((a == b) if op == OP_CMP_EQ else (a != b))
+            elif op == OP_LOAD_METHOD:
+                push(self.load_method(pc, context))
+            elif op == OP_CALL:
+                push(self.call(pc, context, pop(), pop()))
+            elif op == OP_NO_OPERATION:
+                pop()
+                raise self.no_operation(pc, context, pop())
+            else:
+                raise Exception(f'Unknown opcode {op}')
+            pc += 1
+
+        return stack[-1]
+
+    def position(self, idx):
+        return Position(self.source, idx)
+
+    def error(self, error_class, pc, which, details, context=None):
+        # which selects the span of the instruction, see BytecodeCompiler
+        start, end = self.spans[pc][which * 2:which * 2 + 2]
+        if error_class is NonExistentIdentifierError:
+            return ErrorSignal(error_class(self.position(start), self.position(end), details))
+        return ErrorSignal(error_class(self.position(start), self.position(end), details, context))
+
+    def load_error(self, pc, context):
+        name = self.consts[self.args[pc]]
+        if context.lookup(name) is None:
+            return self.error(NonExistentIdentifierError, pc, 0, "Unknown Identifier")
+        return self.error(RTError, pc, 0, f"Identifier '{name}' has to be called with an argument", context)
+
+    def no_operation(self, pc, context, value):
+        op = self.ops[pc]
+        if op == OP_NO_OPERATION:
+            op_repr = self.consts[self.args[pc]]
+        elif op == OP_AND or op == OP_OR:
+            op_repr = f"{TT_KEYWORD}:{'AND' if op == OP_AND else 'OR'}"
+        else:
+            op_repr = {value: key for key, value in COMPARSION_OPS.items()}[op]
+        return self.error(RTError, pc, 0, f'The type "{type(wrap_native(value))}" has no operation "{op_repr}"', context)
+
+    def cant_compare(self, pc, context, value):
+        if type(value) is bool:
+            details = "Comparsion of 'bool' and 'int/float'"
+        else:
+            details = "Comparsion of 'int/float' and 'bool'"
+        return self.error(RTError, pc, 1, details, context)
+
+    def load_method(self, pc, context):
+        name = self.consts[self.args[pc]]
+        value_to_call = None
+        if name is not None:
+            value_to_call = context.lookup(name)
+            if value_to_call is None:
+                raise self.error(NonExistentIdentifierError, pc, 0, "Unknown Identifier")
+        if not callable(value_to_call):
+            raise self.error(RTError, pc, 0, "Only identifiers bound to methods can be called", context)
+        return value_to_call
+
+    def call(self, pc, context, value, value_to_call):
+        if value is None:
+            raise self.error(RTError, pc, 0, "Method only works with arguments from type 'Number'", context)
+        if type(value) is bool:
+            raise self.error(RTError, pc, 1, "Method only works with arguments from type 'Number'", context)
+        result = native_value(value_to_call(int(value)))
+        if result is None:
+            raise self.error(RTError, pc, 0, "Method has to return a bool or a number", context)
+        return result
+
+    def __repr__(self):
+        return f'<Program {self.text!r}>'
+
+##########################
+# OPTIMIZER
+##########################
+
+
+def count_nodes(node):
+    count = 0
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        count += 1
+        if isinstance(current, BinOpNode):
+            pending.append(current.left_node)
+            pending.append(current.right_node)
+        elif isinstance(current, UnaryOpNode):
+            pending.append(current.node)
+        elif isinstance(current, CallNode):
+            pending.append(current.node_to_call)
+            if current.arg_nodes is not None:
+                pending.append(current.arg_nodes)
+    return count
+
+
+def is_and_or(op_tok):
+    return op_tok.matches(TT_KEYWORD, 'AND') or op_tok.matches(TT_KEYWORD, 'OR')
+
+
+def is_boolean(node):
+    # evaluates to a Booleen, unless it raises an error,
+    # true/false as operators can only raise one
+    if isinstance(node, BinOpNode):
+        return node.op_tok.type != TT_KEYWORD or is_and_or(node.op_tok)
+    return isinstance(node, (BooleanNode, UnaryOpNode))
+
+
+class Optimizer:
+    # Folds constant subtrees into BooleanNodes and applies boolean
+    # identities. Every rewrite keeps the result and the reported error of
+    # the original ast, surviving subtrees keep their own spans and folded
+    # literals the span of the text they replace. With assume_valid the identifiers are trusted to be bound to
+    # values of the right type, which allows to drop operands that could
+    # only have raised an error (e.g. 'x and false' -> 'false').
+
+    def __init__(self, assume_valid=False):
+        self.assume_valid = assume_valid
+
+    def visit(self, node):
+        method = getattr(self, f'optimize_{type(node).__name__}', None)
+        return method(node) if method else node
+
+    def is_boolean(self, node):
+        # only identifiers and calls are trusted with assume_valid,
+        # a number literal never is a bool
+        if isinstance(node, (VarNode, CallNode)):
+            return self.assume_valid
+        return is_boolean(node)
+
+    def literal(self, value, like):
+        tok = Token.spanning(TT_KEYWORD, 'TRUE' if value else 'FALSE', like.pos_start, like.pos_end)
+        return BooleanNode(tok)
+
+    def fold(self, node):
+        result = Interpreter().visit(node, Context('<optimizer>'))
+        if result.error or not isinstance(result.value, Booleen):
+            return node
+        return self.literal(result.value.value, node)
+
+    def optimize_UnaryOpNode(self, node):
+        return self.simplify_unary(node, self.visit(node.node))
+
+    def simplify_unary(self, node, child):
+        # child is the already optimized operand of node
+        if isinstance(child, BooleanNode):
+            return self.literal(child.tok.value == 'FALSE', node)
+
+        # !!x -> x
+        if isinstance(child, UnaryOpNode) and self.is_boolean(child.node):
+            return child.node
+
+        # De Morgan, only where it removes a negation: !(!a and b) -> a or !b
+        # only and/or, true/false as operators can only raise an error
+        if (isinstance(child, BinOpNode) and is_and_or(child.op_tok)
+                and self.negatable(child.left_node) and self.negatable(child.right_node)
+                and (isinstance(child.left_node, UnaryOpNode) or isinstance(child.right_node, UnaryOpNode))):
+            flipped = 'OR' if child.op_tok.value == 'AND' else 'AND'
+            op_tok = Token.spanning(TT_KEYWORD, flipped, child.op_tok.pos_start, child.op_tok.pos_end)
+            left = self.negate(node.op_tok, child.left_node)
+            right = self.negate(node.op_tok, child.right_node)
+            return self.simplify_binop(BinOpNode(left, op_tok, right), left, right)
+
+        if child is node.node:
+            return node
+        return UnaryOpNode(node.op_tok, child)
+
+    def negatable(self, node):
+        if isinstance(node, UnaryOpNode):
+            return self.is_boolean(node.node)
+        return self.is_boolean(node)
+
+    def negate(self, op_tok, node):
+        if isinstance(node, UnaryOpNode):
+            return node.node
+        negation = UnaryOpNode(op_tok, node)
+        return self.simplify_unary(negation, node)
+
+    def optimize_BinOpNode(self, node):
+        return self.simplify_binop(node, self.visit(node.left_node), self.visit(node.right_node))
+
+    def simplify_binop(self, node, left, right):
+        # left and right are the already optimized operands of node
+        op_tok = node.op_tok
+
+        # errors of the other operators point at an operand, it has to
+        # cover the same text as before
+        if not is_and_or(op_tok):
+            left = self.same_span(left, node.left_node)
+            right = self.same_span(right, node.right_node)
+
+        if left is not node.left_node or right is not node.right_node:
+            rebuilt = BinOpNode(left, op_tok, right)
+            rebuilt.pos_start, rebuilt.pos_end = node.pos_start, node.pos_end
+            node = rebuilt
+
+        literals = (BooleanNode, NumberNode)
+        if isinstance(left, literals) and isinstance(right, literals):
+            return self.fold(node)
+
+        if is_and_or(op_tok):
+            is_and = op_tok.value == 'AND'
+
+            if isinstance(left, BooleanNode):
+                # false and x -> false, true or x -> true (short circuit)
+                if (left.tok.value == 'FALSE') == is_and:
+                    return self.literal(not is_and, node)
+                # true and x -> x, false or x -> x
+                if self.is_boolean(right):
+                    return right
+
+            if isinstance(right, BooleanNode):
+                # x and true -> x, x or false -> x
+                if (right.tok.value == 'TRUE') == is_and:
+                    if self.is_boolean(left):
+                        return left
+                # x and false -> false, x or true -> true
+                elif self.assume_valid:
+                    return self.literal(not is_and, node)
+
+        elif op_tok.type in (TT_EE, TT_NE):
+            # x == true -> x, x != true -> !x, ...
+            for literal, other in ((right, left), (left, right)):
+                if isinstance(literal, BooleanNode) and self.is_boolean(other):
+                    if (literal.tok.value == 'TRUE') == (op_tok.type == TT_EE):
+                        return other
+                    neg_tok = Token.spanning(TT_NEG, None, op_tok.pos_start, op_tok.pos_end)
+                    negation = UnaryOpNode(neg_tok, other)
+                    return self.simplify_unary(negation, other)
+
+        return node
+
+    def same_span(self, optimized, original):
+        # a rewritten subtree keeps the spans of its own nodes, folded
+        # literals take the span of the text they replace
+        if (optimized.pos_start.idx, optimized.pos_end.idx) == (original.pos_start.idx, original.pos_end.idx):
+            return optimized
+        return original
+
+    def optimize_CallNode(self, node):
+        if node.arg_nodes is None:
+            return node
+        arg = self.same_span(self.visit(node.arg_nodes), node.arg_nodes)
+        if arg is node.arg_nodes:
+            return node
+        return CallNode(node.node_to_call, arg)
+
+##########################
+# COST BASED ORDERING
+##########################
+
+CALL_COST = 10
+
+
+def reorder_by_cost(node):
+    # Returns a new ast where the operands of 'and'/'or' chains are sorted
+    # by their estimated cost, so cheap operands decide the short circuit
+    # before expensive ones (e.g. method calls) are evaluated. Operands
+    # which may evaluate to a number or to nothing stay in place. Only the
+    # reported error can change: for valid input the result is the same.
+    return order_node(node)[0]
+
+
+def order_node(node):
+    if isinstance(node, (BooleanNode, NumberNode)):
+        return node, 1
+    elif isinstance(node, VarNode):
+        return node, 2
+    elif isinstance(node, UnaryOpNode):
+        child, cost = order_node(node.node)
+        return UnaryOpNode(node.op_tok, child), cost + 1
+    elif isinstance(node, CallNode):
+        if node.arg_nodes is None:
+            return node, CALL_COST
+        arg, cost = order_node(node.arg_nodes)
+        new_node = CallNode(node.node_to_call, arg)
+        return new_node, cost + CALL_COST
+    elif isinstance(node, BinOpNode):
+        if is_and_or(node.op_tok):
+            return order_chain(node)
+        left, left_cost = order_node(node.left_node)
+        right, right_cost = order_node(node.right_node)
+        return BinOpNode(left, node.op_tok, right), left_cost + right_cost + 1
+    return node, 1
+
+
+def order_chain(node):
+    op_tok = node.op_tok
+    operands = []
+    pending = [node]
+
+    # flatten 'a and b and c' into its operands, keeping the source order
+    while pending:
+        current = pending.pop()
+        if isinstance(current, BinOpNode) and current.op_tok.matches(op_tok.type, op_tok.value):
+            pending.append(current.right_node)
+            pending.append(current.left_node)
+        else:
+            operands.append((current, order_node(current)))
+
+    # only runs of operands which can't be anything but a bool are sorted,
+    # everything else keeps its place, its type error or short circuit
+    ordered, run = [], []
+    for current, operand in operands:
+        if is_boolean(current):
+            run.append(operand)
+            continue
+        ordered.extend(sorted(run, key=lambda operand: operand[1]))
+        ordered.append(operand)
+        run = []
+    ordered.extend(sorted(run, key=lambda operand: operand[1]))
+    operands = ordered
+
+    left, cost = operands[0]
+    for right, right_cost in operands[1:]:
+        pos_start = min(left.pos_start, right.pos_start, key=lambda pos: pos.idx)
+        pos_end = max(left.pos_end, right.pos_end, key=lambda pos: pos.idx)
+        left = BinOpNode(left, op_tok, right)
+        left.pos_start, left.pos_end = pos_start, pos_end
+        cost += right_cost + 1
+
+    return left, cost
+
+##########################
+# COMPILED EXPRESSION
+##########################
+
+
+def normalize_bindings(bindings):
+    # identifiers are upper case after lexing, so are the binding names
+    if not bindings:
+        return None
+    return {name.upper(): value for name, value in bindings.items()}
+
+
+class CompiledExpression:
+    def __init__(self, fn, text, node, backend='tree'):
+        self.fn = fn
+        self.text = text
+        self.node = node
+        self.backend = backend
+        self.closure = None
+        self.program = None
+        # nodes which occur more than once in a dag built with share
+        self.shared = shared_nodes(node)
+
+        if backend == 'closure':
+            self.closure = ClosureCompiler(self.shared).compile(node)
+        elif backend == 'bytecode':
+            self.program = BytecodeCompiler().compile(fn, text, node)
+            self.closure = self.program.run
+        elif backend not in ('tree', 'stack'):
+            raise ValueError(f"Unknown backend '{backend}'")
+
+    def interpreter(self, trace=None, metrics=None, profile=None):
+        # the closure and bytecode backends have no nodes to time, a profile
+        # walks their ast with the Interpreter
+        if self.backend == 'stack':
+            return StackInterpreter(trace, self.shared, metrics, profile)
+        return Interpreter(trace, self.shared, metrics, profile)
+
+    def evaluate(self, bindings=None, trace=None, metrics=None, profile=None):
+        return self.evaluate_with(self.interpreter(trace, metrics, profile), bindings, metrics)
+
+    def evaluate_many(self, rows, trace=None, metrics=None, profile=None):
+        # one parsed ast serves every row, identifiers are resolved per row
+        interpreter = self.interpreter(trace, metrics, profile)
+        for bindings in rows:
+            yield self.evaluate_with(interpreter, bindings, metrics)
+
+    def evaluate_with(self, interpreter, bindings, metrics=None):
+        if metrics is None:
+            return self.evaluate_in(interpreter, bindings)
+        start = time.perf_counter_ns()
+        value, error = self.evaluate_in(interpreter, bindings)
+        ns = time.perf_counter_ns() - start
+        nodes, calls = interpreter.take_counts()
+        metrics.observe('evaluate', ns, error, nodes=nodes, calls=calls)
+        return value, error
+
+    def evaluate_in(self, interpreter, bindings):
+        context = Context('<program>')
+        context.identifier = identifier
+        context.bindings = normalize_bindings(bindings)
+        if self.shared:
+            context.memo = {}
+
+        if self.closure is not None and interpreter.profile is None:
+            try:
+                value = self.closure(context)
+            except ErrorSignal as signal:
+                return None, signal.error
+            return wrap_native(value), None
+
+        result = interpreter.visit(self.node, context)
+        return result.value, result.error
+
+    def __getstate__(self):
+        # closures can't be pickled, they are rebuilt from the ast
+        state = self.__dict__.copy()
+        state['closure'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.backend == 'closure':
+            self.closure = ClosureCompiler(self.shared).compile(self.node)
+        elif self.backend == 'bytecode':
+            self.closure = self.program.run
+
+    def evaluate_columns(self, columns):
+        # numpy is only needed for the columnar mode
+        from vectorized import evaluate_columns
+        return evaluate_columns(self, columns)
+
+    def __repr__(self):
+        return f'<CompiledExpression {self.text!r}>'
+
+
+LEXERS = {'char': Lexer, 'regex': FastLexer}
+PARSERS = {'recursive': Parser, 'stack': StackParser}
+
+
+def compile(fn, text, backend='tree', reorder=False, lexer='char', trace=None,
+            optimize=False, assume_valid=False, share=False, parser='recursive', metrics=None):
     # Generate tokens
-    lexer = Lexer(fn, text)
-    tokens, error = lexer.make_tokens()
-    print("tokenliste: " + str(tokens))
+    lexer = LEXERS[lexer](fn, text, trace)
+    if metrics is None:
+        tokens, error = lexer.make_tokens()
+    else:
+        start = time.perf_counter_ns()
+        tokens, error = lexer.make_tokens()
+        metrics.observe('lex', time.perf_counter_ns() - start, error, tokens=len(tokens or ()))
     if error:
         return None, error
 
     # Generate AST
-    parser = Parser(tokens)
-    ast = parser.parse()
+    # the rewrites build a tree again, it's shared once they are done
+    rewrite = optimize or reorder
+    parser = PARSERS[parser](tokens, trace, share and not rewrite)
+    if metrics is None:
+        ast = parser.parse()
+    else:
+        start = time.perf_counter_ns()
+        ast = parser.parse()
+        metrics.observe('parse', time.perf_counter_ns() - start, ast.error)
     if ast.error:
         return None, ast.error
 
-    # Run program
-    interpreter = Interpreter()
-    context = Context('<program>')
-    context.identifier = identifier
-    result = interpreter.visit(ast.node, context)
+    node = ast.node
+    if optimize:
+        node = Optimizer(assume_valid).visit(node)
+    if reorder:
+        node = reorder_by_cost(node)
+    if share and rewrite:
+        node = NodeTable().share(node)
+    return CompiledExpression(fn, text, node.freeze(), backend), None
+
+##########################
+# PARSE CACHE
+##########################
+
 
-    return result.value, result.error
+class ParseCache:
+    # Bounded LRU cache of compiled expressions keyed on the source text
+    # and the compile options.
+    # The cached asts are frozen, so the same entry can be evaluated by
+    # several threads at once.
+
+    def __init__(self, capacity=1024):
+        if capacity < 1:
+            raise ValueError('The capacity of a ParseCache has to be at least 1')
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fn, text, metrics=None, **options):
+        # metrics only measure a compile on a miss, they aren't part of the key
+        key = (fn, text, tuple(sorted(options.items())))
+
+        with self.lock:
+            compiled = self.entries.get(key)
+            if compiled is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return compiled, None
+            self.misses += 1
+
+        # compile outside of the lock, errors are not cached
+        compiled, error = compile(fn, text, metrics=metrics, **options)
+        if error:
+            return None, error
+
+        with self.lock:
+            # another thread may have compiled the same text meanwhile
+            compiled = self.entries.setdefault(key, compiled)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return compiled, None
+
+    def resize(self, capacity):
+        if capacity < 1:
+            raise ValueError('The capacity of a ParseCache has to be at least 1')
+        with self.lock:
+            self.capacity = capacity
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        # call after the 'keyword' table changed, the lexer bakes keywords
+        # into the cached asts (identifiers are looked up on evaluation)
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+parse_cache = ParseCache()
+
+
+def run(fn, text, cache=parse_cache, trace=None, metrics=None, profile=None, **options):
+    # Generate AST, or reuse the one of an earlier call,
+    # options are passed on to compile
+    if cache is not None and trace is None:
+        compiled, error = cache.get(fn, text, metrics=metrics, **options)
+    else:
+        compiled, error = compile(fn, text, trace=trace, metrics=metrics, **options)
+    if error:
+        return None, error
+
+    # Run program
+    return compiled.evaluate(trace=trace, metrics=metrics, profile=profile)
 
 
 # run method for testing the parser
@@ -0,0 +1,89 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from interpreter import *
+
+
+##########################
+# WORKER
+##########################
+
+# compiled expressions of the current worker process, shipped once by the
+# pool initializer and afterwards only referenced by their index
+worker_expressions = None
+
+
+def init_worker(expressions):
+    global worker_expressions
+    worker_expressions = expressions
+
+
+def evaluate_chunk(chunk):
+    expressions = worker_expressions
+    outcomes = []
+    for index, bindings in chunk:
+        value, error = expressions[index].evaluate(bindings)
+        # values go back as plain python values and are wrapped again by
+        # the parent, errors are sent as they are
+        outcomes.append((None, error) if error else (value.value, None))
+    return outcomes
+
+
+def rebuild_value(value):
+    if value is True or value is False:
+        return Booleen(value)
+    return Number(value)
+
+##########################
+# PARALLEL EVALUATION
+##########################
+
+
+def evaluate_parallel(jobs, workers=None, chunksize=512, fn='<parallel>', **options):
+    # Evaluates (expression, bindings) jobs on a pool of worker processes.
+    # Every distinct expression is compiled once here and sent once to each
+    # worker, the jobs only carry its index. Returns the (result, error)
+    # tuples in the order of the jobs, errors keep their positions.
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+
+    expressions = []
+    indices = {}
+    compile_errors = {}
+    pending = []
+
+    for job_idx, (text, bindings) in enumerate(jobs):
+        if text in compile_errors:
+            results[job_idx] = (None, compile_errors[text])
+            continue
+
+        index = indices.get(text)
+        if index is None:
+            compiled, error = compile(fn, text, **options)
+            if error:
+                compile_errors[text] = error
+                results[job_idx] = (None, error)
+                continue
+            index = indices[text] = len(expressions)
+            expressions.append(compiled)
+
+        pending.append((job_idx, index, bindings))
+
+    if not pending:
+        return results
+
+    chunks = [pending[i:i + chunksize] for i in range(0, len(pending), chunksize)]
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(expressions,)) as pool:
+        chunk_results = pool.map(evaluate_chunk, [
+            [(index, bindings) for job_idx, index, bindings in chunk] for chunk in chunks])
+
+        for chunk, outcomes in zip(chunks, chunk_results):
+            for (job_idx, index, bindings), (value, error) in zip(chunk, outcomes):
+                if error:
+                    results[job_idx] = (None, error)
+                else:
+                    results[job_idx] = (rebuild_value(value), None)
+
+    return results
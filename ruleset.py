@@ -0,0 +1,196 @@
+from bisect import bisect_left, bisect_right
+
+from interpreter import *
+
+
+##########################
+# PREDICATES
+##########################
+
+# comparisons with the constant on the left, as seen from the identifier
+FLIPPED = {TT_LT: TT_GT, TT_LTE: TT_GTE, TT_GT: TT_LT, TT_GTE: TT_LTE, TT_EE: TT_EE}
+
+
+def predicate_of(node):
+    # (name, op, constant) of 'identifier <op> number' or 'number <op> identifier'
+    if not isinstance(node, BinOpNode) or node.op_tok.type not in FLIPPED:
+        return None
+    left, right, op = node.left_node, node.right_node, node.op_tok.type
+    if isinstance(left, VarNode) and isinstance(right, NumberNode):
+        return left.var_name_tok.value, op, right.tok.value
+    if isinstance(left, NumberNode) and isinstance(right, VarNode):
+        return right.var_name_tok.value, FLIPPED[op], left.tok.value
+    return None
+
+
+def is_number(value):
+    # the values the Interpreter turns into a Number
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class PredicateIndex:
+    # The predicates over one identifier. The constants of every operator
+    # are kept sorted, the predicates which hold for a value are a slice
+    # found with one bisect.
+
+    def __init__(self):
+        self.sorted = {op: ([], []) for op in (TT_LT, TT_LTE, TT_GT, TT_GTE)}
+        self.equal = {}
+
+    def add(self, op, constant, predicate):
+        if op == TT_EE:
+            self.equal.setdefault(constant, []).append(predicate)
+            return
+        constants, predicates = self.sorted[op]
+        i = bisect_right(constants, constant)
+        constants.insert(i, constant)
+        predicates.insert(i, predicate)
+
+    def matching(self, value):
+        # every predicate which is true for the value
+        constants, predicates = self.sorted[TT_GT]
+        yield from predicates[:bisect_left(constants, value)]
+        constants, predicates = self.sorted[TT_GTE]
+        yield from predicates[:bisect_right(constants, value)]
+        constants, predicates = self.sorted[TT_LT]
+        yield from predicates[bisect_right(constants, value):]
+        constants, predicates = self.sorted[TT_LTE]
+        yield from predicates[bisect_left(constants, value):]
+        yield from self.equal.get(value, ())
+
+##########################
+# RULE SET
+##########################
+
+
+class RuleSet:
+    # Many rules evaluated against one record at a time. Comparisons of an
+    # identifier with a number are shared between the rules and resolved
+    # per identifier through a PredicateIndex:
+    # - a rule which is a conjunction of such predicates matches when all
+    #   of them hold, it is never evaluated
+    # - any other rule names predicates of which one has to hold for the
+    #   rule to be true (its anchors), it is only evaluated when one does
+    # - rules without anchors (e.g. 'isEven(a)' or '!(a < 1)') are always
+    #   evaluated
+    # Rules which raise an error don't match.
+
+    def __init__(self, **options):
+        # options are passed on to compile, the rules always use closures
+        self.options = dict(options, backend='closure')
+        self.ids = []
+        self.rules = []
+        self.predicates = {}
+        self.indexes = {}
+        # per predicate the conjunctions which count it and the rules it anchors
+        self.counted = []
+        self.anchored = []
+        # per rule the number of predicates a conjunction needs
+        self.needed = []
+        self.unanchored = []
+
+    def add(self, rule_id, text, fn='<rules>'):
+        compiled, error = compile(fn, text, **self.options)
+        if error:
+            return None, error
+
+        index = len(self.rules)
+        self.ids.append(rule_id)
+        self.rules.append(compiled)
+
+        conjunction = self.conjunction(compiled.node)
+        if conjunction is not None:
+            predicates = {self.predicate(predicate) for predicate in conjunction}
+            self.needed.append(len(predicates))
+            for predicate in predicates:
+                self.counted[predicate].append(index)
+            return compiled, None
+
+        self.needed.append(None)
+        anchors = self.anchors(compiled.node)
+        if anchors is None:
+            self.unanchored.append(index)
+        else:
+            for predicate in {self.predicate(predicate) for predicate in anchors}:
+                self.anchored[predicate].append(index)
+        return compiled, None
+
+    def predicate(self, predicate):
+        # the id of a deduplicated predicate
+        number = self.predicates.get(predicate)
+        if number is None:
+            number = self.predicates[predicate] = len(self.counted)
+            self.counted.append([])
+            self.anchored.append([])
+            name, op, constant = predicate
+            self.indexes.setdefault(name, PredicateIndex()).add(op, constant, number)
+        return number
+
+    def conjunction(self, node):
+        # the predicates of a rule made of predicates and 'and' only
+        predicates = []
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            if isinstance(current, BinOpNode) and current.op_tok.matches(TT_KEYWORD, 'AND'):
+                pending.append(current.right_node)
+                pending.append(current.left_node)
+                continue
+            predicate = predicate_of(current)
+            if predicate is None:
+                return None
+            predicates.append(predicate)
+        return predicates
+
+    def anchors(self, node):
+        # predicates of which at least one holds whenever the node is true,
+        # None if there are none
+        predicate = predicate_of(node)
+        if predicate is not None:
+            return [predicate]
+        if isinstance(node, BinOpNode) and node.op_tok.type == TT_KEYWORD:
+            left = self.anchors(node.left_node)
+            right = self.anchors(node.right_node)
+            if node.op_tok.value == 'AND':
+                # both sides are true, one side's anchors are enough
+                if left is None or right is None:
+                    return left or right
+                return left if len(left) <= len(right) else right
+            if node.op_tok.value == 'OR' and left is not None and right is not None:
+                return left + right
+        return None
+
+    def match(self, record):
+        # ids of the rules which are true for the record, in the order
+        # they were added
+        context = Context('<rules>')
+        context.identifier = identifier
+        context.bindings = normalize_bindings(record)
+
+        counts = {}
+        candidates = set(self.unanchored)
+        for name, index in self.indexes.items():
+            value = context.lookup(name)
+            if not is_number(value):
+                continue
+            for predicate in index.matching(value):
+                for rule in self.counted[predicate]:
+                    counts[rule] = counts.get(rule, 0) + 1
+                candidates.update(self.anchored[predicate])
+
+        matches = [rule for rule, count in counts.items() if count == self.needed[rule]]
+        for rule in candidates:
+            compiled = self.rules[rule]
+            context.memo = {} if compiled.shared else None
+            try:
+                value = compiled.closure(context)
+            except ErrorSignal:
+                continue
+            if value is True:
+                matches.append(rule)
+
+        matches.sort()
+        return [self.ids[rule] for rule in matches]
+
+    def __len__(self):
+        return len(self.rules)
@@ -1,11 +1,115 @@
+import argparse
+import json
+import sys
+import time
+
 import interpreter
 
 
-while True:
-    text = input('boo > ')
-    result, error = interpreter.run('<stdin>', text)
+CHUNK_SIZE = 1 << 20
+BATCH_SIZE = 4096
+
+
+def repl():
+    while True:
+        text = input('boo > ')
+        result, error = interpreter.run('<stdin>', text)
+
+        if error:
+            print(error.as_string())
+        else:
+            print(result)
+
+
+##########################
+# STREAMING
+##########################
+
+def read_lines(stream, chunk_size=CHUNK_SIZE):
+    # reads the binary stream in large chunks and yields its lines
+    rest = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def evaluate_lines(lines, fn='<stdin>'):
+    # yields (line number, text, result, error), blank lines are skipped
+    for ln, line in enumerate(lines, 1):
+        text = line.decode('utf-8', 'replace').rstrip('\r')
+        if not text.strip():
+            continue
+        result, error = interpreter.run(fn, text, backend='closure', lexer='regex')
+        yield ln, text, result, error
+
+
+def format_plain(ln, text, result, error):
+    if error:
+        return f'{ln}: {error.error_name}: {error.details} (column {error.pos_start.col + 1})'
+    return f'{ln}: {result}'
+
 
+def format_json(ln, text, result, error):
     if error:
-        print(error.as_string())
+        return json.dumps({'line': ln, 'result': None, 'error': {
+            'name': error.error_name,
+            'details': error.details,
+            'start': error.pos_start.idx,
+            'end': error.pos_end.idx,
+            'column': error.pos_start.col + 1,
+        }})
+    return json.dumps({'line': ln, 'result': result.value, 'error': None})
+
+
+def write_batched(outputs, stream, batch_size=BATCH_SIZE):
+    # joins the outputs and writes them in batches, returns their count
+    count = 0
+    batch = []
+    for output in outputs:
+        batch.append(output)
+        if len(batch) >= batch_size:
+            stream.write('\n'.join(batch) + '\n')
+            count += len(batch)
+            batch.clear()
+    if batch:
+        stream.write('\n'.join(batch) + '\n')
+        count += len(batch)
+    return count
+
+
+def stream(stdin, stdout, stderr, as_json=False):
+    formatter = format_json if as_json else format_plain
+    start = time.perf_counter()
+
+    results = evaluate_lines(read_lines(stdin))
+    count = write_batched((formatter(*result) for result in results), stdout)
+    stdout.flush()
+
+    seconds = time.perf_counter() - start
+    rate = count / seconds if seconds else 0
+    stderr.write(f'{count} lines in {seconds:.2f}s ({rate:.0f} lines/sec)\n')
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Interpreter for boolean expressions')
+    parser.add_argument('--stream', action='store_true',
+                        help='evaluate every line of stdin and write one result per line')
+    parser.add_argument('--json', action='store_true',
+                        help='write the results of --stream as json lines')
+    args = parser.parse_args(argv)
+
+    if args.stream:
+        stream(sys.stdin.buffer, sys.stdout, sys.stderr, args.json)
     else:
-        print(result)
+        repl()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,29 @@
+import asyncio
+import contextlib
+import io
+import itertools
+import os
+import json
+import pickle
+import random
+import tempfile
+import threading
+import time
 import unittest
 from interpreter import *
+from asynchronous import EvaluationTimeoutError, evaluate_async
+from bench.generator import ExpressionGenerator
+from incremental import IncrementalEvaluator
+from bdd import BDD, compile_bdd
+from filecache import FileCache
+from parallel import evaluate_parallel
+from ruleset import RuleSet
+import terminal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 # unittests for boolean interpreter
@@ -16,16 +40,15 @@ class TestBooInterpreter(unittest.TestCase):
 
         # Run program
         self.interpreter = Interpreter()
-        self.result = self.interpreter.visit(self.ast.node)
+        self.context = Context('<program>')
+        self.context.identifier = identifier
+        self.result = self.interpreter.visit(self.ast.node, self.context).value
 
         return self
 
     # convert intern bool into py bool
     def convert_bool(self):
-        if self.result.value == 'TRUE':
-            self.result = True
-        else:
-            self.result = False
+        self.result = self.result.value
         return self.result
 
     # convert token into strings
@@ -110,6 +133,1188 @@ class TestBooInterpreter(unittest.TestCase):
                 self.assertTrue(self.result)
 
 
+class TestCompiledExpression(unittest.TestCase):
+
+    def test_evaluate_many(self):
+        compiled, error = compile('stdin', 'x > 3 and !(y == 2)')
+        self.assertIsNone(error)
+
+        rows = [{'x': 4, 'y': 1}, {'x': 4, 'y': 2}, {'x': 1, 'y': 1}]
+        results = [str(value) for value, error in compiled.evaluate_many(rows)]
+
+        self.assertEqual(['TRUE', 'FALSE', 'FALSE'], results)
+
+    def test_bindings_shadow_identifier_table(self):
+        compiled, error = compile('stdin', 'isEven(a)')
+
+        # 'A' is 1 in the identifier table
+        self.assertEqual('FALSE', str(compiled.evaluate()[0]))
+        self.assertEqual('TRUE', str(compiled.evaluate({'a': 4})[0]))
+        self.assertEqual('TRUE', str(compiled.evaluate({'a': 3, 'isEven': isNotEven})[0]))
+
+    def test_unknown_identifier_is_runtime_error(self):
+        compiled, error = compile('stdin', 'true and unknown')
+        self.assertIsNone(error)
+
+        value, error = compiled.evaluate()
+        self.assertIsNone(value)
+        self.assertIsInstance(error, NonExistentIdentifierError)
+        self.assertEqual(9, error.pos_start.idx)
+
+        value, error = compiled.evaluate({'unknown': False})
+        self.assertEqual('FALSE', str(value))
+
+
+class TestClosureBackend(unittest.TestCase):
+
+    expressions = [
+        'true and false or !true',
+        'a > 3 and !(b == 2) or c <= 1.5',
+        'isEven(a) and !isNotEven(b) or a != b',
+        'true == false != true',
+        # errors
+        'true and 1',
+        '1 or true',
+        'true < 2',
+        '2 >= false',
+        '1 == true',
+        '!3',
+        'isEven(true)',
+        'isEven',
+        'a(1)',
+        'true and missing',
+        '!(1 < true)',
+    ]
+
+    bindings = {'a': 4, 'b': 2.5}
+
+    def test_same_results_and_errors_as_tree_walker(self):
+        for text in self.expressions:
+            with self.subTest(text=text):
+                tree, error = compile('stdin', text, 'tree')
+                self.assertIsNone(error)
+                closure, error = compile('stdin', text, 'closure')
+                self.assertEqual(outcome(tree, self.bindings), outcome(closure, self.bindings))
+
+    def test_run_selects_backend(self):
+        value, error = run('stdin', '1 < 2 and isEven(2)', backend='closure')
+        self.assertIs(TRUE, value)
+        self.assertRaises(ValueError, run, 'stdin', 'true', backend='nope')
+
+
+class TestShortCircuit(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        def expensive(arg):
+            self.calls.append(arg)
+            return True
+
+        self.bindings = {'expensive': expensive, 'x': 1}
+
+    def test_right_side_is_skipped(self):
+        for backend in ('tree', 'closure'):
+            compiled, error = compile('stdin', 'false and expensive(1) or true or expensive(2)', backend)
+            value, error = compiled.evaluate(self.bindings)
+            self.assertEqual('TRUE', str(value))
+            # the skipped side isn't even type checked
+            value, error = compile('stdin', 'false and 1', backend)[0].evaluate()
+            self.assertEqual('FALSE', str(value))
+        self.assertEqual([], self.calls)
+
+    def test_reorder_runs_cheap_operands_first(self):
+        text = '(expensive(1) == true) and x > 2 and (expensive(2) == true) or !true'
+        for backend in ('tree', 'closure'):
+            plain = compile('stdin', text, backend)[0].evaluate(self.bindings)
+            ordered = compile('stdin', text, backend, reorder=True)[0].evaluate(self.bindings)
+            self.assertEqual(str(plain[0]), str(ordered[0]))
+        self.assertEqual([1, 1], self.calls)
+
+    def test_reorder_keeps_operands_which_may_not_be_bools(self):
+        # calls, identifiers and numbers may not be bools, moving them
+        # would change which type error or short circuit comes first
+        cases = [
+            ('isEven(1) and 2 and false', {}),
+            ('a and false', {'a': 1}),
+            ('(a < 1) true (b < 2) and false', {'a': 0, 'b': 0}),
+            ('isEven(a) or x and (a < 1)', {'a': 2, 'x': 3}),
+        ]
+        for text, bindings in cases:
+            with self.subTest(text=text):
+                plain = compile('stdin', text)[0].evaluate(bindings)
+                ordered = compile('stdin', text, reorder=True)[0].evaluate(bindings)
+                self.assertEqual(str(plain[0]), str(ordered[0]))
+                self.assertEqual(plain[1] and plain[1].as_string(), ordered[1] and ordered[1].as_string())
+
+
+class TestParseCache(unittest.TestCase):
+
+    def test_lru_eviction_and_counters(self):
+        cache = ParseCache(capacity=2)
+        first, error = cache.get('stdin', 'true')
+        cache.get('stdin', 'false')
+        self.assertIs(first, cache.get('stdin', 'true')[0])
+        cache.get('stdin', '1 < 2')
+
+        # 'false' was the least recently used entry
+        self.assertEqual({'size': 2, 'capacity': 2, 'hits': 1, 'misses': 3, 'evictions': 1},
+                         cache.stats())
+        cache.get('stdin', 'false')
+        self.assertEqual(4, cache.stats()['misses'])
+
+        cache.invalidate()
+        self.assertEqual(0, len(cache))
+
+    def test_errors_are_not_cached(self):
+        cache = ParseCache()
+        value, error = cache.get('stdin', 'true and')
+        self.assertIsInstance(error, InvalidSyntaxError)
+        self.assertEqual(0, len(cache))
+
+    def test_cached_ast_is_frozen(self):
+        compiled, error = ParseCache().get('stdin', '!(a < 2)')
+        self.assertRaises(AttributeError, setattr, compiled.node, 'node', None)
+        self.assertRaises(AttributeError, setattr, compiled.node.node.left_node.var_name_tok, 'value', 'B')
+
+    def test_shared_between_threads(self):
+        cache = ParseCache(capacity=4)
+        texts = [f'a < {i} or isEven({i})' for i in range(8)]
+        results = []
+
+        def work():
+            for text in texts * 20:
+                compiled, error = cache.get('stdin', text)
+                results.append(str(compiled.evaluate({'a': 3})[0]))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(4 * 8 * 20, len(results))
+        stats = cache.stats()
+        self.assertEqual(len(results), stats['hits'] + stats['misses'])
+
+
+class TestFastLexer(unittest.TestCase):
+
+    def stream(self, lexer_class, text):
+        tokens, error = lexer_class('stdin', text).make_tokens()
+        if error:
+            return (type(error), error.details,
+                    error.pos_start.idx, error.pos_start.ln, error.pos_start.col,
+                    error.pos_end.idx, error.pos_end.ln, error.pos_end.col)
+        return [(tok.type, tok.value,
+                 tok.pos_start.idx, tok.pos_start.ln, tok.pos_start.col,
+                 tok.pos_end.idx, tok.pos_end.ln, tok.pos_end.col) for tok in tokens]
+
+    def test_same_token_stream(self):
+        texts = [
+            '',
+            'true and FALSE or !(a <= 3.25)',
+            '\t12>=1.  !=isEven(b2)==  x<y>z',
+            'a = b',
+            '1.2.3',
+            'true and\nfalse',
+            'a ? b',
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(self.stream(Lexer, text), self.stream(FastLexer, text))
+
+    def test_iter_tokens_is_lazy(self):
+        tokens = FastLexer('stdin', 'true and ?').iter_tokens()
+        self.assertEqual('TRUE', next(tokens).value)
+        self.assertEqual('AND', next(tokens).value)
+        self.assertRaises(ErrorSignal, next, tokens)
+
+    def test_compile_with_regex_lexer(self):
+        compiled, error = compile('stdin', 'a > 1 and !false', lexer='regex')
+        self.assertEqual('TRUE', str(compiled.evaluate({'a': 2})[0]))
+
+
+class TestCompactNodes(unittest.TestCase):
+
+    def test_nodes_and_tokens_have_no_dict(self):
+        compiled, error = compile('stdin', '!(a < 2) or isEven(3)')
+        node = compiled.node
+        for item in (node, node.left_node, node.left_node.node, node.right_node,
+                     node.right_node.node_to_call, node.op_tok, node.pos_start):
+            self.assertFalse(hasattr(item, '__dict__'), type(item).__name__)
+
+    def test_positions_share_the_source(self):
+        tokens, error = Lexer('stdin', 'true and false').make_tokens()
+        self.assertIs(tokens[0].pos_start.source, tokens[2].pos_end.source)
+        self.assertEqual((0, 9), (tokens[2].pos_start.ln, tokens[2].pos_start.col))
+
+        # line and column are only derived when the error is reported
+        tokens, error = Lexer('stdin', 'true and\n false').make_tokens()
+        self.assertIsNone(error.pos_start.source.line_starts)
+        self.assertEqual((1, 0), (error.pos_end.ln, error.pos_end.col))
+
+
+class TestHashMap(unittest.TestCase):
+
+    class Colliding:
+        def __init__(self, name):
+            self.name = name
+
+        def __hash__(self):
+            return 7
+
+        def __eq__(self, other):
+            return isinstance(other, type(self)) and self.name == other.name
+
+    def test_put_get_delete(self):
+        table = HashMap()
+        table.put('A', 1)
+        table.put('B', 2)
+        table.put('A', 3)
+
+        self.assertEqual(3, table.get('A'))
+        self.assertIsNone(table.get('C'))
+        self.assertEqual(2, len(table))
+        self.assertTrue(table.delete('A'))
+        self.assertFalse(table.delete('A'))
+        self.assertNotIn('A', table)
+        self.assertIn('B', table)
+        self.assertEqual(['B'], list(table))
+
+    def test_colliding_keys(self):
+        table = HashMap()
+        keys = [self.Colliding(i) for i in range(20)]
+        for i, key in enumerate(keys):
+            table.put(key, i)
+        table.put(self.Colliding(19), 'last')
+        table.delete(keys[3])
+
+        self.assertEqual(19, len(table))
+        self.assertEqual('last', table.get(keys[19]))
+        self.assertEqual(4, table.get(self.Colliding(4)))
+        self.assertIsNone(table.get(keys[3]))
+
+    def test_resize_keeps_entries(self):
+        table = HashMap()
+        for i in range(10000):
+            table.put(f'VAR{i}', i)
+        for i in range(0, 10000, 2):
+            table.delete(f'VAR{i}')
+
+        self.assertEqual(5000, len(table))
+        self.assertGreater(table.mask + 1, table.used)
+        self.assertEqual(9999, table.get('VAR9999'))
+        self.assertEqual(dict((f'VAR{i}', i) for i in range(1, 10000, 2)), dict(table.items()))
+
+
+@unittest.skipUnless(numpy, 'numpy is not installed')
+class TestColumnEvaluation(unittest.TestCase):
+
+    def test_same_rows_as_interpreter(self):
+        text = 'a > 3 and !(b == 2) or isEven(a) and isNotEven(b) or twice(a) == 4'
+        a = numpy.arange(10)
+        b = numpy.array([2, 2, 1, 1, 3, 2, 1, 0, 5, 3])
+        twice = lambda arg: arg * 2
+        compiled, error = compile('stdin', text)
+
+        mask, error = compiled.evaluate_columns({'a': a, 'b': b, 'twice': twice})
+        expected = [compiled.evaluate({'a': int(a[i]), 'b': int(b[i]), 'twice': twice})[0].value
+                    for i in range(10)]
+        self.assertIsNone(error)
+        self.assertEqual(expected, mask.tolist())
+
+    def test_vectorized_implementation_is_used(self):
+        calls = []
+
+        @vectorized(lambda column: calls.append(len(column)) or column > 1)
+        def big(arg):
+            raise AssertionError('called per row')
+
+        compiled, error = compile('stdin', 'big(a) or false')
+        mask, error = compiled.evaluate_columns({'a': [0, 1, 2, 3], 'big': big})
+        self.assertEqual([False, False, True, True], mask.tolist())
+        self.assertEqual([4], calls)
+
+    def test_errors_match_interpreter(self):
+        compiled, error = compile('stdin', 'a > 3 and b')
+        value, error = compiled.evaluate_columns({'a': numpy.arange(5), 'b': numpy.arange(5)})
+        expected = compiled.evaluate({'a': 4, 'b': 1})[1]
+        self.assertEqual(expected.as_string(), error.as_string())
+
+        # no row needs 'b', so it is never looked at
+        mask, error = compiled.evaluate_columns({'a': numpy.arange(3), 'b': numpy.arange(3)})
+        self.assertEqual([False] * 3, mask.tolist())
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_results_keep_job_order(self):
+        jobs = [('a > 2 and isEven(a)', {'a': i}) for i in range(40)]
+        jobs.insert(5, ('a >', {}))
+        jobs.insert(9, ('isEven(a)', {'a': True}))
+
+        results = evaluate_parallel(jobs, workers=2, chunksize=7)
+        compiled, error = compile('<parallel>', jobs[0][0])
+
+        self.assertEqual(len(jobs), len(results))
+        self.assertIsInstance(results[5][1], InvalidSyntaxError)
+        self.assertIsInstance(results[9][1], RTError)
+        self.assertEqual(7, results[9][1].pos_start.idx)
+        values = [str(value) for value, error in results if not error]
+        self.assertEqual([str(compiled.evaluate({'a': i})[0]) for i in range(40)], values)
+
+    def test_errors_can_be_pickled(self):
+        compiled, error = compile('stdin', 'isEven(a)')
+        value, error = compiled.evaluate({'a': True, 'isEven': lambda arg: True})
+        copy = pickle.loads(pickle.dumps(error))
+        self.assertEqual(error.as_string(), copy.as_string())
+
+    def test_compiled_expressions_can_be_pickled(self):
+        compiled, error = compile('stdin', '!(a < 2)', backend='closure')
+        copy = pickle.loads(pickle.dumps(compiled))
+        self.assertTrue(copy.node.frozen)
+        self.assertEqual('TRUE', str(copy.evaluate({'a': 5})[0]))
+
+
+class TestStreaming(unittest.TestCase):
+
+    text = b'true and false\n\n1 < 2\r\na ?\nisEven(4)'
+
+    def stream(self, as_json, chunk_size=terminal.CHUNK_SIZE):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        lines = terminal.read_lines(io.BytesIO(self.text), chunk_size)
+        results = terminal.evaluate_lines(lines)
+        formatter = terminal.format_json if as_json else terminal.format_plain
+        terminal.write_batched((formatter(*result) for result in results), stdout, batch_size=2)
+        return stdout.getvalue().splitlines()
+
+    def test_plain_output(self):
+        self.assertEqual([
+            '1: FALSE',
+            '3: TRUE',
+            "4: Illegal Character: '?' (column 3)",
+            '5: TRUE',
+        ], self.stream(False, chunk_size=3))
+
+    def test_json_lines(self):
+        results = [json.loads(line) for line in self.stream(True)]
+        self.assertEqual([False, True, None, True], [result['result'] for result in results])
+        self.assertEqual({'name': 'Illegal Character', 'details': "'?'", 'start': 2, 'end': 3, 'column': 3},
+                         results[2]['error'])
+
+    def test_throughput_report(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        count = terminal.stream(io.BytesIO(self.text), stdout, stderr)
+        self.assertEqual(4, count)
+        self.assertIn('4 lines in', stderr.getvalue())
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_run_prints_nothing(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            run('stdin', 'a < 2 and isEven(b)', cache=None)
+        self.assertEqual('', stdout.getvalue())
+
+    def test_levels(self):
+        trace = Trace(TRACE_TOKENS)
+        run('stdin', 'a < 2', trace=trace)
+        self.assertEqual(['lex'], [event.phase for event in trace.events])
+        self.assertEqual('[IDENTIFIER:A, <, INT:2, EOF]', str(trace.events[0].result))
+
+        trace = Trace(TRACE_VISITS)
+        value, error = run('stdin', '!(a < 2)', trace=trace)
+        self.assertIn(('parse', 'primary'), [(event.phase, event.name) for event in trace.events])
+        visits = trace.phase('visit')
+        self.assertEqual(['VarNode', 'NumberNode', 'BinOpNode', 'UnaryOpNode'],
+                         [event.name for event in visits])
+        self.assertIs(value, visits[-1].result)
+
+    def test_errors_are_recorded(self):
+        trace = Trace()
+        value, error = run('stdin', 'isEven(true)', trace=trace)
+        self.assertIs(error, trace.events[-1].result)
+
+    def test_disabled_trace_installs_nothing(self):
+        interpreter = Interpreter(Trace(TRACE_OFF))
+        self.assertNotIn('walk', vars(interpreter))
+        self.assertIn('walk', vars(Interpreter(Trace(TRACE_VISITS))))
+        parser = Parser(Lexer('stdin', 'true', Trace(TRACE_TOKENS)).make_tokens()[0], Trace(TRACE_TOKENS))
+        self.assertNotIn('expr', vars(parser))
+
+
+class TestOptimizer(unittest.TestCase):
+
+    expressions = [
+        '(3 < 5) and x',
+        '!!true or y',
+        '!!(a < 2) and !!x',
+        '!(!x and y)',
+        '!(!(a < 1) or !(b >= 2))',
+        'x == true or y != true and (a < 1) == false',
+        '(true and (a < 1)) < 3',
+        'isEven((1 < 2)) or isEven(a)',
+        'x and false or (y or true)',
+        'true < 1 and x',
+        'true true a',
+        '!(!(1<a) true (2<b))',
+        'false or !y',
+        '!!!0',
+        '!(!x and !!a)',
+        '(!!a) < 3 or isEven((!!x))',
+    ]
+
+    bindings = [
+        {'x': True, 'y': False, 'a': 0, 'b': 3},
+        {'x': False, 'y': True, 'a': 4, 'b': 1},
+        {'x': 1, 'y': 2.5, 'a': True, 'b': 0},
+    ]
+
+    def test_same_results_and_errors(self):
+        for text in self.expressions:
+            plain, error = compile('stdin', text)
+            optimized, error = compile('stdin', text, optimize=True)
+            for bindings in self.bindings:
+                with self.subTest(text=text, bindings=bindings):
+                    self.assertEqual(outcome(plain, bindings), outcome(optimized, bindings))
+
+    def test_same_results_assuming_valid_bindings(self):
+        for text in self.expressions:
+            plain, error = compile('stdin', text)
+            optimized, error = compile('stdin', text, optimize=True, assume_valid=True)
+            for bindings in self.bindings[:2]:
+                expected = plain.evaluate(bindings)
+                if expected[1]:
+                    continue
+                with self.subTest(text=text, bindings=bindings):
+                    self.assertEqual(str(expected[0]), str(optimized.evaluate(bindings)[0]))
+
+    def test_numbers_are_never_assumed_to_be_bools(self):
+        for text in ('!!5', '5 == true', 'true and 2.5'):
+            with self.subTest(text=text):
+                plain = compile('stdin', text)[0].evaluate()
+                optimized = compile('stdin', text, optimize=True, assume_valid=True)[0].evaluate()
+                self.assertIsNotNone(plain[1])
+                self.assertEqual(plain[1].as_string(), optimized[1].as_string())
+
+    def test_node_count_reduction(self):
+        counts = {}
+        for text in ('!!true or y', '!(!(a < 1) or !(b >= 2))', 'x and false'):
+            nodes = [count_nodes(compile('stdin', text, optimize=level)[0].node) for level in (False, True)]
+            nodes.append(count_nodes(compile('stdin', text, optimize=True, assume_valid=True)[0].node))
+            counts[text] = nodes
+        self.assertEqual({
+            '!!true or y': [5, 1, 1],
+            '!(!(a < 1) or !(b >= 2))': [10, 7, 7],
+            'x and false': [3, 3, 1],
+        }, counts)
+
+
+class TestSharedNodes(unittest.TestCase):
+
+    expressions = [
+        'a >= 10 and b or a >= 10',
+        '!(a < 3) or !(a < 3) and isEven(a) == isEven(a)',
+        '(a < b) == (a < b) and !(a < b) != !(a < b)',
+        'b and (a > 1) and b or (a > 1) and missing',
+        '!a or !a',
+        '2 > 3 or (!2)',
+        'b or isEven(a) and !(a == a)',
+        'b or (1 < b)',
+    ]
+
+    bindings = [
+        {'a': 12, 'b': True},
+        {'a': 2, 'b': False},
+        {'a': True, 'b': 3},
+    ]
+
+    def test_identical_subtrees_are_one_node(self):
+        compiled, error = compile('stdin', 'a >= 10 and b or a >= 10', share=True)
+        self.assertIs(compiled.node.left_node.left_node, compiled.node.right_node)
+        self.assertEqual({compiled.node.right_node}, compiled.shared)
+
+        plain, error = compile('stdin', 'a >= 10 and b or a >= 10')
+        self.assertIsNot(plain.node.left_node.left_node, plain.node.right_node)
+        self.assertFalse(plain.shared)
+
+    def test_same_results(self):
+        for text in self.expressions:
+            for options in ({}, {'backend': 'closure'}, {'backend': 'bytecode'}, {'optimize': True}, {'reorder': True}):
+                plain, error = compile('stdin', text, **options)
+                shared, error = compile('stdin', text, share=True, **options)
+                for bindings in self.bindings:
+                    with self.subTest(text=text, options=options, bindings=bindings):
+                        self.assertEqual(outcome(plain, bindings), outcome(shared, bindings))
+
+    def test_shared_node_is_evaluated_once(self):
+        calls = []
+
+        def count(arg):
+            calls.append(arg)
+            return arg
+
+        for backend in ('tree', 'closure'):
+            for share, expected in ((False, 3), (True, 1)):
+                del calls[:]
+                compiled, error = compile('stdin', 'count(1) > 0 and count(1) > 0 and !(count(1) > 0) == false',
+                                          backend, share=share)
+                value, error = compiled.evaluate({'count': count})
+                self.assertIs(TRUE, value)
+                self.assertEqual(expected, len(calls), (backend, share))
+
+    def test_pickled_dag_stays_shared(self):
+        compiled, error = compile('stdin', '(a < 1) or (a < 1)', share=True)
+        copied = pickle.loads(pickle.dumps(compiled))
+        self.assertIs(copied.node.left_node, copied.node.right_node)
+        self.assertIs(TRUE, copied.evaluate({'a': 0})[0])
+
+
+PIECES = ['a', 'b', 'f', '1', '2.5', 'true', 'false', 'and', 'or', '!', '(', ')', '<', '<=', '>', '>=', '==', '!=']
+
+
+def generated_expressions(count, seed=3):
+    rnd = random.Random(seed)
+    texts = []
+    while len(texts) < count:
+        # mostly valid expressions, with a random token here and there
+        text = generated_expression(rnd, 4)
+        if rnd.random() < 0.3:
+            words = text.split(' ')
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(PIECES))
+            text = ' '.join(words)
+        texts.append(text)
+    return texts
+
+
+def generated_expression(rnd, depth):
+    choice = rnd.randrange(7 if depth else 3)
+    if choice == 0:
+        return rnd.choice(['a', 'b', '1', '2.5', 'true', 'false'])
+    if choice == 1:
+        return 'f ( ' + rnd.choice(['a', '1', '( ' + generated_expression(rnd, max(depth - 1, 0)) + ' )', '']) + ' )'
+    if choice == 2:
+        return 'isEven ( ' + rnd.choice(['a', '2', 'b']) + ' )'
+    if choice == 3:
+        return '! ' + generated_expression(rnd, depth - 1)
+    if choice == 4:
+        return '( ' + generated_expression(rnd, depth - 1) + ' )'
+    op = rnd.choice(['and', 'or', '<', '<=', '>', '>=', '==', '!=', 'true'])
+    return generated_expression(rnd, depth - 1) + f' {op} ' + generated_expression(rnd, depth - 1)
+
+
+def signature(node):
+    # structure and spans of an ast, to compare the asts of two parsers
+    if node is None:
+        return None
+    children = [signature(getattr(node, name)) for name in ('left_node', 'node', 'right_node', 'node_to_call', 'arg_nodes')
+                if hasattr(node, name)]
+    tok = getattr(node, 'op_tok', None) or getattr(node, 'tok', None) or getattr(node, 'var_name_tok', None)
+    return (type(node).__name__, tok and (tok.type, tok.value), node.pos_start.idx, node.pos_end.idx, children)
+
+
+def outcome(compiled, bindings):
+    # value or error of an evaluation, to compare backends and rewrites
+    value, error = compiled.evaluate(bindings)
+    if error:
+        return type(error).__name__, error.pos_start.idx, error.pos_end.idx, error.as_string()
+    return str(value)
+
+
+class TestStackParser(unittest.TestCase):
+
+    def parse(self, parser, text, share=False):
+        tokens, error = Lexer('stdin', text).make_tokens()
+        res = parser(tokens, share=share).parse()
+        if res.error:
+            return res.error.as_string()
+        return signature(res.node)
+
+    def test_same_asts_and_errors(self):
+        texts = generated_expressions(1500) + ['f((a) b)', 'f((a b))', 'f(1 < 2)', 'f(!a)', '((a)', '(a))', 'a true b', '']
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(self.parse(Parser, text), self.parse(StackParser, text))
+
+    def test_shared_asts(self):
+        text = '(a < 1) and f((a < 1)) or !(a < 1)'
+        tokens, error = Lexer('stdin', text).make_tokens()
+        node = StackParser(tokens, share=True).parse().node
+        self.assertIs(node.left_node.left_node, node.right_node.node)
+        self.assertIs(node.left_node.left_node, node.left_node.right_node.arg_nodes)
+
+    def events(self, trace):
+        return [(event.name, event.node.pos_start.idx, event.node.pos_end.idx,
+                 event.result.as_string() if isinstance(event.result, Error) else str(event.result))
+                for event in trace.events]
+
+    def test_same_results_and_traces(self):
+        def count(arg):
+            return arg * 2
+
+        bindings = [{'a': 1, 'b': 2.5, 'f': count}, {'a': True, 'b': False, 'f': isEven}]
+        for text in generated_expressions(500, seed=5):
+            for share in (False, True):
+                tree, error = compile('stdin', text, share=share)
+                if error:
+                    continue
+                stack, error = compile('stdin', text, share=share, parser='stack', backend='stack')
+                for values in bindings:
+                    with self.subTest(text=text, share=share, bindings=values):
+                        tree_trace, stack_trace = Trace(TRACE_VISITS), Trace(TRACE_VISITS)
+                        expected = tree.evaluate(values, tree_trace)
+                        result = stack.evaluate(values, stack_trace)
+                        self.assertEqual(str(expected[0]), str(result[0]))
+                        self.assertEqual(expected[1] and expected[1].as_string(), result[1] and result[1].as_string())
+                        self.assertEqual(self.events(tree_trace), self.events(stack_trace))
+
+    def test_deep_nesting(self):
+        depth = 100000
+        for text, expected in (('(' * depth + 'a < 1' + ')' * depth, 'TRUE'),
+                               ('!' * depth + 'true', 'TRUE'),
+                               ('isEven(' + '(' * 10000 + 'a' + ')' * 10000 + ')', 'TRUE'),
+                               # a left deep ast of ten thousand levels
+                               (' and '.join(['!(a < 1)'] * 10000), 'FALSE')):
+            with self.subTest(text=text[:20]):
+                compiled, error = compile('stdin', text, lexer='regex', parser='stack', backend='stack')
+                self.assertIsNone(error)
+                value, error = compiled.evaluate({'a': 0})
+                self.assertIsNone(error)
+                self.assertEqual(expected, str(value))
+
+        with self.assertRaises(RecursionError):
+            compile('stdin', '!' * 10000 + 'true', lexer='regex')
+
+
+class TestBytecode(unittest.TestCase):
+
+    def count(self, arg):
+        return arg * 2
+
+    def test_same_results_and_errors(self):
+        bindings = [{'a': 1, 'b': 2.5, 'f': self.count}, {'a': True, 'b': False, 'f': isEven}, {'a': 0, 'f': 1}]
+        for text in generated_expressions(800, seed=7) + ['a true b', 'f(1 < 2)', '1(2)', 'f()']:
+            tree, error = compile('stdin', text)
+            if error:
+                continue
+            program, error = compile('stdin', text, backend='bytecode')
+            for values in bindings:
+                with self.subTest(text=text, bindings=values):
+                    self.assertEqual(outcome(tree, values), outcome(program, values))
+
+    def test_short_circuit(self):
+        compiled, error = compile('stdin', 'false and missing or true or missing(1)', backend='bytecode')
+        self.assertIs(TRUE, compiled.evaluate()[0])
+        self.assertIn('AND_JUMP_IF_FALSE', compiled.program.disassemble())
+
+    def test_round_trip_through_bytes(self):
+        compiled, error = compile('stdin', 'a >= 10 and !isEven(a) or b == 2.5', backend='bytecode')
+        data = compiled.program.to_bytes()
+        self.assertIsInstance(data, bytes)
+
+        program = Program.from_bytes(data)
+        self.assertEqual(compiled.program.code, program.code)
+        for values in ({'a': 11, 'b': 0}, {'a': 12, 'b': 2.5}, {'a': 12, 'b': True}):
+            self.assertEqual(outcome(compiled, values), outcome(program, values))
+
+        value, error = program.evaluate({'a': 12, 'b': True})
+        self.assertIn('a >= 10 and !isEven(a) or b == 2.5', error.as_string())
+
+        with self.assertRaises(ValueError):
+            Program.from_bytes(b'XYZ' + data[3:])
+
+    def test_pickle(self):
+        compiled, error = compile('stdin', 'a < 3', backend='bytecode')
+        copied = pickle.loads(pickle.dumps(compiled))
+        self.assertIs(TRUE, copied.evaluate({'a': 1})[0])
+
+
+class TestFileCache(unittest.TestCase):
+
+    texts = ['a < 1 and isEven(b)', '!(x == true) or 2.5 >= c', 'isEven(3) or true']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'rules.cache')
+
+    def test_entries_are_loaded_after_a_restart(self):
+        cache = FileCache(self.path)
+        compiled = [cache.get('stdin', text)[0] for text in self.texts]
+        self.assertEqual(3, cache.save())
+        cache.close()
+
+        cache = FileCache(self.path)
+        self.assertEqual(3, cache.stats()['entries'])
+        for text, expected in zip(self.texts, compiled):
+            loaded, error = cache.get('stdin', text)
+            self.assertIsNot(expected, loaded)
+            self.assertEqual(signature(expected.node), signature(loaded.node))
+            for bindings in ({'a': 0, 'b': 2, 'x': True, 'c': 1}, {'a': True, 'c': 3}):
+                self.assertEqual(outcome(expected, bindings), outcome(loaded, bindings))
+        self.assertEqual({'entries': 3, 'loaded': 3, 'unsaved': 0, 'hits': 3, 'misses': 0}, cache.stats())
+        cache.close()
+
+    def test_options_and_sharing_are_kept(self):
+        cache = FileCache(self.path)
+        cache.get('stdin', '(a < 1) or (a < 1)', share=True, backend='closure')
+        cache.save()
+        cache.close()
+
+        cache = FileCache(self.path)
+        compiled, error = cache.get('stdin', '(a < 1) or (a < 1)', share=True, backend='closure')
+        self.assertIs(compiled.node.left_node, compiled.node.right_node)
+        self.assertIsNotNone(compiled.closure)
+        self.assertEqual(1, cache.stats()['hits'])
+
+        # other options are another entry
+        compiled, error = cache.get('stdin', '(a < 1) or (a < 1)')
+        self.assertIsNot(compiled.node.left_node, compiled.node.right_node)
+        self.assertEqual(1, cache.stats()['misses'])
+        cache.close()
+
+    def test_errors_are_not_cached(self):
+        cache = FileCache(self.path)
+        compiled, error = cache.get('stdin', 'a <')
+        self.assertIsInstance(error, InvalidSyntaxError)
+        self.assertEqual(0, cache.save())
+        cache.close()
+
+    def test_other_grammar_versions_are_ignored(self):
+        cache = FileCache(self.path)
+        cache.get('stdin', 'a < 1')
+        cache.save()
+        cache.close()
+
+        keyword.put('XOR', TT_KEYWORD)
+        try:
+            cache = FileCache(self.path)
+            self.assertEqual(0, cache.stats()['entries'])
+            cache.get('stdin', 'a < 1')
+            self.assertEqual(1, cache.stats()['misses'])
+            cache.close()
+        finally:
+            keyword.delete('XOR')
+
+        cache = FileCache(self.path)
+        self.assertEqual(1, cache.stats()['entries'])
+        cache.close()
+
+    def test_broken_files_are_ignored(self):
+        cache = FileCache(self.path)
+        cache.get('stdin', 'a < 1')
+        cache.save()
+        cache.close()
+
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 1)
+        cache = FileCache(self.path)
+        self.assertEqual(0, cache.stats()['entries'])
+        # 'a' is 1 in the identifier table
+        self.assertIs(FALSE, run('stdin', 'a < 1', cache=cache)[0])
+        self.assertEqual(1, cache.save())
+        cache.close()
+        cache = FileCache(self.path)
+        self.assertEqual(1, cache.stats()['entries'])
+        cache.close()
+
+
+def boolean_expression(rnd, depth, names='xyzw'):
+    choice = rnd.randrange(4 if depth else 2)
+    if choice == 0:
+        return rnd.choice(names)
+    if choice == 1:
+        return rnd.choice([rnd.choice(names), 'true', 'false'])
+    if choice == 2:
+        return '!(' + boolean_expression(rnd, depth - 1, names) + ')'
+    op = rnd.choice(['and', 'or', '==', '!='])
+    return f'({boolean_expression(rnd, depth - 1, names)} {op} {boolean_expression(rnd, depth - 1, names)})'
+
+
+class TestBDD(unittest.TestCase):
+
+    def truth_table(self, function):
+        names = [name.lower() for name in function.variables]
+        rows = []
+        for bits in itertools.product((False, True), repeat=len(names)):
+            value, error = function.compiled.evaluate(dict(zip(names, bits)))
+            rows.append((dict(zip(names, bits)), value.value))
+        return rows
+
+    def test_same_results_and_errors(self):
+        rnd = random.Random(11)
+        values = [True, False, 'TRUE', 1, 2.5, isEven]
+        for i in range(300):
+            text = boolean_expression(rnd, 4)
+            function, error = compile_bdd('stdin', text)
+            for j in range(6):
+                bindings = {name: rnd.choice(values) for name in 'xyz'}
+                if j < 4:
+                    bindings = {name: rnd.choice((True, False)) for name in 'xyzw'}
+                with self.subTest(text=text, bindings=bindings):
+                    expected, expected_error = function.compiled.evaluate(bindings)
+                    value, error = function.evaluate(bindings)
+                    self.assertEqual(str(expected), str(value))
+                    self.assertEqual(expected_error and expected_error.as_string(), error and error.as_string())
+
+    def test_queries_match_the_truth_table(self):
+        rnd = random.Random(12)
+        for i in range(100):
+            text = boolean_expression(rnd, 4)
+            function, error = compile_bdd('stdin', text)
+            rows = self.truth_table(function)
+            solutions = [bindings for bindings, value in rows if value]
+            with self.subTest(text=text):
+                self.assertEqual(len(solutions), function.count_solutions())
+                self.assertEqual(bool(solutions), function.is_satisfiable())
+                self.assertEqual(len(solutions) == len(rows), function.is_tautology())
+                assignment = function.satisfying_assignment()
+                if solutions:
+                    bindings = {name.lower(): False for name in function.variables}
+                    bindings.update({name.lower(): value for name, value in assignment.items()})
+                    self.assertIs(TRUE, function.evaluate(bindings)[0])
+                else:
+                    self.assertIsNone(assignment)
+
+    def test_equivalence(self):
+        bdd = BDD()
+        rules = [compile_bdd('stdin', text, bdd)[0] for text in (
+            '!(x and y) and z', '(!x or !y) and z', 'z and !(y and x)', '(x == y) != z', 'x or !x', 'true')]
+        self.assertTrue(rules[0].equivalent(rules[1]))
+        self.assertTrue(rules[0].equivalent(rules[2]))
+        self.assertFalse(rules[0].equivalent(rules[3]))
+        self.assertTrue(rules[4].equivalent(rules[5]))
+        self.assertTrue(rules[4].is_tautology())
+
+        with self.assertRaises(ValueError):
+            rules[0].equivalent(compile_bdd('stdin', 'x')[0])
+
+    def test_only_boolean_expressions(self):
+        for text in ('x and a < 1', 'isEven(2) or x', 'x == 1', 'x true y'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    compile_bdd('stdin', text)
+        self.assertIsInstance(compile_bdd('stdin', 'x and')[1], InvalidSyntaxError)
+
+    def test_variable_order_keeps_pairs_together(self):
+        pairs = ' or '.join(f'(a{letter} and b{letter})' for letter in 'cdefghijklmn')
+        function, error = compile_bdd('stdin', pairs)
+        # interleaved pairs stay linear, all a* before all b* would not
+        self.assertEqual(2 * 12 + 2, len(function))
+
+
+def rule_expression(rnd, depth, names='xyz'):
+    choice = rnd.randrange(6 if depth else 3)
+    name = rnd.choice(names)
+    if choice == 0:
+        return f'{name} {rnd.choice(["<", "<=", ">", ">=", "=="])} {rnd.randint(0, 6)}'
+    if choice == 1:
+        return f'{rnd.choice([rnd.randint(0, 6), 2.5])} {rnd.choice(["<", ">=", "=="])} {name}'
+    if choice == 2:
+        return rnd.choice([name, f'isEven({name})', f'{name} != 3', 'true'])
+    if choice == 3:
+        return '!(' + rule_expression(rnd, depth - 1, names) + ')'
+    op = rnd.choice(['and', 'and', 'or'])
+    return f'({rule_expression(rnd, depth - 1, names)} {op} {rule_expression(rnd, depth - 1, names)})'
+
+
+class TestRuleSet(unittest.TestCase):
+
+    def test_same_matches_as_every_rule(self):
+        rnd = random.Random(13)
+        rules = RuleSet()
+        trees = {}
+        for i in range(400):
+            text = rule_expression(rnd, 3)
+            compiled, error = rules.add(f'rule{i}', text)
+            self.assertIsNone(error)
+            trees[f'rule{i}'] = compile('<rules>', text)[0]
+
+        values = [0, 1, 2, 3, 4, 5, 6, 2.5, -1, True, False, 'TRUE', isEven]
+        for j in range(200):
+            record = {name: rnd.choice(values) for name in 'xyz' if rnd.random() < 0.9}
+            expected = [rule_id for rule_id, compiled in trees.items()
+                        if str(compiled.evaluate(record)[0]) == 'TRUE']
+            with self.subTest(record=record):
+                self.assertEqual(expected, rules.match(record))
+
+    def test_predicates_are_shared(self):
+        rules = RuleSet()
+        rules.add('low', 'x < 3 and 1 <= y')
+        rules.add('high', 'x >= 3 and y >= 1')
+        rules.add('three', '3 == x or x > 10')
+        rules.add('even', 'isEven(x)')
+        # 'x < 3', 'y >= 1', 'x >= 3', 'x == 3', 'x > 10'
+        self.assertEqual(5, len(rules.predicates))
+        self.assertEqual(4, len(rules))
+        self.assertEqual(['low', 'even'], rules.match({'x': 2, 'y': 1}))
+        self.assertEqual(['high', 'three'], rules.match({'x': 3, 'y': 1.5}))
+        self.assertEqual(['three', 'even'], rules.match({'x': 12, 'y': 0}))
+        self.assertEqual([], rules.match({'x': True, 'y': 1}))
+        self.assertIsInstance(rules.add('bad', 'x <')[1], InvalidSyntaxError)
+        self.assertEqual(4, len(rules))
+
+
+class TestIncremental(unittest.TestCase):
+
+    def test_updates_give_the_full_results(self):
+        rnd = random.Random(14)
+        values = [0, 1, 2, 3, 4, 2.5, True, False, 'TRUE', isEven]
+        for i in range(200):
+            text = rule_expression(rnd, 4)
+            compiled, error = compile('stdin', text, share=rnd.random() < 0.5, optimize=True)
+            bindings = {name: rnd.choice(values) for name in 'xyz'}
+            evaluator = IncrementalEvaluator(compiled, bindings)
+            evaluator.evaluate()
+            for j in range(10):
+                changes = {rnd.choice('xyz'): rnd.choice(values)}
+                bindings.update(changes)
+                expected, expected_error = compiled.evaluate(bindings)
+                value, error = evaluator.update(changes)
+                with self.subTest(text=text, bindings=bindings):
+                    self.assertEqual(str(expected), str(value))
+                    self.assertEqual(expected_error and expected_error.as_string(), error and error.as_string())
+
+    def test_only_the_changed_path_is_recomputed(self):
+        compiled, error = compile('stdin', '(a > 3 and b < 2) or (c == 1 and isEven(d))')
+        evaluator = IncrementalEvaluator(compiled, {'a': 5, 'b': 3, 'c': 1, 'd': 2})
+        self.assertIs(TRUE, evaluator.evaluate()[0])
+        # the callee 'isEven' is looked up, not visited
+        self.assertEqual(14, evaluator.stats()['recomputed'])
+
+        # 'a', 'a > 3', the 'and' and the root are visited again, '3', 'b < 2'
+        # and the right side are reused
+        self.assertIs(TRUE, evaluator.update({'a': 4})[0])
+        self.assertEqual({'nodes': 15, 'cached': 14, 'recomputed': 18, 'skipped': 11}, evaluator.stats())
+
+        # unchanged values drop nothing
+        evaluator.update({'a': 4, 'b': 3})
+        self.assertEqual(18, evaluator.stats()['recomputed'])
+        self.assertIs(FALSE, evaluator.update({'d': 3})[0])
+
+
+class TestAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.called = []
+        self.running = 0
+        self.most_running = 0
+
+    async def slow_even(self, arg):
+        # stands in for a lookup which awaits i/o
+        self.called.append(arg)
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        return arg % 2 == 0
+
+    def evaluate(self, text, bindings=None, **options):
+        bindings = dict(bindings or {}, slow=self.slow_even)
+        return asyncio.run(evaluate_async(text, bindings, fn='stdin', **options))
+
+    def test_same_results_as_the_interpreter(self):
+        rnd = random.Random(15)
+
+        async def even(arg):
+            return isEven(arg)
+
+        async def evaluate_all(cases):
+            return [await evaluate_async(compiled, dict(bindings, isEven=even)) for compiled, bindings in cases]
+
+        values = [0, 1, 2, 2.5, True, False, isEven]
+        cases = []
+        for i in range(300):
+            compiled, error = compile('stdin', rule_expression(rnd, 4), share=rnd.random() < 0.5, optimize=True)
+            cases.append((compiled, {name: rnd.choice(values) for name in 'xyz'}))
+        for (compiled, bindings), (value, error) in zip(cases, asyncio.run(evaluate_all(cases))):
+            expected, expected_error = compiled.evaluate(bindings)
+            with self.subTest(text=compiled.text, bindings=bindings):
+                self.assertEqual(str(expected), str(value))
+                self.assertEqual(expected_error and expected_error.as_string(), error and error.as_string())
+
+    def test_independent_calls_run_concurrently(self):
+        start = time.perf_counter()
+        value, error = self.evaluate('slow(1) == slow(3) and (slow(2) != slow(5))')
+        self.assertIs(TRUE, value)
+        # two rounds of two concurrent calls, not four calls one by one
+        self.assertLess(time.perf_counter() - start, 0.18)
+        self.assertEqual(2, self.most_running)
+        self.assertEqual([1, 3, 2, 5], self.called)
+
+    def test_short_circuit(self):
+        self.assertIs(FALSE, self.evaluate('slow(1) and slow(2)')[0])
+        self.assertIs(TRUE, self.evaluate('slow(2) or slow(4)')[0])
+        self.assertIs(FALSE, self.evaluate('x and slow(6)', {'x': False})[0])
+        self.assertEqual([1, 2], self.called)
+
+    def test_errors_and_timeouts(self):
+        value, error = self.evaluate('slow(true)')
+        self.assertEqual("Method only works with arguments from type 'Number'", error.details)
+        self.assertIsInstance(self.evaluate('slow(1) and')[1], InvalidSyntaxError)
+
+        value, error = self.evaluate('slow(1) == slow(2) or slow(3)', timeout=0.01)
+        self.assertIsNone(value)
+        self.assertIsInstance(error, EvaluationTimeoutError)
+        self.assertIsInstance(error, RTError)
+        self.assertEqual((0, 28), (error.pos_start.idx, error.pos_end.idx))
+        self.assertIn('Timeout', error.as_string())
+        self.assertIs(TRUE, self.evaluate('slow(2)', timeout=1)[0])
+
+    def test_shared_calls_are_awaited_once(self):
+        for share, expected in ((False, [2, 2, 2]), (True, [2])):
+            del self.called[:]
+            self.assertIs(TRUE, self.evaluate('slow(2) == slow(2) and slow(2)', share=share)[0])
+            self.assertEqual(expected, self.called)
+
+
+class TestValues(unittest.TestCase):
+
+    def test_booleans_are_shared_singletons(self):
+        for backend in ('tree', 'closure', 'stack', 'bytecode'):
+            with self.subTest(backend=backend):
+                self.assertIs(TRUE, run('stdin', '1 < 2 and !false', backend=backend)[0])
+                self.assertIs(FALSE, run('stdin', 'a == 2', backend=backend)[0])
+        self.assertIs(TRUE, Booleen(True))
+        self.assertIs(FALSE, pickle.loads(pickle.dumps(FALSE)))
+        self.assertIs(True, TRUE.value)
+        self.assertEqual('FALSE', repr(FALSE))
+        self.assertRaises(ValueError, Booleen, 'TRUE')
+
+    def test_values_are_immutable(self):
+        with self.assertRaises(AttributeError):
+            TRUE.value = False
+        number = run('stdin', '2.5')[0]
+        with self.assertRaises(AttributeError):
+            number.value = 1
+        self.assertEqual(2.5, pickle.loads(pickle.dumps(number)).value)
+        self.assertIs(FALSE, TRUE.reverse())
+        self.assertIs(TRUE, TRUE.reverse().reverse())
+
+    def test_errors_still_point_at_the_operands(self):
+        value, error = run('stdin', 'true and (1 < 2) == 3')
+        self.assertEqual("Comparsion of 'bool' and 'int/float'", error.details)
+        self.assertEqual((20, 21), (error.pos_start.idx, error.pos_end.idx))
+        value, error = run('stdin', 'isEven(1 < 2)')
+        self.assertEqual((9, 10), (error.pos_start.idx, error.pos_end.idx))
+
+
+class TestExpressionGenerator(unittest.TestCase):
+
+    def test_expressions_are_valid(self):
+        configs = [{}, {'size': 30, 'depth': 6, 'calls': 0.4, 'negations': 0.4},
+                   {'size': 1, 'depth': 0}, {'operators': {'==': 1, '!=': 1, '<=': 1}, 'identifiers': 1.0}]
+        for seed, config in enumerate(configs):
+            generator = ExpressionGenerator(seed=seed, **config)
+            for text in generator.expressions(200):
+                with self.subTest(text=text):
+                    compiled, error = compile('stdin', text)
+                    self.assertIsNone(error)
+                    value, error = compiled.evaluate(generator.bindings())
+                    self.assertIsNone(error)
+                    self.assertIsInstance(value, Booleen)
+
+    def test_same_seed_same_expressions(self):
+        self.assertEqual(ExpressionGenerator(seed=5).expressions(20), ExpressionGenerator(seed=5).expressions(20))
+        with self.assertRaises(ValueError):
+            ExpressionGenerator(operators={'and': 1})
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counts_per_phase(self):
+        for backend in ('tree', 'stack'):
+            with self.subTest(backend=backend):
+                metrics = Metrics()
+                value, error = run('stdin', 'isEven(4) and a < 1', cache=None, backend=backend, metrics=metrics)
+                self.assertIs(FALSE, value)
+                snapshot = metrics.snapshot()
+                self.assertEqual({'tokens': 9, 'nodes': 6, 'calls': 1}, snapshot['counters'])
+                self.assertEqual({'lex': 1, 'parse': 1, 'evaluate': 1},
+                                 {phase: histogram['count'] for phase, histogram in snapshot['phases'].items()})
+
+    def test_evaluations_of_a_compiled_expression(self):
+        metrics = Metrics()
+        compiled = compile('stdin', 'a < 1 or isEven(a)')[0]
+        results = list(compiled.evaluate_many([{'a': 0}, {'a': 2}, {'a': 3}], metrics=metrics))
+        self.assertEqual(['TRUE', 'TRUE', 'FALSE'], [str(value) for value, error in results])
+        snapshot = metrics.snapshot()
+        self.assertEqual(3, snapshot['phases']['evaluate']['count'])
+        self.assertEqual(0, snapshot['phases']['lex']['count'])
+        self.assertEqual(2, snapshot['counters']['calls'])
+
+    def test_errors_by_class(self):
+        metrics = Metrics()
+        for text in ('a <', '1 < true', '1 $ 2', '2 > true'):
+            self.assertIsNotNone(run('stdin', text, metrics=metrics)[1])
+        self.assertEqual({'InvalidSyntaxError': 1, 'IllegalCharError': 1, 'RTError': 2},
+                         metrics.snapshot()['errors'])
+
+    def test_prometheus_file(self):
+        metrics = Metrics(buckets=(10 ** 9,))
+        run('stdin', 'a < 1', cache=None, metrics=metrics)
+        run('stdin', 'a <', cache=None, metrics=metrics)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'expr.prom')
+        metrics.write_prometheus(path)
+        with open(path) as file:
+            lines = file.read().splitlines()
+        self.assertIn('boolean_expr_phase_seconds_bucket{phase="lex",le="1.0"} 2', lines)
+        self.assertIn('boolean_expr_phase_seconds_count{phase="evaluate"} 1', lines)
+        self.assertIn('boolean_expr_errors_total{error="InvalidSyntaxError"} 1', lines)
+        self.assertIn('boolean_expr_nodes_total 3', lines)
+        self.assertEqual(['expr.prom'], os.listdir(directory.name))
+
+
+class TestProfile(unittest.TestCase):
+
+    def spans(self, profile):
+        return {(entry.kind, entry.pos_start.idx, entry.pos_end.idx): entry for entry in profile.entries.values()}
+
+    def test_calls_and_times_per_span(self):
+        text = 'a < 1 or isEven(b)'
+        for backend in ('tree', 'stack', 'closure'):
+            with self.subTest(backend=backend):
+                profile = Profile()
+                compiled = compile('stdin', text, backend)[0]
+                results = list(compiled.evaluate_many([{'a': 0}, {'a': 5, 'b': 2}], profile=profile))
+                self.assertEqual(['TRUE', 'TRUE'], [str(value) for value, error in results])
+                spans = self.spans(profile)
+                self.assertEqual({('BinOpNode', 0, 17), ('BinOpNode', 0, 5), ('VarNode', 0, 1),
+                                  ('NumberNode', 4, 5), ('CallNode', 9, 17), ('VarNode', 16, 17)}, set(spans))
+                self.assertEqual(2, spans['BinOpNode', 0, 17].calls)
+                self.assertEqual(1, spans['CallNode', 9, 17].calls)
+                root = spans['BinOpNode', 0, 17]
+                self.assertEqual(root.cumulative_ns, profile.total_ns())
+                for entry in spans.values():
+                    self.assertLessEqual(entry.self_ns, entry.cumulative_ns)
+
+    def test_report_underlines_the_hotspots(self):
+        profile = Profile()
+        run('stdin', 'a < 1 or isEven(true)', profile=profile)
+        report = profile.report(top=1, key='cumulative_ns')
+        self.assertEqual(['a < 1 or isEven(true)', '^' * 20], report.splitlines()[1:])
+        self.assertTrue(report.startswith('#1 BinOpNode, File stdin, line 1: 1 calls'))
+        self.assertEqual(2, len(profile.hotspots(2)))
+        with self.assertRaises(ValueError):
+            profile.hotspots(key='name')
+
+    def test_deep_expression_on_the_stack_backend(self):
+        profile = Profile()
+        compiled, error = compile('stdin', '!' * 5000 + 'true', parser='stack', backend='stack')
+        self.assertIs(TRUE, compiled.evaluate(profile=profile)[0])
+        self.assertEqual(5001, len(profile.entries))
+        self.assertEqual(profile.total_ns(), max(entry.cumulative_ns for entry in profile.entries.values()))
+
+    def test_disabled_without_a_profile(self):
+        interpreter = Interpreter()
+        self.assertNotIn('walk', vars(interpreter))
+        self.assertIn('walk', vars(Interpreter(profile=Profile())))
+
+
 if __name__ == '__main__':
     unittest.main()
 
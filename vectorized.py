@@ -0,0 +1,213 @@
+from interpreter import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+##########################
+# COLUMN EVALUATOR
+##########################
+
+class ColumnEvaluator:
+    # Walks the ast once per batch, every node becomes one numpy operation
+    # over all rows. Booleen values are bool arrays, Number values are
+    # int/float arrays. Errors are the ones of the Interpreter.
+
+    def __init__(self, size):
+        self.size = size
+
+    def visit(self, node, context):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node, context)
+
+    def no_visit_method(self, node, context):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def visit_BooleanNode(self, node, context):
+        return np.bool_(node.tok.value == 'TRUE')
+
+    def visit_NumberNode(self, node, context):
+        return np.asarray(node.tok.value)
+
+    def visit_VarNode(self, node, context):
+        var_name = node.var_name_tok.value
+        value = context.lookup(var_name)
+
+        if value is None:
+            raise ErrorSignal(NonExistentIdentifierError(
+                node.pos_start, node.pos_end, "Unknown Identifier"))
+
+        column = self.as_column(value)
+        if column is None:
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                f"Identifier '{var_name}' has to be called with an argument",
+                context
+            ))
+        return column
+
+    def as_column(self, value):
+        if callable(value):
+            return None
+        if not isinstance(value, np.ndarray):
+            native = native_value(value)
+            if native is not None:
+                return np.asarray(native)
+            value = np.asarray(value)
+
+        if value.dtype.kind == 'U':
+            return value == 'TRUE'
+        if value.dtype.kind not in 'biuf':
+            return None
+        if value.ndim and len(value) != self.size:
+            raise ValueError(
+                f'All columns need {self.size} rows, got one with {len(value)}')
+        return value
+
+    def visit_UnaryOpNode(self, node, context):
+        column = self.visit(node.node, context)
+        if not is_bool(column):
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                "Expected 'true' or 'false' after '!'",
+                context
+            ))
+        return ~column
+
+    def visit_BinOpNode(self, node, context):
+        left = self.visit(node.left_node, context)
+        op_tok = node.op_tok
+        is_and = op_tok.matches(TT_KEYWORD, 'AND')
+        is_or = op_tok.matches(TT_KEYWORD, 'OR')
+
+        # short circuit once no row needs the right side
+        if is_bool(left):
+            if is_and and not left.any():
+                return left
+            if is_or and left.all():
+                return left
+
+        right = self.visit(node.right_node, context)
+
+        if is_and or is_or:
+            if not is_bool(left):
+                raise self.no_operation(node, left, context)
+            if not is_bool(right):
+                raise self.cant_compare(node, left, context)
+            return (left & right) if is_and else (left | right)
+
+        if op_tok.type in (TT_EE, TT_NE):
+            if is_bool(left) != is_bool(right):
+                raise self.cant_compare(node, left, context)
+            return (left == right) if op_tok.type == TT_EE else (left != right)
+
+        if is_bool(left):
+            raise self.no_operation(node, left, context)
+        if is_bool(right):
+            raise self.cant_compare(node, left, context)
+
+        if op_tok.type == TT_LT:
+            return left < right
+        elif op_tok.type == TT_LTE:
+            return left <= right
+        elif op_tok.type == TT_GT:
+            return left > right
+        return left >= right
+
+    def no_operation(self, node, left, context):
+        type_of_left = Booleen if is_bool(left) else Number
+        return ErrorSignal(RTError(
+            node.left_node.pos_start, node.left_node.pos_end,
+            f'The type "{type_of_left}" has no operation "{node.op_tok}"',
+            context
+        ))
+
+    def cant_compare(self, node, left, context):
+        if is_bool(left):
+            details = "Comparsion of 'bool' and 'int/float'"
+        else:
+            details = "Comparsion of 'int/float' and 'bool'"
+        return ErrorSignal(RTError(
+            node.right_node.pos_start, node.right_node.pos_end, details, context))
+
+    def visit_CallNode(self, node, context):
+        node_to_call = node.node_to_call
+        value_to_call = None
+        if isinstance(node_to_call, VarNode):
+            value_to_call = context.lookup(node_to_call.var_name_tok.value)
+            if value_to_call is None:
+                raise ErrorSignal(NonExistentIdentifierError(
+                    node_to_call.pos_start, node_to_call.pos_end, "Unknown Identifier"))
+
+        if not callable(value_to_call):
+            raise ErrorSignal(RTError(
+                node_to_call.pos_start, node_to_call.pos_end,
+                "Only identifiers bound to methods can be called",
+                context
+            ))
+
+        if node.arg_nodes is None:
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                "Method only works with arguments from type 'Number'",
+                context
+            ))
+
+        arg = self.visit(node.arg_nodes, context)
+        if is_bool(arg):
+            raise ErrorSignal(RTError(
+                node.arg_nodes.pos_start, node.arg_nodes.pos_end,
+                "Method only works with arguments from type 'Number'",
+                context
+            ))
+
+        # the Interpreter calls methods with int(arg)
+        arg = arg.astype(np.int64)
+        implementation = getattr(value_to_call, 'vectorized', None)
+
+        if implementation is not None:
+            result = np.asarray(implementation(arg))
+        elif arg.ndim == 0:
+            result = np.asarray(value_to_call(int(arg)))
+        else:
+            # no vectorized implementation declared, one call per row
+            result = np.array([value_to_call(value) for value in arg.tolist()])
+
+        if result.dtype.kind not in 'biuf':
+            raise ErrorSignal(RTError(
+                node.pos_start, node.pos_end,
+                "Method has to return a bool or a number",
+                context
+            ))
+        return result
+
+
+def is_bool(column):
+    return column.dtype == bool
+
+
+def evaluate_columns(compiled, columns):
+    # Evaluates a CompiledExpression over whole columns, one per identifier.
+    # Returns (column, error), the column is a bool mask for boolean
+    # expressions.
+    if np is None:
+        raise ImportError('The columnar evaluation needs numpy')
+
+    columns = normalize_bindings(columns) or {}
+    sizes = [len(column) for column in columns.values()
+             if not callable(column) and np.ndim(column)]
+    size = sizes[0] if sizes else 1
+
+    context = Context('<program>')
+    context.identifier = identifier
+    context.bindings = columns
+
+    try:
+        result = ColumnEvaluator(size).visit(compiled.node, context)
+    except ErrorSignal as signal:
+        return None, signal.error
+
+    return np.broadcast_to(result, (size,)).copy(), None